@@ -1,4 +1,5 @@
 from sklearn.feature_extraction.text import CountVectorizer
+from hashing_bow import hashing_bow
 
 sentences = ["I love cats", "I hate dogs"]
 vectorizer = CountVectorizer(token_pattern=r'(?u)\b\w+\b')  # Adjusted pattern to include single characters
@@ -6,3 +7,10 @@ bow_matrix = vectorizer.fit_transform(sentences)
 
 print("Vocabulary:", vectorizer.get_feature_names_out())
 print("Vectors:\n", bow_matrix.toarray())
+
+# Hashing-trick mode: tokens are hashed into a fixed number of columns instead of a
+# vocabulary, so documents can be streamed in chunks from a generator (see hashing_bow.py)
+hashed_matrix = hashing_bow(iter(sentences), n_features=2 ** 10, chunk_size=1)
+print("Hashed vectors (column: count):")
+for row in hashed_matrix:
+    print({int(col): int(count) for col, count in zip(row.indices, row.data)})
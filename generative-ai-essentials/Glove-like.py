@@ -1,5 +1,12 @@
+import os
+import tempfile
+
 import numpy as np
 
+from cooccurrence import CooccurrenceBuilder
+from embedding_store import EmbeddingStore
+from glove_trainer import GloVeTrainer
+
 def weighting_func(x, x_max=100, alpha=0.75):
     """
     Compute the weighting function for a co-occurrence count.
@@ -47,72 +54,105 @@ for word, idx in word2idx.items():
 # ---------------------------------------------------
 # Step 4: Build the Co-occurrence Matrix
 # We'll use a window size of 1 for simplicity.
+# "loop" counts into a dense V x V matrix and trains by walking every (i, j) cell
+# in Python, which is easy to follow but O(V^2) per epoch.
+# "vectorized" streams the sentences into sparse on-disk shards (see cooccurrence.py)
+# and trains on the non-zero entries only, in shuffled mini-batches of batch_size
+# entries (see glove_trainer.py).
 # ---------------------------------------------------
+trainer_mode = "loop"
+batch_size = 4
 vocab_size = len(vocab)
-X = np.zeros((vocab_size, vocab_size))
 window_size = 1
 
-for sentence in sentences:
-    sentence_length = len(sentence)
-    for i, word in enumerate(sentence):
-        word_idx = word2idx[word]
-        # Define the window boundaries
-        start = max(0, i - window_size)
-        end = min(sentence_length, i + window_size + 1)
-        for j in range(start, end):
-            if i == j:
-                continue  # Skip the word itself
-            context_word = sentence[j]
-            context_idx = word2idx[context_word]
-            X[word_idx, context_idx] += 1
-
-print("\nCo-occurrence Matrix (X):")
-print(X)
+if trainer_mode == "vectorized":
+    builder = CooccurrenceBuilder(vocab_size, window_size, distance_weighting=False)
+    builder.add_sentences([word2idx[word] for word in sentence] for sentence in sentences)
+    cooccurrences = builder.finalize(tempfile.mkdtemp(prefix="glove_cooc_"))
+    print(f"\nCo-occurrence Matrix: {cooccurrences.nnz} non-zero entries written to {cooccurrences.path}")
+else:
+    X = np.zeros((vocab_size, vocab_size))
+
+    for sentence in sentences:
+        sentence_length = len(sentence)
+        for i, word in enumerate(sentence):
+            word_idx = word2idx[word]
+            # Define the window boundaries
+            start = max(0, i - window_size)
+            end = min(sentence_length, i + window_size + 1)
+            for j in range(start, end):
+                if i == j:
+                    continue  # Skip the word itself
+                context_word = sentence[j]
+                context_idx = word2idx[context_word]
+                X[word_idx, context_idx] += 1
+
+    print("\nCo-occurrence Matrix (X):")
+    print(X)
 
 # ---------------------------------------------------
 # Step 5: Initialize GloVe Parameters
+# (the vectorized GloVeTrainer initializes its own)
 # ---------------------------------------------------
 embedding_dim = 10      # Dimension of the embeddings
 learning_rate = 0.05
 epochs = 100
 
-# Initialize word and context embeddings randomly
-W = np.random.rand(vocab_size, embedding_dim)
-W_context = np.random.rand(vocab_size, embedding_dim)
+if trainer_mode == "loop":
+    # Initialize word and context embeddings randomly
+    W = np.random.rand(vocab_size, embedding_dim)
+    W_context = np.random.rand(vocab_size, embedding_dim)
 
-# Initialize bias terms for words and context words
-b = np.random.rand(vocab_size)
-b_context = np.random.rand(vocab_size)
+    # Initialize bias terms for words and context words
+    b = np.random.rand(vocab_size)
+    b_context = np.random.rand(vocab_size)
 
 # ---------------------------------------------------
 # Step 6: Train the GloVe Model
 # ---------------------------------------------------
-# We minimize the cost: f(X_ij) * (w_i^T w_j~ + b_i + b_j~ - log(X_ij))^2
-for epoch in range(epochs):
-    total_cost = 0
-    # Iterate over all nonzero co-occurrence entries
-    for i in range(vocab_size):
-        for j in range(vocab_size):
-            if X[i, j] > 0:
-                # Compute weighting for this co-occurrence
-                weight = weighting_func(X[i, j])
-                # Calculate the difference between prediction and log count
-                diff = np.dot(W[i], W_context[j]) + b[i] + b_context[j] - np.log(X[i, j])
-                cost = weight * (diff ** 2)
-                total_cost += cost
-                # Compute gradient (the factor 2 comes from the derivative of the square)
-                grad = 2 * weight * diff
-                # Update the parameters using gradient descent
-                W[i] -= learning_rate * grad * W_context[j]
-                W_context[j] -= learning_rate * grad * W[i]
-                b[i] -= learning_rate * grad
-                b_context[j] -= learning_rate * grad
-    if (epoch + 1) % 10 == 0:
-        print(f"Epoch {epoch + 1}/{epochs}, Total Cost: {total_cost:.4f}")
-
-# Combine word and context embeddings as the final representation
-final_embeddings = W + W_context
+if trainer_mode == "vectorized":
+    trainer = GloVeTrainer(vocab_size, embedding_dim, learning_rate)
+    trainer.fit(cooccurrences.rows, cooccurrences.cols, cooccurrences.counts,
+                epochs=epochs, batch_size=batch_size)
+    final_embeddings = trainer.embeddings()
+else:
+    # We minimize the cost: f(X_ij) * (w_i^T w_j~ + b_i + b_j~ - log(X_ij))^2
+    for epoch in range(epochs):
+        total_cost = 0
+        # Iterate over all nonzero co-occurrence entries
+        for i in range(vocab_size):
+            for j in range(vocab_size):
+                if X[i, j] > 0:
+                    # Compute weighting for this co-occurrence
+                    weight = weighting_func(X[i, j])
+                    # Calculate the difference between prediction and log count
+                    diff = np.dot(W[i], W_context[j]) + b[i] + b_context[j] - np.log(X[i, j])
+                    cost = weight * (diff ** 2)
+                    total_cost += cost
+                    # Compute gradient (the factor 2 comes from the derivative of the square)
+                    grad = 2 * weight * diff
+                    # Update the parameters using gradient descent
+                    W[i] -= learning_rate * grad * W_context[j]
+                    W_context[j] -= learning_rate * grad * W[i]
+                    b[i] -= learning_rate * grad
+                    b_context[j] -= learning_rate * grad
+        if (epoch + 1) % 10 == 0:
+            print(f"Epoch {epoch + 1}/{epochs}, Total Cost: {total_cost:.4f}")
+
+    # Combine word and context embeddings as the final representation
+    final_embeddings = W + W_context
 
 print("\nLearned GloVe Embeddings:")
 for word, idx in word2idx.items():
-    print(f" {word}: {final_embeddings[idx]}")
\ No newline at end of file
+    print(f" {word}: {final_embeddings[idx]}")
+
+# ---------------------------------------------------
+# Step 7: Save the Embeddings
+# ---------------------------------------------------
+# Saved as float32 .npy plus a vocabulary file and reopened memory-mapped, so they
+# can be queried later without retraining (see embedding_store.py)
+embeddings_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "embeddings", "glove")
+EmbeddingStore.save(embeddings_dir, vocab, final_embeddings)
+store = EmbeddingStore.open(embeddings_dir)
+print(f"\nEmbeddings saved to {embeddings_dir}")
+print(f"Most similar to '{vocab[0]}':", store.most_similar(vocab[0], k=3))
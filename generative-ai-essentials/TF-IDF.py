@@ -94,5 +94,17 @@ def main(documents):
             if score > 0:
                 print(f"  {term}: {score:.4f}")
 
+    # Step 6: Index the same documents incrementally with the sparse engine
+    # (same scores, stored as a CSR matrix) and run a cosine top-k query
+    from tfidf_engine import TfidfEngine
+
+    engine = TfidfEngine()
+    engine.add_documents(documents[:2])
+    engine.add_documents(documents[2:])  # only the new document is tokenized
+    query = "lazy brown fox"
+    print(f"\nTop documents for query '{query}':")
+    for doc_id, score in engine.top_k(query, k=3):
+        print(f"  Document {doc_id + 1}: {score:.4f}")
+
 if __name__ == "__main__":
     main(documents)
\ No newline at end of file
@@ -2,6 +2,10 @@
     This simple function iterates through each character in the input text, building words by collecting alphanumeric characters and separating out punctuation as individual tokens. 
     While rudimentary, this approach highlights the fundamental process of tokenization, providing a clear starting point for more advanced techniques.
 """
+from fast_tokenizer import fast_tokenize
+from normalizer import Normalizer
+from preprocessing_pipeline import PreprocessingPipeline
+
 def simple_tokenize(text):
     tokens = []
     current_word = ""
@@ -22,6 +26,8 @@ def simple_tokenize(text):
 sentence = "Generative AI is fascinating!"
 tokens = simple_tokenize(sentence)
 print("tokenized words:", tokens)
+# fast_tokenize returns the same tokens with one precompiled regex (see fast_tokenizer.py)
+print("fast tokenizer:", fast_tokenize(sentence))
 print("-" * 100)
 
 # —————————————————————————————————————————————     Simple Stemming Example     —————————————————————————————————————————————— #
@@ -68,6 +74,11 @@ def simple_lemmatize(word):
 words = ["running", "happily", "ran", "better", "faster", "cats"]
 lemmatized_words = [simple_lemmatize(word) for word in words]
 print("Lemmatized Words:", lemmatized_words)
+# Normalizer gives the same results from a suffix trie and a lemma table built once,
+# memoizing repeated words (see normalizer.py)
+normalizer = Normalizer()
+print("Normalizer Stems:", normalizer.normalize(["running", "happily", "tried", "faster", "cats"], mode="stem"))
+print("Normalizer Lemmas:", normalizer.normalize(words, mode="lemmatize"))
 print("-" * 100)
 
 # Sample text containing various cases
@@ -158,4 +169,17 @@ print("-" * 100)
 
 # Final preprocessed tokens
 print("Final Preprocessed Tokens:")
-print(tokens)
\ No newline at end of file
+print(tokens)
+print("-" * 100)
+
+# Single-pass pipeline: the same steps compiled once into lookup tables and applied
+# to every token in one pass (see preprocessing_pipeline.py)
+pipeline = PreprocessingPipeline(
+    punctuation=punctuations,
+    stop_words=stop_words,
+    contractions=contractions,
+    corrections=corrections,
+    abbreviations=abbreviations,
+)
+print("Single-pass Pipeline Tokens:")
+print(pipeline.process(text))
@@ -0,0 +1,476 @@
+"""Approximate nearest-neighbour search over word embeddings.
+
+EmbeddingStore.most_similar_many (embedding_store.py) scores every query
+against every row, which is exact but linear in the vocabulary size. The
+indexes below trade a little recall for much lower latency. Both work on
+row-normalized vectors, so the score is the cosine similarity, and both
+return (ids, scores) arrays of shape (num_queries, k), best first, padded
+with -1 / -inf when fewer than k candidates were found.
+
+IVFIndex (inverted file):
+    A k-means coarse quantizer splits the vectors into nlist lists. A query is
+    compared with the nlist centroids and only the vectors of the nprobe
+    closest lists are scored. With pq_subvectors set, the vectors are not
+    stored: each residual (vector - centroid) is product-quantized into one
+    byte per subvector, and scores are approximated with a per-query lookup
+    table; `rerank` candidates can then be re-scored exactly when the index
+    keeps the original vectors (keep_vectors=True).
+    Knobs: nprobe (more lists = higher recall, slower), rerank.
+
+HNSWIndex (hierarchical navigable small world graph):
+    Every vector is a node linked to up to M neighbours per layer (2 * M on
+    layer 0); a query descends greedily through the sparse upper layers and
+    then runs a best-first search with a candidate list of size ef on layer 0.
+    Knob: ef (larger = higher recall, slower).
+
+Both are built from an embedding matrix, e.g. IVFIndex.build(store.vectors)
+for an EmbeddingStore; the returned ids are rows of store.vocab.
+
+save()/load() write the arrays as .npy files next to a meta.json and reopen
+them memory-mapped. Running this file prints recall@k versus queries/sec for
+both indexes against exact search on clustered synthetic embeddings.
+"""
+import heapq
+import json
+import math
+import os
+import tempfile
+import time
+
+import numpy as np
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def exact_search(vectors, queries, k=10, chunk_size=1024):
+    """
+    Exact cosine top-k of normalized queries against normalized vectors.
+    """
+    ids = np.empty((len(queries), k), dtype=np.int64)
+    scores = np.empty((len(queries), k), dtype=np.float32)
+    for start in range(0, len(queries), chunk_size):
+        similarities = queries[start:start + chunk_size] @ vectors.T
+        best = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(similarities, best, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        ids[start:start + chunk_size] = np.take_along_axis(best, order, axis=1)
+        scores[start:start + chunk_size] = np.take_along_axis(best_scores, order, axis=1)
+    return ids, scores
+
+
+def recall_at_k(found_ids, true_ids):
+    """
+    Fraction of the true k nearest neighbours that were found.
+    """
+    hits = sum(len(np.intersect1d(found, true)) for found, true in zip(found_ids, true_ids))
+    return hits / true_ids.size
+
+
+def kmeans(data, k, iterations=20, seed=0, chunk_size=8192):
+    """
+    Lloyd's k-means on the rows of data. Returns (centroids, labels).
+    """
+    rng = np.random.default_rng(seed)
+    data = np.asarray(data, dtype=np.float32)
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+    labels = np.zeros(len(data), dtype=np.int64)
+    for _ in range(iterations):
+        # argmin ||x - c||^2 = argmax (2 x.c - ||c||^2)
+        half_norms = 0.5 * np.sum(centroids ** 2, axis=1)
+        for start in range(0, len(data), chunk_size):
+            labels[start:start + chunk_size] = np.argmax(data[start:start + chunk_size] @ centroids.T - half_norms,
+                                                         axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, data)
+        counts = np.bincount(labels, minlength=k)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, np.newaxis]
+        # Re-seed empty clusters with random points
+        centroids[empty] = data[rng.choice(len(data), int(empty.sum()), replace=False)]
+    return centroids, labels
+
+
+def _ranges(starts, ends):
+    """
+    Concatenation of np.arange(s, e) for all (s, e) pairs, without a Python loop.
+    """
+    lengths = ends - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+    return offsets + np.arange(total)
+
+
+def _top_k(ids, scores, k):
+    """
+    Best k (id, score) pairs, padded with -1 / -inf.
+    """
+    out_ids = np.full(k, -1, dtype=np.int64)
+    out_scores = np.full(k, -np.inf, dtype=np.float32)
+    if len(scores) > k:
+        best = np.argpartition(-scores, k - 1)[:k]
+        ids, scores = ids[best], scores[best]
+    order = np.argsort(-scores)
+    out_ids[:len(order)] = ids[order]
+    out_scores[:len(order)] = scores[order]
+    return out_ids, out_scores
+
+
+def _save_arrays(directory, meta, arrays):
+    os.makedirs(directory, exist_ok=True)
+    for name, values in arrays.items():
+        np.save(os.path.join(directory, f"{name}.npy"), values)
+    with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(dict(meta, arrays=sorted(arrays)), f, indent=2)
+
+
+def _load_arrays(directory):
+    with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in meta.pop("arrays")}
+    return meta, arrays
+
+
+class IVFIndex:
+    def __init__(self, centroids, list_offsets, list_ids, list_vectors=None, codebooks=None, codes=None):
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+        self.list_vectors = list_vectors      # normalized vectors in list order (None if dropped)
+        self.codebooks = codebooks            # (num_subvectors, 256, sub_dim) PQ codebooks
+        self.codes = codes                    # (n, num_subvectors) uint8 PQ codes in list order
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, vectors, nlist=None, pq_subvectors=None, keep_vectors=None, iterations=20,
+              train_size=100_000, seed=0):
+        """
+        Build an index over the rows of vectors (normalized internally).
+
+        Parameters:
+            nlist: Number of inverted lists (default ~ 4 * sqrt(n)).
+            pq_subvectors: Product-quantize residuals into this many one-byte
+                codes per vector (must divide the dimension); None = exact scores.
+            keep_vectors: Keep the normalized vectors (default: only without PQ).
+            train_size: Number of sampled vectors k-means is trained on.
+        """
+        vectors = normalize(vectors)
+        rng = np.random.default_rng(seed)
+        nlist = nlist or max(1, int(4 * math.sqrt(len(vectors))))
+        sample = vectors[rng.choice(len(vectors), min(train_size, len(vectors)), replace=False)]
+        centroids, _ = kmeans(sample, nlist, iterations, seed)
+        labels = np.argmax(vectors @ centroids.T - 0.5 * np.sum(centroids ** 2, axis=1), axis=1)
+
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=len(centroids))
+        list_offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        keep_vectors = pq_subvectors is None if keep_vectors is None else keep_vectors
+        if pq_subvectors is None and not keep_vectors:
+            raise ValueError("An index without product quantization needs keep_vectors=True")
+
+        codebooks = codes = None
+        if pq_subvectors is not None:
+            dim = vectors.shape[1]
+            if dim % pq_subvectors:
+                raise ValueError(f"pq_subvectors={pq_subvectors} does not divide the dimension {dim}")
+            sub_dim = dim // pq_subvectors
+            residuals = vectors[order] - centroids[labels[order]]
+            codebooks = np.zeros((pq_subvectors, 256, sub_dim), dtype=np.float32)
+            codes = np.empty((len(vectors), pq_subvectors), dtype=np.uint8)
+            for j in range(pq_subvectors):
+                part = residuals[:, j * sub_dim:(j + 1) * sub_dim]
+                train = part[rng.choice(len(part), min(train_size, len(part)), replace=False)]
+                book, _ = kmeans(train, 256, iterations, seed + j + 1)
+                codebooks[j, :len(book)] = book
+                half_norms = 0.5 * np.sum(book ** 2, axis=1)
+                codes[:, j] = np.argmax(part @ book.T - half_norms, axis=1)
+        return cls(centroids.astype(np.float32), list_offsets, order.astype(np.int64),
+                   vectors[order] if keep_vectors else None, codebooks, codes)
+
+    def search(self, queries, k=10, nprobe=8, rerank=0):
+        """
+        Top-k cosine search in the nprobe closest lists of every query.
+
+        rerank: With PQ, re-score the max(rerank, k) best approximate
+            candidates exactly (needs keep_vectors=True); 0 returns the PQ scores.
+        """
+        queries = normalize(np.atleast_2d(queries))
+        nprobe = min(nprobe, self.nlist)
+        coarse = queries @ self.centroids.T
+        probes = np.argpartition(-coarse, nprobe - 1, axis=1)[:, :nprobe]
+        ids = np.empty((len(queries), k), dtype=np.int64)
+        scores = np.empty((len(queries), k), dtype=np.float32)
+        for i, query in enumerate(queries):
+            lists = probes[i]
+            starts, ends = self.list_offsets[lists], self.list_offsets[lists + 1]
+            rows = _ranges(starts, ends)
+            if self.codes is None:
+                row_scores = self.list_vectors[rows] @ query
+            else:
+                # <q, c + r> ~ <q, c> + sum_j <q_j, codebook_j[code_j]>
+                num_subvectors, _, sub_dim = self.codebooks.shape
+                table = np.einsum("md,mkd->mk", query.reshape(num_subvectors, sub_dim), self.codebooks)
+                row_scores = (np.repeat(coarse[i, lists], ends - starts)
+                              + table[np.arange(num_subvectors), self.codes[rows]].sum(axis=1))
+                if rerank and self.list_vectors is not None:
+                    # Never fewer than k candidates, and exact scores even when all rows are candidates
+                    candidates = max(rerank, k)
+                    if len(rows) > candidates:
+                        rows = rows[np.argpartition(-row_scores, candidates - 1)[:candidates]]
+                    row_scores = self.list_vectors[rows] @ query
+            ids[i], scores[i] = _top_k(self.list_ids[rows], row_scores.astype(np.float32), k)
+        return ids, scores
+
+    def save(self, directory):
+        arrays = {"centroids": self.centroids, "list_offsets": self.list_offsets, "list_ids": self.list_ids}
+        for name in ("list_vectors", "codebooks", "codes"):
+            if getattr(self, name) is not None:
+                arrays[name] = getattr(self, name)
+        _save_arrays(directory, {"type": "ivf"}, arrays)
+
+    @classmethod
+    def load(cls, directory):
+        _, arrays = _load_arrays(directory)
+        return cls(**arrays)
+
+
+class HNSWIndex:
+    def __init__(self, vectors, neighbors0, degrees0, upper_layers, entry_point, M, ef_construction):
+        self.vectors = vectors                # normalized vectors
+        self.neighbors0 = neighbors0          # (n, 2 * M) int32 layer-0 neighbours, padded with -1
+        self.degrees0 = degrees0              # (n,) number of layer-0 neighbours
+        self.upper_layers = upper_layers      # [layer 1, layer 2, ...], each a dict node -> neighbour array
+        self.entry_point = entry_point
+        self.M = M
+        self.ef_construction = ef_construction
+        self._visited = np.zeros(len(vectors), dtype=np.int32)
+        self._visit_tag = 0
+
+    @property
+    def max_level(self):
+        return len(self.upper_layers)
+
+    def _neighbors(self, layer, node):
+        if layer == 0:
+            return self.neighbors0[node, :self.degrees0[node]]
+        return self.upper_layers[layer - 1][node]
+
+    def _search_layer(self, query, entry_points, ef, layer):
+        """
+        Best-first search on one layer. Returns up to ef (similarity, node)
+        pairs, best first.
+        """
+        self._visit_tag += 1
+        visited, tag = self._visited, self._visit_tag
+        entry_points = np.asarray(entry_points)
+        visited[entry_points] = tag
+        similarities = self.vectors[entry_points] @ query
+        candidates = [(-s, node) for s, node in zip(similarities.tolist(), entry_points.tolist())]
+        heapq.heapify(candidates)
+        results = [(s, node) for s, node in zip(similarities.tolist(), entry_points.tolist())]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            negative_similarity, node = heapq.heappop(candidates)
+            if -negative_similarity < results[0][0] and len(results) >= ef:
+                break
+            neighbors = self._neighbors(layer, node)
+            neighbors = neighbors[visited[neighbors] != tag]
+            if len(neighbors) == 0:
+                continue
+            visited[neighbors] = tag
+            for s, neighbor in zip((self.vectors[neighbors] @ query).tolist(), neighbors.tolist()):
+                if len(results) < ef or s > results[0][0]:
+                    heapq.heappush(candidates, (-s, neighbor))
+                    heapq.heappush(results, (s, neighbor))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+        return sorted(results, reverse=True)
+
+    def _select_neighbors(self, candidates, M):
+        """
+        HNSW neighbour-selection heuristic: take candidates best first and skip
+        those closer to an already selected neighbour than to the base point.
+        candidates are (similarity to the base point, node) pairs, best first.
+        """
+        selected = []
+        for similarity, node in candidates:
+            if len(selected) >= M:
+                break
+            if selected and np.max(self.vectors[selected] @ self.vectors[node]) > similarity:
+                continue
+            selected.append(node)
+        return selected
+
+    def _set_neighbors(self, layer, node, neighbors):
+        if layer == 0:
+            self.neighbors0[node, :len(neighbors)] = neighbors
+            self.neighbors0[node, len(neighbors):] = -1
+            self.degrees0[node] = len(neighbors)
+        else:
+            self.upper_layers[layer - 1][node] = np.array(neighbors, dtype=np.int32)
+
+    def _link(self, layer, node, neighbor):
+        """
+        Add node to neighbor's list, pruning the list with the heuristic when full.
+        """
+        capacity = 2 * self.M if layer == 0 else self.M
+        current = self._neighbors(layer, neighbor)
+        if len(current) < capacity:
+            self._set_neighbors(layer, neighbor, np.append(current, node))
+            return
+        candidates = np.append(current, node)
+        similarities = self.vectors[candidates] @ self.vectors[neighbor]
+        order = np.argsort(-similarities)
+        self._set_neighbors(layer, neighbor, self._select_neighbors(
+            list(zip(similarities[order].tolist(), candidates[order].tolist())), capacity))
+
+    @classmethod
+    def build(cls, vectors, M=16, ef_construction=100, seed=0):
+        """
+        Insert the rows of vectors (normalized internally) one by one.
+        """
+        vectors = normalize(vectors)
+        n = len(vectors)
+        rng = np.random.default_rng(seed)
+        levels = np.floor(-np.log(rng.random(n)) / math.log(M)).astype(np.int64)
+        index = cls(vectors, np.full((n, 2 * M), -1, dtype=np.int32), np.zeros(n, dtype=np.int32),
+                    [{} for _ in range(levels[0])], 0, M, ef_construction)
+        for layer in range(1, levels[0] + 1):
+            index.upper_layers[layer - 1][0] = np.zeros(0, dtype=np.int32)
+
+        for node in range(1, n):
+            query = vectors[node]
+            level = int(levels[node])
+            entry_points = [index.entry_point]
+            for layer in range(index.max_level, level, -1):
+                entry_points = [index._search_layer(query, entry_points, 1, layer)[0][1]]
+            for layer in range(min(level, index.max_level), -1, -1):
+                candidates = index._search_layer(query, entry_points, ef_construction, layer)
+                neighbors = index._select_neighbors(candidates, M)
+                index._set_neighbors(layer, node, neighbors)
+                for neighbor in neighbors:
+                    index._link(layer, node, neighbor)
+                entry_points = [candidate for _, candidate in candidates]
+            if level > index.max_level:
+                for _ in range(index.max_level, level):
+                    index.upper_layers.append({node: np.zeros(0, dtype=np.int32)})
+                index.entry_point = node
+        return index
+
+    def search(self, queries, k=10, ef=64):
+        """
+        Top-k cosine search with a layer-0 candidate list of size max(ef, k).
+        """
+        queries = normalize(np.atleast_2d(queries))
+        ids = np.empty((len(queries), k), dtype=np.int64)
+        scores = np.empty((len(queries), k), dtype=np.float32)
+        for i, query in enumerate(queries):
+            entry_points = [self.entry_point]
+            for layer in range(self.max_level, 0, -1):
+                entry_points = [self._search_layer(query, entry_points, 1, layer)[0][1]]
+            results = self._search_layer(query, entry_points, max(ef, k), 0)[:k]
+            found_ids = np.array([node for _, node in results], dtype=np.int64)
+            found_scores = np.array([s for s, _ in results], dtype=np.float32)
+            ids[i], scores[i] = _top_k(found_ids, found_scores, k)
+        return ids, scores
+
+    def save(self, directory):
+        arrays = {"vectors": self.vectors, "neighbors0": self.neighbors0, "degrees0": self.degrees0}
+        for layer, nodes in enumerate(self.upper_layers, start=1):
+            node_ids = np.array(sorted(nodes), dtype=np.int64)
+            padded = np.full((len(node_ids), self.M), -1, dtype=np.int32)
+            for row, node in enumerate(node_ids):
+                padded[row, :len(nodes[node])] = nodes[node]
+            arrays[f"layer{layer}_nodes"] = node_ids
+            arrays[f"layer{layer}_neighbors"] = padded
+        _save_arrays(directory, {"type": "hnsw", "M": self.M, "ef_construction": self.ef_construction,
+                                 "entry_point": int(self.entry_point), "max_level": self.max_level}, arrays)
+
+    @classmethod
+    def load(cls, directory):
+        meta, arrays = _load_arrays(directory)
+        upper_layers = []
+        for layer in range(1, meta["max_level"] + 1):
+            neighbors = np.asarray(arrays[f"layer{layer}_neighbors"])
+            upper_layers.append({int(node): row[row >= 0]
+                                 for node, row in zip(arrays[f"layer{layer}_nodes"], neighbors)})
+        return cls(arrays["vectors"], arrays["neighbors0"], arrays["degrees0"], upper_layers,
+                   meta["entry_point"], meta["M"], meta["ef_construction"])
+
+
+def synthetic_embeddings(num_vectors, dim=64, num_clusters=500, spread=1.0, seed=0):
+    """
+    Clustered random vectors, closer to real embeddings than uniform noise.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((num_clusters, dim))
+    labels = rng.integers(0, num_clusters, num_vectors)
+    return (centers[labels] + spread * rng.standard_normal((num_vectors, dim))).astype(np.float32)
+
+
+def benchmark(num_vectors=50_000, hnsw_vectors=20_000, dim=64, num_queries=500, k=10, seed=0):
+    """
+    Print build time and recall@k versus queries/sec for exact search, IVF,
+    IVF-PQ and HNSW. HNSW is built on a prefix of the data because its
+    insertion runs in Python.
+    """
+    rng = np.random.default_rng(seed)
+    vectors = normalize(synthetic_embeddings(num_vectors, dim, seed=seed))
+    queries = normalize(vectors[rng.choice(num_vectors, num_queries)]
+                        + 0.1 * rng.standard_normal((num_queries, dim)).astype(np.float32))
+
+    def run(name, search, true_ids):
+        start = time.perf_counter()
+        found_ids, _ = search()
+        qps = num_queries / (time.perf_counter() - start)
+        print(f"  {name:<28} recall@{k} {recall_at_k(found_ids, true_ids):.3f} {qps:10,.0f} queries/s")
+
+    print(f"{num_vectors:,} vectors, dim {dim}, {num_queries} queries")
+    start = time.perf_counter()
+    true_ids, _ = exact_search(vectors, queries, k)
+    print(f"  {'exact':<28} recall@{k} 1.000 {num_queries / (time.perf_counter() - start):10,.0f} queries/s")
+
+    directory = tempfile.mkdtemp(prefix="ann_")
+    for name, kwargs, knobs in (
+            ("IVF", {}, [{"nprobe": p} for p in (1, 4, 16, 64)]),
+            ("IVF-PQ", {"pq_subvectors": dim // 4, "keep_vectors": True},
+             [{"nprobe": p} for p in (4, 16, 64)] + [{"nprobe": 16, "rerank": 100}])):
+        start = time.perf_counter()
+        index = IVFIndex.build(vectors, **kwargs)
+        print(f"{name}: built in {time.perf_counter() - start:.1f}s ({index.nlist} lists)")
+        index.save(os.path.join(directory, name))
+        index = IVFIndex.load(os.path.join(directory, name))
+        for knob in knobs:
+            label = ", ".join(f"{key}={value}" for key, value in knob.items())
+            run(label, lambda: index.search(queries, k, **knob), true_ids)
+
+    subset = vectors[:hnsw_vectors]
+    subset_true, _ = exact_search(subset, queries, k)
+    start = time.perf_counter()
+    index = HNSWIndex.build(subset, M=16, ef_construction=64)
+    print(f"HNSW on {hnsw_vectors:,} vectors: built in {time.perf_counter() - start:.1f}s")
+    start = time.perf_counter()
+    exact_search(subset, queries, k)
+    print(f"  {'exact (same subset)':<28} recall@{k} 1.000 "
+          f"{num_queries / (time.perf_counter() - start):10,.0f} queries/s")
+    index.save(os.path.join(directory, "HNSW"))
+    index = HNSWIndex.load(os.path.join(directory, "HNSW"))
+    for ef in (16, 32, 64, 128):
+        run(f"ef={ef}", lambda: index.search(queries, k, ef=ef), subset_true)
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,355 @@
+"""Batched multi-head attention in NumPy.
+
+self_attention in transformer_example.py explains attention for a single
+query and prints every intermediate array. attention() is the batched
+version for real workloads:
+
+- queries, keys and values are (B, H, T, d) arrays (any leading dimensions
+  work), so all heads and sequences are handled by a few matmuls;
+- scores are scaled by 1/sqrt(d) and the softmax subtracts the row maximum,
+  so large dot products cannot overflow exp();
+- an optional boolean mask (True = may attend, broadcastable to
+  (B, H, T_q, T_k), e.g. from padding_mask()) and/or causal masking;
+- the score matrix and the output can be written into preallocated buffers,
+  so a loop over batches does not allocate; the softmax runs in place;
+- there is no printing on this path.
+
+blockwise_attention() computes the same result without materializing the
+(T_q, T_k) score matrix: keys and values are processed in blocks with an
+online softmax that keeps a running maximum and normalizer per query, so peak
+memory is O(T * block_size) instead of O(T^2) (flash-attention style).
+
+KVCache keeps the keys and values of all past positions of every layer in
+preallocated buffers that grow by doubling. Its attend_step() appends one new
+position and attends from that position only, so generating token t costs
+O(t) instead of recomputing attention over the whole sequence.
+
+Running this file benchmarks attention() against a per-query loop for sequence
+lengths 128 to 4096, measures peak RSS and wall time of attention() and
+blockwise_attention() in separate processes, and runs a decode loop with and
+without the KV cache.
+"""
+import multiprocessing as mp
+import resource
+import time
+
+import numpy as np
+
+
+def padding_mask(lengths, max_length):
+    """
+    Boolean mask of shape (B, 1, 1, max_length) that is True for the first
+    lengths[b] key positions of every sequence b.
+    """
+    lengths = np.asarray(lengths)
+    return (np.arange(max_length) < lengths[:, np.newaxis])[:, np.newaxis, np.newaxis, :]
+
+
+def causal_mask(num_queries, num_keys):
+    """
+    Boolean (T_q, T_k) mask letting query i attend to keys up to its own
+    position; queries are aligned with the last T_q keys.
+    """
+    return np.arange(num_keys) <= np.arange(num_keys - num_queries, num_keys)[:, np.newaxis]
+
+
+def attention(queries, keys, values, mask=None, causal=False, out=None, scores_out=None,
+              return_weights=False):
+    """
+    Scaled dot-product attention softmax(Q K^T / sqrt(d)) V.
+
+    Parameters:
+        queries: (..., T_q, d) array.
+        keys: (..., T_k, d) array.
+        values: (..., T_k, d_v) array.
+        mask: Optional boolean array broadcastable to (..., T_q, T_k); False
+            positions get zero weight.
+        causal: Mask out keys after each query's position.
+        out: Optional preallocated (..., T_q, d_v) output array.
+        scores_out: Optional preallocated (..., T_q, T_k) buffer for the scores
+            and attention weights.
+        return_weights: Also return the attention weights (a view of scores_out).
+
+    Returns:
+        The (..., T_q, d_v) attention output (and the weights). Queries that
+        may attend to no key get an all-zero output.
+    """
+    scale = 1.0 / np.sqrt(queries.shape[-1])
+    scores = np.matmul(queries, np.swapaxes(keys, -1, -2), out=scores_out)
+    scores *= scale
+    if causal:
+        mask = causal_mask(scores.shape[-2], scores.shape[-1]) if mask is None \
+            else mask & causal_mask(scores.shape[-2], scores.shape[-1])
+    if mask is not None:
+        np.copyto(scores, -np.inf, where=~np.asarray(mask, dtype=bool))
+
+    # Numerically stable softmax, in place
+    row_max = scores.max(axis=-1, keepdims=True)
+    row_max[~np.isfinite(row_max)] = 0.0        # fully masked rows
+    scores -= row_max
+    np.exp(scores, out=scores)
+    row_sum = scores.sum(axis=-1, keepdims=True)
+    row_sum[row_sum == 0] = 1.0
+    scores /= row_sum
+
+    output = np.matmul(scores, values, out=out)
+    if return_weights:
+        return output, scores
+    return output
+
+
+def blockwise_attention(queries, keys, values, mask=None, causal=False, block_size=512,
+                        query_block_size=None, out=None):
+    """
+    Same result as attention(), computed over blocks of keys with an online softmax.
+
+    Parameters:
+        block_size: Number of keys per block.
+        query_block_size: Optionally also process queries in blocks of this size,
+            which bounds the score buffer at query_block_size x block_size.
+        Other parameters as for attention().
+    """
+    num_queries, num_keys = queries.shape[-2], keys.shape[-2]
+    scale = 1.0 / np.sqrt(queries.shape[-1])
+    batch_shape = np.broadcast_shapes(queries.shape[:-2], keys.shape[:-2])
+    if out is None:
+        out = np.empty(batch_shape + (num_queries, values.shape[-1]),
+                       dtype=np.result_type(queries, keys, values))
+    if mask is not None:
+        # A broadcast view, so slicing it per block copies nothing
+        mask = np.broadcast_to(np.asarray(mask, dtype=bool), batch_shape + (num_queries, num_keys))
+    query_block_size = query_block_size or num_queries
+    offset = num_keys - num_queries           # queries are aligned with the last keys
+
+    for q_start in range(0, num_queries, query_block_size):
+        q_end = min(q_start + query_block_size, num_queries)
+        q_block = queries[..., q_start:q_end, :]
+        running_max = np.full(batch_shape + (q_end - q_start, 1), -np.inf, dtype=out.dtype)
+        normalizer = np.zeros_like(running_max)
+        accumulator = np.zeros(batch_shape + (q_end - q_start, values.shape[-1]), dtype=out.dtype)
+        # With causal masking, keys after the last query of the block are never needed
+        k_stop = min(num_keys, offset + q_end) if causal else num_keys
+
+        for k_start in range(0, k_stop, block_size):
+            k_end = min(k_start + block_size, k_stop)
+            scores = np.matmul(q_block, np.swapaxes(keys[..., k_start:k_end, :], -1, -2))
+            scores *= scale
+            block_mask = None if mask is None else mask[..., q_start:q_end, k_start:k_end]
+            if causal and k_end - 1 > offset + q_start:
+                allowed = np.arange(k_start, k_end) <= np.arange(offset + q_start, offset + q_end)[:, np.newaxis]
+                block_mask = allowed if block_mask is None else block_mask & allowed
+            if block_mask is not None:
+                np.copyto(scores, -np.inf, where=~block_mask)
+
+            # Online softmax: rescale what was accumulated under the old maximum
+            new_max = np.maximum(running_max, scores.max(axis=-1, keepdims=True))
+            shift = np.where(np.isfinite(new_max), new_max, 0.0)
+            correction = np.exp(running_max - shift)
+            scores -= shift
+            np.exp(scores, out=scores)
+            normalizer *= correction
+            normalizer += scores.sum(axis=-1, keepdims=True)
+            accumulator *= correction
+            accumulator += np.matmul(scores, values[..., k_start:k_end, :])
+            running_max = new_max
+
+        normalizer[normalizer == 0] = 1.0         # queries with no allowed key
+        np.divide(accumulator, normalizer, out=out[..., q_start:q_end, :])
+    return out
+
+
+class KVCache:
+    """
+    Growable key/value buffers of shape (B, H, capacity, d) for every layer.
+
+    Parameters:
+        num_layers: Number of attention layers.
+        num_heads: Heads per layer.
+        head_dim: Dimension of keys (and of values unless value_dim is given).
+        batch_size: Number of sequences decoded together.
+        capacity: Initial number of positions; buffers double when full.
+    """
+
+    def __init__(self, num_layers, num_heads, head_dim, batch_size=1, capacity=256, value_dim=None,
+                 dtype=np.float32):
+        value_dim = value_dim or head_dim
+        self._keys = [np.empty((batch_size, num_heads, capacity, head_dim), dtype=dtype)
+                      for _ in range(num_layers)]
+        self._values = [np.empty((batch_size, num_heads, capacity, value_dim), dtype=dtype)
+                        for _ in range(num_layers)]
+        self.lengths = [0] * num_layers
+
+    @property
+    def nbytes(self):
+        return sum(buffer.nbytes for buffer in self._keys + self._values)
+
+    def keys(self, layer):
+        return self._keys[layer][:, :, :self.lengths[layer]]
+
+    def values(self, layer):
+        return self._values[layer][:, :, :self.lengths[layer]]
+
+    def _grow(self, layer, needed):
+        capacity = self._keys[layer].shape[2]
+        while capacity < needed:
+            capacity *= 2
+        for buffers in (self._keys, self._values):
+            old = buffers[layer]
+            new = np.empty(old.shape[:2] + (capacity,) + old.shape[3:], dtype=old.dtype)
+            new[:, :, :self.lengths[layer]] = old[:, :, :self.lengths[layer]]
+            buffers[layer] = new
+
+    def append(self, layer, keys, values):
+        """
+        Append (B, H, t, d) keys and values (e.g. a whole prompt) to a layer.
+        """
+        length = self.lengths[layer]
+        end = length + keys.shape[2]
+        if end > self._keys[layer].shape[2]:
+            self._grow(layer, end)
+        self._keys[layer][:, :, length:end] = keys
+        self._values[layer][:, :, length:end] = values
+        self.lengths[layer] = end
+
+    def attend_step(self, layer, query, key, value, out=None):
+        """
+        Append one position and return its attention over all cached positions.
+
+        query, key and value have shape (B, H, d) or (B, H, 1, d). The new
+        position is the last one, so it may attend to every cached key and no
+        mask is needed. Returns a (B, H, 1, d_v) array (or fills out).
+        """
+        if query.ndim == 3:
+            query, key, value = query[:, :, np.newaxis], key[:, :, np.newaxis], value[:, :, np.newaxis]
+        self.append(layer, key, value)
+        return attention(query, self.keys(layer), self.values(layer), out=out)
+
+    def reset(self):
+        self.lengths = [0] * len(self.lengths)
+
+
+def per_query_attention(queries, keys, values):
+    """
+    Baseline: the single-query computation of transformer_example.py (with
+    scaling and max subtraction), looped over every batch, head and query.
+    """
+    output = np.empty(queries.shape[:-1] + values.shape[-1:], dtype=queries.dtype)
+    scale = 1.0 / np.sqrt(queries.shape[-1])
+    for index in np.ndindex(*queries.shape[:-1]):
+        head = index[:-1]
+        scores = np.dot(keys[head], queries[index]) * scale
+        weights = np.exp(scores - scores.max())
+        output[index] = np.dot(weights / weights.sum(), values[head])
+    return output
+
+
+def benchmark(seq_lengths=(128, 256, 512, 1024, 2048, 4096), batch_size=1, num_heads=4, head_dim=64,
+              baseline_max_length=1024, seed=0):
+    """
+    Print the time per call of attention() (with reused buffers) and of the
+    per-query loop for every sequence length.
+    """
+    rng = np.random.default_rng(seed)
+    print(f"B={batch_size}, H={num_heads}, d={head_dim}, float32")
+    for T in seq_lengths:
+        shape = (batch_size, num_heads, T, head_dim)
+        q, k, v = (rng.standard_normal(shape, dtype=np.float32) for _ in range(3))
+        out = np.empty(shape, dtype=np.float32)
+        scores = np.empty((batch_size, num_heads, T, T), dtype=np.float32)
+        attention(q, k, v, causal=True, out=out, scores_out=scores)    # warm-up
+
+        repeats = max(1, 2048 // T)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            attention(q, k, v, causal=True, out=out, scores_out=scores)
+        batched_ms = (time.perf_counter() - start) / repeats * 1000
+
+        line = f"T={T:>5}: attention {batched_ms:9.2f} ms"
+        if T <= baseline_max_length:
+            start = time.perf_counter()
+            per_query_attention(q, k, v)
+            line += f" | per-query loop {(time.perf_counter() - start) * 1000:9.2f} ms (no mask)"
+        print(line)
+
+
+def _measure(mode, seq_length, num_heads, head_dim, block_size, results):
+    rng = np.random.default_rng(0)
+    shape = (1, num_heads, seq_length, head_dim)
+    q, k, v = (rng.standard_normal(shape, dtype=np.float32) for _ in range(3))
+    inputs_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if mode == "naive":
+        attention(q, k, v, causal=True)
+    else:
+        blockwise_attention(q, k, v, causal=True, block_size=block_size)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux
+    results.put((elapsed, inputs_rss / 1024, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def benchmark_memory(seq_lengths=(1024, 4096, 16384), num_heads=1, head_dim=64, block_size=512):
+    """
+    Run attention() and blockwise_attention() in fresh processes and print
+    their wall time and peak RSS (with and without the inputs).
+    """
+    rng = np.random.default_rng(1)
+    q, k, v = (rng.standard_normal((2, 2, 1000, 32)) for _ in range(3))
+    error = np.max(np.abs(blockwise_attention(q, k, v, causal=True, block_size=96)
+                          - attention(q, k, v, causal=True)))
+    print(f"\nmax |blockwise - naive| = {error:.1e}")
+    print(f"H={num_heads}, d={head_dim}, causal, float32, block_size={block_size}")
+
+    context = mp.get_context("spawn")
+    for seq_length in seq_lengths:
+        for mode in ("naive", "blockwise"):
+            results = context.Queue()
+            process = context.Process(target=_measure,
+                                      args=(mode, seq_length, num_heads, head_dim, block_size, results))
+            process.start()
+            process.join()
+            if process.exitcode != 0:
+                print(f"T={seq_length:>6} {mode:>9}: failed (exit code {process.exitcode})")
+                continue
+            elapsed, inputs_mb, peak_mb = results.get()
+            print(f"T={seq_length:>6} {mode:>9}: {elapsed:8.2f} s, peak RSS {peak_mb:8.1f} MB "
+                  f"({peak_mb - inputs_mb:8.1f} MB above the inputs)")
+
+
+def benchmark_decode(num_tokens=4096, checkpoints=(256, 512, 1024, 2048, 4096), num_layers=2, num_heads=4,
+                     head_dim=64, window=64, recompute_max_length=1024, seed=0):
+    """
+    Decode num_tokens positions one at a time through num_layers attention
+    layers and print the per-token latency around each checkpoint, with the
+    KV cache and (up to recompute_max_length) without it, recomputing causal
+    attention over the whole prefix for every new token.
+    """
+    rng = np.random.default_rng(seed)
+    shape = (1, num_heads, 1, head_dim)
+    steps = [rng.standard_normal((3,) + shape, dtype=np.float32) for _ in range(num_tokens)]
+    cache = KVCache(num_layers, num_heads, head_dim)
+    out = np.empty(shape, dtype=np.float32)
+    step_times = np.empty(num_tokens)
+    for t, (q, k, v) in enumerate(steps):
+        start = time.perf_counter()
+        for layer in range(num_layers):
+            cache.attend_step(layer, q, k, v, out=out)
+        step_times[t] = time.perf_counter() - start
+
+    print(f"\nDecode: {num_layers} layers, H={num_heads}, d={head_dim}, float32 "
+          f"(cache now {cache.nbytes / 1e6:.1f} MB)")
+    for checkpoint in checkpoints:
+        cached_us = step_times[checkpoint - window:checkpoint].mean() * 1e6
+        line = f"context {checkpoint:>5}: KV cache {cached_us:9.1f} us/token"
+        if checkpoint <= recompute_max_length:
+            q, k, v = (np.concatenate([step[i] for step in steps[:checkpoint]], axis=2) for i in range(3))
+            start = time.perf_counter()
+            for layer in range(num_layers):
+                attention(q, k, v, causal=True)
+            line += f" | recompute {(time.perf_counter() - start) * 1e6:11.1f} us/token"
+        print(line)
+
+
+if __name__ == "__main__":
+    benchmark()
+    benchmark_memory()
+    benchmark_decode()
@@ -0,0 +1,334 @@
+"""Scaling benchmarks for the generative-ai-essentials algorithms.
+
+The scripts in this folder run once, at import time, on a three-sentence
+corpus, so they say nothing about how the algorithms scale. This harness runs
+the reusable code paths (tokenizer, preprocessing, TF-IDF, n-gram,
+bag-of-words, skip-gram, CBOW, GloVe and attention) on synthetic corpora of
+increasing size and records, per stage and size:
+
+- wall time and throughput (tokens/s) of the stage itself, without corpus
+  generation and setup;
+- peak RSS of the process, and how far the stage raised it above the peak
+  reached after setup (every run happens in a fresh spawned process, so the
+  numbers are not polluted by earlier runs);
+- the scaling exponent log(t2 / t1) / log(n2 / n1) against the previous size:
+  about 1 for linear stages, 2 for quadratic ones.
+
+The corpus has Zipf-distributed words and a vocabulary that grows like
+sqrt(tokens) (Heaps' law). Slow stages have a default token cap (see STAGES,
+override with --max-tokens); sizes above it, and sizes after a timeout, are
+reported as skipped. For the attention stages the size is the sequence length.
+
+The report is written as JSON; --baseline compares it with an earlier report
+and exits with status 1 if a stage got slower or used more memory than the
+threshold allows:
+
+    python benchmark_suite.py --sizes 1000 10000 100000 --output before.json
+    python benchmark_suite.py --sizes 1000 10000 100000 --baseline before.json
+"""
+import argparse
+import collections
+import datetime
+import json
+import math
+import multiprocessing as mp
+import os
+import platform
+import queue
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from attention import attention, blockwise_attention
+from cbow_batched import train_cbow_batched
+from cooccurrence import CooccurrenceBuilder
+from fast_tokenizer import tokenize_batch
+from glove_trainer import GloVeTrainer
+from hashing_bow import hashing_bow
+from ngram_model import NGramModel
+from pair_stream import CbowPairs, SkipGramPairs
+from preprocessing_pipeline import PreprocessingPipeline
+from skip_gram_objectives import train_skip_gram
+from tfidf_engine import TfidfEngine
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+REPORT_VERSION = 1
+
+Corpus = collections.namedtuple("Corpus", "sentences sentence_ids word_counts num_tokens")
+
+
+def synthetic_corpus(num_tokens, sentence_length=20, vocab_size=None, seed=0):
+    """
+    Zipf-distributed words "w0", "w1", ... in sentences of sentence_length
+    tokens, as strings and as int32 id arrays.
+    """
+    vocab_size = vocab_size or max(10, int(10 * math.sqrt(num_tokens)))
+    rng = np.random.default_rng(seed)
+    cum_weights = np.cumsum(1.0 / np.arange(1, vocab_size + 1))
+    ids = np.searchsorted(cum_weights, rng.random(num_tokens) * cum_weights[-1]).astype(np.int32)
+    ids = np.minimum(ids, vocab_size - 1)
+    words = [f"w{i}" for i in range(vocab_size)]
+    sentence_ids = np.split(ids, np.arange(sentence_length, num_tokens, sentence_length))
+    sentences = [" ".join(map(words.__getitem__, s.tolist())) for s in sentence_ids]
+    return Corpus(sentences, sentence_ids, np.bincount(ids, minlength=vocab_size), num_tokens)
+
+
+# Each stage prepares its inputs from a corpus (not timed) and returns the work to time.
+
+def _tokenizer(corpus):
+    return lambda: collections.deque(tokenize_batch(corpus.sentences), maxlen=0)
+
+
+def _preprocessing(corpus):
+    pipeline = PreprocessingPipeline()
+    return lambda: collections.deque(pipeline.process_lines(corpus.sentences), maxlen=0)
+
+
+def _tfidf(corpus):
+    def run():
+        engine = TfidfEngine()
+        engine.add_documents(corpus.sentences)
+        engine.top_k("w0 w1 w2", k=10)
+    return run
+
+
+def _ngram(corpus):
+    def run():
+        model = NGramModel(order=3, smoothing="kneser_ney")
+        model.fit(corpus.sentences)
+        model.perplexity(corpus.sentences[:1_000])
+    return run
+
+
+def _bag_of_words(corpus):
+    return lambda: hashing_bow(iter(corpus.sentences))
+
+
+def _skip_gram(corpus):
+    pairs = SkipGramPairs(corpus.sentence_ids, window_size=2, seed=0)
+    return lambda: train_skip_gram(pairs, corpus.word_counts, embedding_dim=50, epochs=1, seed=0, log_every=0)
+
+
+def _cbow(corpus):
+    pairs = CbowPairs(corpus.sentence_ids, window_size=2, batch_size=256, seed=0)
+    rng = np.random.default_rng(0)
+    vocab_size, embedding_dim = len(corpus.word_counts), 50
+    W1 = (rng.random((vocab_size, embedding_dim)) - 0.5) / embedding_dim
+    W2 = (rng.random((embedding_dim, vocab_size)) - 0.5) / embedding_dim
+    return lambda: train_cbow_batched(pairs, W1, W2, epochs=1, log_every=0)
+
+
+def _glove(corpus):
+    def run():
+        directory = tempfile.mkdtemp(prefix="glove_bench_")
+        try:
+            builder = CooccurrenceBuilder(len(corpus.word_counts), window_size=2, tmp_dir=directory)
+            builder.add_sentences(corpus.sentence_ids)
+            matrix = builder.finalize(os.path.join(directory, "matrix"))
+            trainer = GloVeTrainer(matrix.vocab_size, embedding_dim=50, seed=0)
+            trainer.train_epoch(matrix.rows, matrix.cols, matrix.counts)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    return run
+
+
+def _attention_inputs(corpus, num_heads=4, head_dim=64):
+    rng = np.random.default_rng(0)
+    shape = (1, num_heads, corpus.num_tokens, head_dim)
+    return [rng.standard_normal(shape, dtype=np.float32) for _ in range(3)]
+
+
+def _attention(corpus):
+    q, k, v = _attention_inputs(corpus)
+    return lambda: attention(q, k, v, causal=True)
+
+
+def _blockwise_attention(corpus):
+    q, k, v = _attention_inputs(corpus)
+    return lambda: blockwise_attention(q, k, v, causal=True)
+
+
+# name -> (setup, default maximum number of tokens or None)
+STAGES = {
+    "tokenizer": (_tokenizer, None),
+    "preprocessing": (_preprocessing, None),
+    "tfidf": (_tfidf, None),
+    "ngram": (_ngram, None),
+    "bag_of_words": (_bag_of_words, None),
+    "skip_gram": (_skip_gram, 100_000),           # one Python-level update per pair
+    "cbow": (_cbow, 1_000_000),                   # full softmax: O(vocab_size) per pair
+    "glove": (_glove, None),
+    "attention": (_attention, 8_192),             # sequence length; (T x T) scores per head
+    "blockwise_attention": (_blockwise_attention, 16_384),
+}
+
+
+def _needs_corpus(stage):
+    return stage not in ("attention", "blockwise_attention")
+
+
+def _run_stage(stage, num_tokens, seed, results):
+    if _needs_corpus(stage):
+        corpus = synthetic_corpus(num_tokens, seed=seed)
+    else:
+        corpus = Corpus(None, None, None, num_tokens)
+    work = STAGES[stage][0](corpus)
+    # ru_maxrss is in KiB on Linux
+    setup_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    start = time.perf_counter()
+    work()
+    elapsed = time.perf_counter() - start
+    results.put((elapsed, setup_rss, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def measure(stage, num_tokens, seed=0, timeout=None):
+    """
+    Run one stage on a corpus of num_tokens in a fresh process.
+    Returns a result dict with status "ok", "timeout" or "failed".
+    """
+    result = {"stage": stage, "tokens": num_tokens}
+    context = mp.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_run_stage, args=(stage, num_tokens, seed, results))
+    process.start()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        try:
+            elapsed, setup_rss, peak_rss = results.get(timeout=1)
+            break
+        except queue.Empty:
+            # A crashed run (e.g. MemoryError, OOM kill) is reported without waiting for the timeout
+            if not process.is_alive() and results.empty():
+                process.join()
+                result["status"] = "failed"
+                return result
+            if deadline is not None and time.monotonic() > deadline:
+                process.terminate()
+                process.join()
+                result["status"] = "timeout"
+                return result
+    process.join()
+    result.update(status="ok", seconds=elapsed, tokens_per_sec=num_tokens / max(elapsed, 1e-9),
+                  peak_rss_mb=peak_rss, stage_rss_mb=peak_rss - setup_rss)
+    return result
+
+
+def run_suite(stages=tuple(STAGES), sizes=DEFAULT_SIZES, max_tokens=None, seed=0, timeout=600):
+    """
+    Measure every stage at every size and return the report dict.
+
+    max_tokens optionally overrides the per-stage caps of STAGES ({stage: tokens or None}).
+    """
+    caps = {name: cap for name, (_, cap) in STAGES.items()}
+    caps.update(max_tokens or {})
+    results = []
+    for stage in stages:
+        previous = None
+        stopped = None
+        for num_tokens in sorted(sizes):
+            if stopped is None and caps[stage] is not None and num_tokens > caps[stage]:
+                stopped = f"above the {caps[stage]:,}-token cap"
+            if stopped:
+                result = {"stage": stage, "tokens": num_tokens, "status": "skipped", "reason": stopped}
+            else:
+                result = measure(stage, num_tokens, seed, timeout)
+            if result["status"] == "ok":
+                if previous is not None:
+                    result["scaling_exponent"] = (math.log(result["seconds"] / previous["seconds"])
+                                                  / math.log(num_tokens / previous["tokens"]))
+                previous = result
+            elif not stopped:
+                stopped = f"{result['status']} at {num_tokens:,} tokens"
+            _print_result(result)
+            results.append(result)
+    return {
+        "version": REPORT_VERSION,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "environment": {"python": platform.python_version(), "numpy": np.__version__,
+                        "platform": platform.platform(), "cpu_count": os.cpu_count()},
+        "seed": seed,
+        "results": results,
+    }
+
+
+def _print_result(result):
+    name = f"{result['stage']:>20} {result['tokens']:>12,}"
+    if result["status"] != "ok":
+        print(f"{name}  {result['status']}{': ' + result['reason'] if 'reason' in result else ''}")
+        return
+    exponent = result.get("scaling_exponent")
+    print(f"{name}  {result['seconds']:9.3f} s {result['tokens_per_sec']:14,.0f} tokens/s "
+          f"peak {result['peak_rss_mb']:8.1f} MB (+{result['stage_rss_mb']:7.1f} MB)"
+          + (f"  exponent {exponent:4.2f}" if exponent is not None else ""))
+
+
+def compare(report, baseline, threshold=1.25, min_seconds=0.05, min_mb=10.0):
+    """
+    Compare two reports run by run. Returns a list of regression messages:
+    a run is slower, or raised the peak memory more, than threshold times the
+    baseline. Runs faster than min_seconds (or adding less than min_mb) are
+    too noisy to compare and are ignored for that metric.
+    """
+    before = {(r["stage"], r["tokens"]): r for r in baseline["results"] if r["status"] == "ok"}
+    regressions = []
+    for result in report["results"]:
+        old = before.get((result["stage"], result["tokens"]))
+        if old is None or result["status"] != "ok":
+            continue
+        name = f"{result['stage']} @ {result['tokens']:,} tokens"
+        if max(result["seconds"], old["seconds"]) >= min_seconds and result["seconds"] > threshold * old["seconds"]:
+            regressions.append(f"{name}: {old['seconds']:.3f} s -> {result['seconds']:.3f} s "
+                               f"({result['seconds'] / old['seconds']:.2f}x)")
+        if (max(result["stage_rss_mb"], old["stage_rss_mb"]) >= min_mb
+                and result["stage_rss_mb"] > threshold * old["stage_rss_mb"]):
+            regressions.append(f"{name}: +{old['stage_rss_mb']:.1f} MB -> +{result['stage_rss_mb']:.1f} MB")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES),
+                        help="corpus sizes in tokens (sequence lengths for attention)")
+    parser.add_argument("--max-tokens", action="append", default=[], metavar="STAGE=N",
+                        help="override a stage's token cap; N=none removes it")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds per run before it is killed")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_report.json")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="slowdown / memory growth ratio reported as a regression")
+    args = parser.parse_args(argv)
+
+    max_tokens = {}
+    for override in args.max_tokens:
+        stage, _, value = override.partition("=")
+        if stage not in STAGES:
+            parser.error(f"unknown stage {stage!r} in --max-tokens")
+        max_tokens[stage] = None if value.lower() == "none" else int(value)
+
+    report = run_suite(args.stages, args.sizes, max_tokens, args.seed, args.timeout)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}")
+    superlinear = [r for r in report["results"] if r.get("scaling_exponent", 0) > 1.5]
+    for result in superlinear:
+        print(f"Superlinear: {result['stage']} @ {result['tokens']:,} tokens "
+              f"(exponent {result['scaling_exponent']:.2f})")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        print(f"{len(regressions)} regression(s) against {args.baseline}")
+        for message in regressions:
+            print(f"  {message}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
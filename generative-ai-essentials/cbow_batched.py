@@ -0,0 +1,157 @@
+"""Mini-batched CBOW training.
+
+continuous_BOW.py trains on one (context, center) pair at a time and updates
+the W1 rows of the context words in a Python loop. Here the contexts of a whole
+batch are packed into a padded int32 matrix plus a lengths vector, so that:
+
+- the averaged hidden states of the batch come from one masked gather and sum,
+- the output scores of the batch come from one (B x d) @ (d x V) matmul,
+- the W1 updates for all context words are applied with a single np.add.at.
+
+The gradients of the pairs in a batch are summed. They are all evaluated at
+the weights from the start of the batch, so a batch step equals the script's
+per-pair updates only for batch_size=1; larger batches approximate them.
+Running this file compares the throughput of both modes.
+"""
+import time
+
+import numpy as np
+
+from pair_stream import CbowPairs
+
+
+def pack_contexts(training_pairs):
+    """
+    Pack (context_indices, center_index) pairs into arrays.
+
+    Returns:
+        contexts: int32 matrix of shape (num_pairs, max_context_len), padded with 0.
+        lengths: int32 vector with the number of real context words per row.
+        centers: int32 vector with the center word of each row.
+    """
+    lengths = np.array([len(context) for context, _ in training_pairs], dtype=np.int32)
+    contexts = np.zeros((len(training_pairs), lengths.max(initial=1)), dtype=np.int32)
+    for row, (context, _) in enumerate(training_pairs):
+        contexts[row, :len(context)] = context
+    centers = np.array([center for _, center in training_pairs], dtype=np.int32)
+    return contexts, lengths, centers
+
+
+def cbow_batch_step(W1, W2, contexts, lengths, centers, learning_rate):
+    """
+    Run one forward/backward pass over a batch and update W1 and W2 in place.
+    Returns the summed loss of the batch.
+    """
+    batch_size, max_len = contexts.shape
+    mask = np.arange(max_len) < lengths[:, np.newaxis]            # shape: (B, max_len)
+
+    # ---------- Forward Pass ----------
+    context_embeddings = W1[contexts] * mask[:, :, np.newaxis]    # shape: (B, max_len, d)
+    h = context_embeddings.sum(axis=1) / lengths[:, np.newaxis]   # shape: (B, d)
+    scores = h @ W2                                               # shape: (B, V)
+    scores -= scores.max(axis=1, keepdims=True)
+    y_pred = np.exp(scores)
+    y_pred /= y_pred.sum(axis=1, keepdims=True)
+    rows = np.arange(batch_size)
+    loss = -np.sum(np.log(y_pred[rows, centers] + 1e-7))
+
+    # ---------- Backward Pass ----------
+    error = y_pred                                                # reuse the buffer
+    error[rows, centers] -= 1
+    grad_W2 = h.T @ error                                         # shape: (d, V)
+    grad_context = (error @ W2.T) / lengths[:, np.newaxis]        # shape: (B, d)
+
+    # ---------- Update Weights ----------
+    # Every real context position receives its row's gradient; np.add.at
+    # accumulates words that occur several times in the batch.
+    np.add.at(W1, contexts[mask], -learning_rate * np.repeat(grad_context, lengths, axis=0))
+    W2 -= learning_rate * grad_W2
+    return loss
+
+
+def train_cbow_batched(training_pairs, W1, W2, learning_rate=0.01, epochs=100, batch_size=256,
+                       seed=None, log_every=10):
+    """
+    Train CBOW in mini-batches, updating W1 and W2 in place.
+
+    training_pairs is either a list of (context_indices, center_idx) tuples,
+    which is packed once and shuffled every epoch, or a pair_stream.CbowPairs
+    stream, whose batches() (of the stream's own batch size) are consumed as
+    they are generated.
+    Returns the average loss of the last epoch.
+    """
+    rng = np.random.default_rng(seed)
+    if isinstance(training_pairs, CbowPairs):
+        def epoch_batches():
+            return training_pairs.batches()
+    else:
+        contexts, lengths, centers = pack_contexts(training_pairs)
+
+        def epoch_batches():
+            order = rng.permutation(len(centers))
+            for begin in range(0, len(centers), batch_size):
+                batch = order[begin:begin + batch_size]
+                yield contexts[batch], lengths[batch], centers[batch]
+
+    avg_loss = 0.0
+    for epoch in range(epochs):
+        loss_epoch = 0.0
+        num_pairs = 0
+        for batch_contexts, batch_lengths, batch_centers in epoch_batches():
+            loss_epoch += cbow_batch_step(W1, W2, batch_contexts, batch_lengths, batch_centers, learning_rate)
+            num_pairs += len(batch_centers)
+        avg_loss = loss_epoch / max(num_pairs, 1)
+        if log_every and (epoch + 1) % log_every == 0:
+            print(f"Epoch {epoch + 1}/{epochs} - Average Loss: {avg_loss:.4f}")
+    return avg_loss
+
+
+def per_pair_step(W1, W2, context_indices, center_idx, learning_rate):
+    """
+    The per-pair update from continuous_BOW.py, kept as the benchmark baseline.
+    """
+    h = np.mean(np.array([W1[idx] for idx in context_indices]), axis=0)
+    scores = np.dot(h, W2)
+    y_pred = np.exp(scores - np.max(scores))
+    y_pred /= np.sum(y_pred)
+    loss = -np.log(y_pred[center_idx] + 1e-7)
+    y_true = np.zeros(W2.shape[1])
+    y_true[center_idx] = 1
+    error = y_pred - y_true
+    grad_W2 = np.outer(h, error)
+    grad_context = np.dot(W2, error) / len(context_indices)
+    for idx in context_indices:
+        W1[idx] -= learning_rate * grad_context
+    W2 -= learning_rate * grad_W2
+    return loss
+
+
+def benchmark(vocab_sizes=(1_000, 10_000), num_pairs=4_096, embedding_dim=100, window_size=2,
+              batch_size=256, seed=0):
+    """
+    Compare training pairs/sec of the per-pair loop and the batched mode.
+    """
+    rng = np.random.default_rng(seed)
+    print(f"{'vocab':>8} | {'per-pair':>18} | {'batched':>18}")
+    for vocab_size in vocab_sizes:
+        training_pairs = [
+            (rng.integers(0, vocab_size, rng.integers(1, 2 * window_size + 1)).tolist(),
+             int(rng.integers(0, vocab_size)))
+            for _ in range(num_pairs)
+        ]
+        W1 = rng.random((vocab_size, embedding_dim))
+        W2 = rng.random((embedding_dim, vocab_size))
+
+        start = time.perf_counter()
+        for context_indices, center_idx in training_pairs:
+            per_pair_step(W1, W2, context_indices, center_idx, 0.01)
+        per_pair_rate = num_pairs / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        train_cbow_batched(training_pairs, W1, W2, 0.01, epochs=1, batch_size=batch_size, log_every=0)
+        batched_rate = num_pairs / (time.perf_counter() - start)
+        print(f"{vocab_size:>8} | {per_pair_rate:>11,.0f} pairs/s | {batched_rate:>11,.0f} pairs/s")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -1,5 +1,12 @@
+import os
+from collections import Counter
+
 import numpy as np
 
+from cbow_batched import train_cbow_batched
+from embedding_store import EmbeddingStore
+from pair_stream import CbowPairs, encode_sentences, keep_probabilities
+
 def softmax(x):
     """
     Compute the softmax of vector x in a numerically stable way.
@@ -52,23 +59,24 @@ for word, idx in word2idx.items():
 # In CBOW, given the context words, we try to predict the center word.
 # For each word in a sentence, the context is defined as the words
 # within a window size (excluding the center word itself).
+# The pairs are generated lazily, one sentence at a time (see pair_stream.py),
+# instead of being stored in a list; every pass over training_pairs is one epoch.
+# On real corpora, subsampling of frequent words (e.g. subsample_threshold = 1e-3)
+# and dynamic windows cut down the number of useless updates. Both are off here
+# because in a three-sentence corpus every word counts as "frequent".
 # ---------------------------------------------------
 window_size = 1
-training_pairs = []  # Each element is a tuple: (context_indices, center_index)
-
-for sentence in sentences:
-    for idx, word in enumerate(sentence):
-        center_index = word2idx[word]
-        context_indices = []
-        # Collect words before the center word
-        for i in range(max(0, idx - window_size), idx):
-            context_indices.append(word2idx[sentence[i]])
-        # Collect words after the center word
-        for i in range(idx + 1, min(len(sentence), idx + window_size + 1)):
-            context_indices.append(word2idx[sentence[i]])
-        # Only add pairs where there is at least one context word
-        if context_indices:
-            training_pairs.append((context_indices, center_index))
+batch_size = 4            # Pairs per NumPy batch (one update each in the "batched" training mode)
+subsample_threshold = None
+dynamic_window = False
+
+keep_prob = None
+if subsample_threshold:
+    word_counts = Counter(word for sentence in sentences for word in sentence)
+    keep_prob = keep_probabilities([word_counts[word] for word in vocab], subsample_threshold)
+# Each element is a tuple: (context_indices, center_index)
+training_pairs = CbowPairs(encode_sentences(sentences, word2idx), window_size, batch_size,
+                           keep_prob=keep_prob, dynamic_window=dynamic_window)
 
 print("\nTraining Pairs (context word indices, center word index):")
 for context_idxs, center_idx in training_pairs:
@@ -83,6 +91,10 @@ embedding_dim = 10        # Dimension of the embedding vector
 learning_rate = 0.01      # Learning rate for gradient descent
 epochs = 100              # Number of epochs to train
 vocab_size = len(vocab)   # Number of unique words in the vocabulary
+# "per_pair" updates the weights after every training pair (easy to follow);
+# "batched" packs batch_size pairs into arrays and trains them with one matmul
+# and one scatter-add per batch (see cbow_batched.py).
+training_mode = "per_pair"
 
 # Weight matrices:
 # W1: shape (vocab_size, embedding_dim) maps a one-hot vector to an embedding.
@@ -94,56 +106,61 @@ W2 = np.random.rand(embedding_dim, vocab_size)
 # Step 6: Training the CBOW Model
 # ---------------------------------------------------
 print("\nStarting CBOW training...\n")
-for epoch in range(epochs):
-    loss_epoch = 0  # Accumulate loss over the epoch
-
-    # Process each training pair
-    for context_indices, center_idx in training_pairs:
-        # ---------- Forward Pass ----------
-        # 1. Look up embeddings for each context word from W1
-        context_embeddings = np.array([W1[idx] for idx in context_indices])
+if training_mode == "batched":
+    train_cbow_batched(training_pairs, W1, W2, learning_rate, epochs)
+else:
+    for epoch in range(epochs):
+        loss_epoch = 0  # Accumulate loss over the epoch
+        num_pairs = 0   # The pair stream has no length, so count while iterating
+
+        # Process each training pair
+        for context_indices, center_idx in training_pairs:
+            # ---------- Forward Pass ----------
+            # 1. Look up embeddings for each context word from W1
+            context_embeddings = np.array([W1[idx] for idx in context_indices])
         
-        # 2. Compute the hidden layer representation by averaging the context embeddings
-        h = np.mean(context_embeddings, axis=0)  # Shape: (embedding_dim,)
+            # 2. Compute the hidden layer representation by averaging the context embeddings
+            h = np.mean(context_embeddings, axis=0)  # Shape: (embedding_dim,)
         
-        # 3. Compute the scores over the vocabulary using W2
-        scores = np.dot(h, W2)  # Shape: (vocab_size,)
+            # 3. Compute the scores over the vocabulary using W2
+            scores = np.dot(h, W2)  # Shape: (vocab_size,)
         
-        # 4. Apply softmax to obtain predicted probabilities
-        y_pred = softmax(scores)
+            # 4. Apply softmax to obtain predicted probabilities
+            y_pred = softmax(scores)
         
-        # 5. Compute the loss (negative log likelihood for the true center word)
-        loss = -np.log(y_pred[center_idx] + 1e-7)  # Adding epsilon to avoid log(0)
-        loss_epoch += loss
-
-        # ---------- Backward Pass ----------
-        # 1. Compute error: the derivative of the loss with respect to the scores
-        y_true = np.zeros(vocab_size)
-        y_true[center_idx] = 1
-        error = y_pred - y_true  # Shape: (vocab_size,)
+            # 5. Compute the loss (negative log likelihood for the true center word)
+            loss = -np.log(y_pred[center_idx] + 1e-7)  # Adding epsilon to avoid log(0)
+            loss_epoch += loss
+            num_pairs += 1
+
+            # ---------- Backward Pass ----------
+            # 1. Compute error: the derivative of the loss with respect to the scores
+            y_true = np.zeros(vocab_size)
+            y_true[center_idx] = 1
+            error = y_pred - y_true  # Shape: (vocab_size,)
         
-        # 2. Compute gradient for W2 as the outer product of h and the error
-        grad_W2 = np.outer(h, error)  # Shape: (embedding_dim, vocab_size)
+            # 2. Compute gradient for W2 as the outer product of h and the error
+            grad_W2 = np.outer(h, error)  # Shape: (embedding_dim, vocab_size)
         
-        # 3. Compute gradient with respect to the hidden representation h
-        grad_h = np.dot(W2, error)  # Shape: (embedding_dim,)
+            # 3. Compute gradient with respect to the hidden representation h
+            grad_h = np.dot(W2, error)  # Shape: (embedding_dim,)
         
-        # 4. Since h is the average of the context embeddings,
-        #    distribute the gradient equally among them.
-        grad_context = grad_h / len(context_indices)
+            # 4. Since h is the average of the context embeddings,
+            #    distribute the gradient equally among them.
+            grad_context = grad_h / len(context_indices)
         
-        # ---------- Update Weights ----------
-        # Update W1 for each context word in the training pair.
-        for idx in context_indices:
-            W1[idx] -= learning_rate * grad_context
+            # ---------- Update Weights ----------
+            # Update W1 for each context word in the training pair.
+            for idx in context_indices:
+                W1[idx] -= learning_rate * grad_context
         
-        # Update W2
-        W2 -= learning_rate * grad_W2
+            # Update W2
+            W2 -= learning_rate * grad_W2
 
-    # Print the average loss every 10 epochs for monitoring.
-    if (epoch + 1) % 10 == 0:
-        avg_loss = loss_epoch / len(training_pairs)
-        print(f"Epoch {epoch + 1}/{epochs} - Average Loss: {avg_loss:.4f}")
+        # Print the average loss every 10 epochs for monitoring.
+        if (epoch + 1) % 10 == 0:
+            avg_loss = loss_epoch / num_pairs
+            print(f"Epoch {epoch + 1}/{epochs} - Average Loss: {avg_loss:.4f}")
 
 print("\nCBOW Training complete!")
 
@@ -152,4 +169,15 @@ print("\nCBOW Training complete!")
 # ---------------------------------------------------
 print("\nLearned Word Embeddings (from W1):")
 for word, idx in word2idx.items():
-    print(f" {word}: {W1[idx]}")
\ No newline at end of file
+    print(f" {word}: {W1[idx]}")
+
+# ---------------------------------------------------
+# Step 8: Save the Embeddings
+# ---------------------------------------------------
+# Saved as float32 .npy plus a vocabulary file and reopened memory-mapped, so they
+# can be queried later without retraining (see embedding_store.py)
+embeddings_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "embeddings", "cbow")
+EmbeddingStore.save(embeddings_dir, vocab, W1)
+store = EmbeddingStore.open(embeddings_dir)
+print(f"\nEmbeddings saved to {embeddings_dir}")
+print(f"Most similar to '{vocab[0]}':", store.most_similar(vocab[0], k=3))
@@ -0,0 +1,253 @@
+"""Out-of-core co-occurrence counting for GloVe.
+
+Glove-like.py counts co-occurrences into a dense (vocab_size x vocab_size)
+array with nested Python loops. CooccurrenceBuilder instead reads the corpus
+as a stream of token-id sentences and counts whole blocks of tokens with array
+operations. Each (row, col) pair is packed into one int64 key
+(row * vocab_size + col). Once the in-memory buffer reaches
+`max_buffer_entries`, it is reduced to unique sorted keys and spilled to disk
+as a shard. finalize() merges the sorted shards one key range at a time and
+writes a row-sorted COO/CSR matrix that load_cooccurrence() reopens through
+np.memmap.
+"""
+import json
+import os
+import shutil
+import tempfile
+from collections import Counter
+
+import numpy as np
+
+
+def build_vocab(lines, min_count=1):
+    """
+    Count words over a stream of sentences in one pass.
+    Returns (vocab, word2idx), with words sorted by descending frequency.
+    """
+    counts = Counter()
+    for line in lines:
+        counts.update(line.lower().split())
+    vocab = [word for word, count in counts.most_common() if count >= min_count]
+    word2idx = {word: idx for idx, word in enumerate(vocab)}
+    return vocab, word2idx
+
+
+def iter_token_ids(lines, word2idx):
+    """
+    Lowercase, split and encode each sentence, dropping out-of-vocabulary words.
+    Yields one int32 array per sentence.
+    """
+    for line in lines:
+        ids = [word2idx[word] for word in line.lower().split() if word in word2idx]
+        yield np.array(ids, dtype=np.int32)
+
+
+def _reduce(keys, values):
+    """
+    Sum the values of duplicate keys. Returns the unique sorted keys and their totals.
+    """
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    return unique_keys, np.bincount(inverse, weights=values).astype(np.float32)
+
+
+class CooccurrenceMatrix:
+    """
+    Read-only co-occurrence matrix backed by memory-mapped files.
+
+    The entries are sorted by (row, col). So `rows`/`cols`/`counts` are COO
+    arrays, and `indptr` makes `cols`/`counts` a CSR matrix as well.
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.path = path
+        self.vocab_size = self.meta["vocab_size"]
+        self.nnz = self.meta["nnz"]
+        self.rows = self._open("rows.bin", np.int32, self.nnz)
+        self.cols = self._open("cols.bin", np.int32, self.nnz)
+        self.counts = self._open("counts.bin", np.float32, self.nnz)
+        self.indptr = self._open("indptr.bin", np.int64, self.vocab_size + 1)
+
+    def _open(self, name, dtype, length):
+        if length == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(os.path.join(self.path, name), dtype=dtype, mode="r", shape=(length,))
+
+    def row(self, i):
+        """
+        Return (cols, counts) of the non-zero entries in row i.
+        """
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return self.cols[start:end], self.counts[start:end]
+
+    def to_scipy(self):
+        """
+        Wrap the memory-mapped arrays in a scipy.sparse.csr_matrix (no copy of the data).
+        """
+        from scipy.sparse import csr_matrix
+        return csr_matrix((self.counts, self.cols, self.indptr), shape=(self.vocab_size, self.vocab_size))
+
+
+def load_cooccurrence(path):
+    """
+    Open a co-occurrence matrix written by CooccurrenceBuilder.finalize().
+    """
+    return CooccurrenceMatrix(path)
+
+
+class CooccurrenceBuilder:
+    """
+    Streaming co-occurrence counter with bounded memory.
+
+    Parameters:
+        vocab_size: Number of word types; token ids must be in [0, vocab_size).
+        window_size: Number of words on each side of a word that count as context.
+        distance_weighting: If True, a pair d words apart adds 1/d instead of 1.
+        max_buffer_entries: Number of pending (key, count) entries kept in RAM
+            before they are reduced and spilled to disk as a sorted shard.
+        block_tokens: Number of buffered tokens counted together in one vectorized pass.
+        tmp_dir: Directory for the spilled shards (a temporary one by default).
+    """
+
+    def __init__(self, vocab_size, window_size=1, distance_weighting=True,
+                 max_buffer_entries=10_000_000, block_tokens=1_000_000, tmp_dir=None):
+        if vocab_size ** 2 >= 2 ** 63:
+            raise ValueError("vocab_size is too large to pack (row, col) pairs into int64 keys")
+        self.vocab_size = vocab_size
+        self.window_size = window_size
+        self.distance_weighting = distance_weighting
+        self.max_buffer_entries = max_buffer_entries
+        self.block_tokens = block_tokens
+        self._owns_tmp_dir = tmp_dir is None
+        self.tmp_dir = tmp_dir or tempfile.mkdtemp(prefix="cooc_shards_")
+
+        self._pending_sentences = []
+        self._pending_tokens = 0
+        self._buffer_keys = []
+        self._buffer_values = []
+        self._buffer_entries = 0
+        self._shards = []
+
+    def add_sentence(self, token_ids):
+        """
+        Queue one sentence (a sequence of token ids) for counting.
+        """
+        token_ids = np.asarray(token_ids, dtype=np.int64)
+        if len(token_ids) < 2:
+            return
+        self._pending_sentences.append(token_ids)
+        self._pending_tokens += len(token_ids)
+        if self._pending_tokens >= self.block_tokens:
+            self._count_block()
+
+    def add_sentences(self, sentences):
+        for token_ids in sentences:
+            self.add_sentence(token_ids)
+
+    def _count_block(self):
+        """
+        Count all pending sentences at once. Tokens are concatenated with a
+        parallel sentence-id array, so pairs that cross a sentence boundary can
+        be masked out.
+        """
+        if not self._pending_sentences:
+            return
+        ids = np.concatenate(self._pending_sentences)
+        sentence_ids = np.repeat(np.arange(len(self._pending_sentences)),
+                                 [len(s) for s in self._pending_sentences])
+        self._pending_sentences = []
+        self._pending_tokens = 0
+
+        for distance in range(1, self.window_size + 1):
+            same_sentence = sentence_ids[:-distance] == sentence_ids[distance:]
+            left = ids[:-distance][same_sentence]
+            right = ids[distance:][same_sentence]
+            if len(left) == 0:
+                continue
+            weight = 1.0 / distance if self.distance_weighting else 1.0
+            # The context window is symmetric, so count both directions
+            keys = np.concatenate((left * self.vocab_size + right, right * self.vocab_size + left))
+            self._buffer_keys.append(keys)
+            self._buffer_values.append(np.full(len(keys), weight, dtype=np.float64))
+            self._buffer_entries += len(keys)
+
+        if self._buffer_entries >= self.max_buffer_entries:
+            self._spill()
+
+    def _spill(self):
+        """
+        Reduce the buffer to unique sorted keys and write it to disk as a shard.
+        """
+        if not self._buffer_keys:
+            return
+        keys, values = _reduce(np.concatenate(self._buffer_keys), np.concatenate(self._buffer_values))
+        self._buffer_keys, self._buffer_values, self._buffer_entries = [], [], 0
+
+        shard = os.path.join(self.tmp_dir, f"shard_{len(self._shards):05d}")
+        np.save(shard + "_keys.npy", keys)
+        np.save(shard + "_values.npy", values)
+        self._shards.append(shard)
+
+    def finalize(self, out_dir):
+        """
+        Flush the remaining counts and merge all shards into `out_dir`.
+        Returns the merged matrix opened as a CooccurrenceMatrix.
+        """
+        self._count_block()
+        self._spill()
+        os.makedirs(out_dir, exist_ok=True)
+
+        shards = [(np.load(s + "_keys.npy", mmap_mode="r"), np.load(s + "_values.npy", mmap_mode="r"))
+                  for s in self._shards]
+        row_lengths = np.zeros(self.vocab_size, dtype=np.int64)
+        nnz = 0
+        with open(os.path.join(out_dir, "rows.bin"), "wb") as rows_file, \
+                open(os.path.join(out_dir, "cols.bin"), "wb") as cols_file, \
+                open(os.path.join(out_dir, "counts.bin"), "wb") as counts_file:
+            for keys, values in self._merge(shards):
+                rows = (keys // self.vocab_size).astype(np.int32)
+                rows.tofile(rows_file)
+                (keys % self.vocab_size).astype(np.int32).tofile(cols_file)
+                values.astype(np.float32).tofile(counts_file)
+                row_lengths += np.bincount(rows, minlength=self.vocab_size)
+                nnz += len(keys)
+
+        indptr = np.concatenate(([0], np.cumsum(row_lengths)))
+        indptr.tofile(os.path.join(out_dir, "indptr.bin"))
+        meta = {
+            "vocab_size": self.vocab_size,
+            "nnz": nnz,
+            "window_size": self.window_size,
+            "distance_weighting": self.distance_weighting,
+        }
+        with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+
+        del shards
+        self._shards = []
+        if self._owns_tmp_dir:
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        return CooccurrenceMatrix(out_dir)
+
+    def _merge(self, shards):
+        """
+        Merge sorted shards one key range at a time.
+
+        Every shard contributes a key sampled every `step` entries to the range
+        boundaries. Between two consecutive boundaries each shard therefore holds
+        at most `step` entries, which bounds the memory used by each merge step.
+        """
+        if not shards:
+            return
+        step = max(1, self.max_buffer_entries // len(shards))
+        bounds = np.unique(np.concatenate([keys[::step] for keys, _ in shards]))[1:]
+        positions = [0] * len(shards)
+        for bound in list(bounds) + [None]:
+            part_keys, part_values = [], []
+            for s, (keys, values) in enumerate(shards):
+                end = len(keys) if bound is None else int(np.searchsorted(keys, bound))
+                part_keys.append(keys[positions[s]:end])
+                part_values.append(values[positions[s]:end])
+                positions[s] = end
+            yield _reduce(np.concatenate(part_keys), np.concatenate(part_values))
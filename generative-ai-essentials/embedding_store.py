@@ -0,0 +1,167 @@
+"""Persisted word embeddings with vectorized nearest-neighbour queries.
+
+skip_gram.py, continuous_BOW.py and Glove-like.py print their learned
+embeddings and then discard them. EmbeddingStore.save() writes a matrix to a
+directory:
+
+    vectors.npy             float32 (vocab_size, dim) embeddings
+    vocab.txt               one word per line, in row order
+    vectors.normalized.npy  unit-length rows, written once on first open
+
+EmbeddingStore.open() memory-maps both .npy files (np.load with mmap_mode),
+so opening is instant and every process that serves lookups from the same
+directory shares the pages instead of holding its own copy. The normalized
+sidecar is computed the first time a store is opened (or when it is older
+than vectors.npy) and replaced atomically.
+
+most_similar_many() answers a batch of queries with one matrix multiply
+against the normalized rows plus np.argpartition; most_similar() is the
+single-word case. Running this file benchmarks it against a per-word loop.
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+
+VECTORS = "vectors.npy"
+NORMALIZED = "vectors.normalized.npy"
+VOCAB = "vocab.txt"
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+class EmbeddingStore:
+    def __init__(self, vocab, vectors, normalized):
+        self.vocab = list(vocab)
+        self.word2idx = {word: idx for idx, word in enumerate(self.vocab)}
+        self.vectors = vectors
+        self.normalized = normalized
+
+    @classmethod
+    def save(cls, directory, vocab, vectors):
+        """
+        Write vectors (one row per word of vocab) and the vocabulary to directory.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vocab) != len(vectors):
+            raise ValueError(f"{len(vocab)} words but {len(vectors)} vectors")
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, VECTORS), vectors)
+        with open(os.path.join(directory, VOCAB), "w", encoding="utf-8") as f:
+            f.writelines(word + "\n" for word in vocab)
+        normalized_path = os.path.join(directory, NORMALIZED)
+        if os.path.exists(normalized_path):
+            os.remove(normalized_path)
+
+    @classmethod
+    def open(cls, directory):
+        """
+        Memory-map a saved store, writing its normalized sidecar if needed.
+        """
+        vectors_path = os.path.join(directory, VECTORS)
+        normalized_path = os.path.join(directory, NORMALIZED)
+        with open(os.path.join(directory, VOCAB), "r", encoding="utf-8") as f:
+            vocab = f.read().splitlines()
+        vectors = np.load(vectors_path, mmap_mode="r")
+        if (not os.path.exists(normalized_path)
+                or os.path.getmtime(normalized_path) < os.path.getmtime(vectors_path)):
+            # Write to a temporary file and rename, so concurrent readers never see a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".npy")
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, _normalize(vectors))
+            os.replace(tmp_path, normalized_path)
+        return cls(vocab, vectors, np.load(normalized_path, mmap_mode="r"))
+
+    def __len__(self):
+        return len(self.vocab)
+
+    def __contains__(self, word):
+        return word in self.word2idx
+
+    def vector(self, word):
+        return self.vectors[self.word2idx[word]]
+
+    def similar_to_vectors(self, queries, k=10, exclude=None, chunk_size=1024):
+        """
+        The k rows with the highest cosine similarity to each query vector.
+
+        exclude optionally gives one row id per query to leave out (e.g. the
+        query word itself). Returns (ids, scores) arrays of shape (num_queries, k),
+        best first.
+        """
+        queries = _normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        k = min(k, len(self) - (exclude is not None))
+        ids = np.empty((len(queries), k), dtype=np.int64)
+        scores = np.empty((len(queries), k), dtype=np.float32)
+        for start in range(0, len(queries), chunk_size):
+            end = min(start + chunk_size, len(queries))
+            similarities = queries[start:end] @ self.normalized.T        # shape: (chunk, vocab_size)
+            rows = np.arange(end - start)
+            if exclude is not None:
+                similarities[rows, exclude[start:end]] = -np.inf
+            best = np.argpartition(-similarities, k - 1, axis=1)[:, :k] if k < len(self) \
+                else np.tile(np.arange(len(self)), (end - start, 1))
+            best_scores = similarities[rows[:, np.newaxis], best]
+            order = np.argsort(-best_scores, axis=1)
+            ids[start:end] = np.take_along_axis(best, order, axis=1)
+            scores[start:end] = np.take_along_axis(best_scores, order, axis=1)
+        return ids, scores
+
+    def most_similar_many(self, words, k=10):
+        """
+        The k most similar words (by cosine) of each word, as lists of (word, score).
+        """
+        word_ids = np.array([self.word2idx[word] for word in words], dtype=np.int64)
+        ids, scores = self.similar_to_vectors(self.normalized[word_ids], k, exclude=word_ids)
+        return [[(self.vocab[i], float(s)) for i, s in zip(row_ids, row_scores)]
+                for row_ids, row_scores in zip(ids, scores)]
+
+    def most_similar(self, word, k=10):
+        return self.most_similar_many([word], k)[0]
+
+
+def benchmark(vocab_size=100_000, dim=100, num_queries=1_000, k=10, seed=0):
+    """
+    Compare batched queries with a per-word loop (one matrix-vector product
+    and a full sort per query).
+    """
+    rng = np.random.default_rng(seed)
+    vocab = [f"w{i}" for i in range(vocab_size)]
+    directory = tempfile.mkdtemp(prefix="embeddings_")
+    EmbeddingStore.save(directory, vocab, rng.standard_normal((vocab_size, dim)))
+    start = time.perf_counter()
+    store = EmbeddingStore.open(directory)
+    first_open = time.perf_counter() - start
+    start = time.perf_counter()
+    store = EmbeddingStore.open(directory)
+    print(f"Opened {vocab_size:,} x {dim} store: first {first_open * 1000:.1f} ms (writes the normalized "
+          f"sidecar), then {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    words = [vocab[i] for i in rng.choice(vocab_size, num_queries, replace=False)]
+    start = time.perf_counter()
+    batched = store.most_similar_many(words, k)
+    batched_rate = num_queries / (time.perf_counter() - start)
+
+    loop_queries = words[:200]
+    start = time.perf_counter()
+    vectors = np.asarray(store.vectors)
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    looped = []
+    for word in loop_queries:
+        similarities = normalized @ normalized[store.word2idx[word]]
+        similarities[store.word2idx[word]] = -np.inf
+        looped.append([vocab[i] for i in np.argsort(-similarities)[:k]])
+    loop_rate = len(loop_queries) / (time.perf_counter() - start)
+    mismatches = sum(expected != [w for w, _ in result] for expected, result in zip(looped, batched))
+    print(f"Queries with different neighbours: {mismatches}")
+    print(f"per-word loop: {loop_rate:10,.0f} queries/s")
+    print(f"      batched: {batched_rate:10,.0f} queries/s")
+
+
+if __name__ == "__main__":
+    benchmark()
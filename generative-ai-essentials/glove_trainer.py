@@ -0,0 +1,154 @@
+"""Vectorized GloVe trainer over sparse co-occurrence counts.
+
+Glove-like.py walks every (i, j) cell of the dense co-occurrence matrix in pure
+Python. This module trains on the non-zero entries only, stored as COO arrays
+(rows, cols, counts), in shuffled mini-batches. Weights, diffs and gradients are
+computed with array operations and the AdaGrad updates are applied per
+mini-batch with a scatter-add (np.add.at), so repeated words in a batch
+accumulate their gradients instead of overwriting each other.
+"""
+import time
+
+import numpy as np
+
+
+def weighting_func_vec(x, x_max=100, alpha=0.75):
+    """
+    Vectorized version of weighting_func from Glove-like.py.
+    Returns (x / x_max)^alpha where x < x_max and 1 elsewhere.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    return np.where(x < x_max, (x / x_max) ** alpha, 1.0)
+
+
+class GloVeTrainer:
+    """
+    GloVe model trained with AdaGrad on mini-batches of non-zero co-occurrences.
+
+    We minimize the same cost as Glove-like.py:
+        f(X_ij) * (w_i^T w_j~ + b_i + b_j~ - log(X_ij))^2
+    """
+
+    def __init__(self, vocab_size, embedding_dim=10, learning_rate=0.05,
+                 x_max=100, alpha=0.75, seed=None):
+        self.vocab_size = vocab_size
+        self.embedding_dim = embedding_dim
+        self.learning_rate = learning_rate
+        self.x_max = x_max
+        self.alpha = alpha
+        self.rng = np.random.default_rng(seed)
+
+        # Same initialization scheme as the reference script, centred around zero
+        scale = 0.5 / embedding_dim
+        self.W = (self.rng.random((vocab_size, embedding_dim)) - 0.5) * scale
+        self.W_context = (self.rng.random((vocab_size, embedding_dim)) - 0.5) * scale
+        self.b = (self.rng.random(vocab_size) - 0.5) * scale
+        self.b_context = (self.rng.random(vocab_size) - 0.5) * scale
+
+        # AdaGrad accumulators of squared gradients (initialized to 1 as in the GloVe paper)
+        self.gradsq_W = np.ones_like(self.W)
+        self.gradsq_W_context = np.ones_like(self.W_context)
+        self.gradsq_b = np.ones_like(self.b)
+        self.gradsq_b_context = np.ones_like(self.b_context)
+
+    def _adagrad_update(self, params, gradsq, idx, grads):
+        """
+        Scatter-add the per-entry gradients onto their rows, then apply one
+        AdaGrad step to every row touched by the batch.
+        """
+        touched, inverse = np.unique(idx, return_inverse=True)
+        summed = np.zeros((len(touched),) + params.shape[1:])
+        np.add.at(summed, inverse, grads)
+        gradsq[touched] += summed ** 2
+        params[touched] -= self.learning_rate * summed / np.sqrt(gradsq[touched])
+
+    def train_batch(self, rows, cols, counts):
+        """
+        Run one AdaGrad step on a mini-batch of co-occurrence entries.
+        Returns the weighted cost of the batch before the update.
+        """
+        w_i = self.W[rows]
+        w_j = self.W_context[cols]
+
+        weight = weighting_func_vec(counts, self.x_max, self.alpha)
+        diff = np.einsum("ij,ij->i", w_i, w_j) + self.b[rows] + self.b_context[cols] - np.log(counts)
+        cost = np.sum(weight * diff ** 2)
+
+        # Gradient of the squared error (the factor 2 comes from the derivative of the square)
+        grad = 2 * weight * diff
+        self._adagrad_update(self.W, self.gradsq_W, rows, grad[:, np.newaxis] * w_j)
+        self._adagrad_update(self.W_context, self.gradsq_W_context, cols, grad[:, np.newaxis] * w_i)
+        self._adagrad_update(self.b, self.gradsq_b, rows, grad)
+        self._adagrad_update(self.b_context, self.gradsq_b_context, cols, grad)
+        return cost
+
+    def _batches(self, n, batch_size, block_size):
+        """
+        Yield index arrays covering [0, n) in shuffled mini-batches.
+
+        With block_size=None the whole epoch is one permutation. Otherwise the
+        data is read as contiguous blocks in random order and shuffled within
+        each block, which keeps reads from a memory-mapped matrix sequential.
+        """
+        if block_size is None:
+            order = self.rng.permutation(n)
+            for begin in range(0, n, batch_size):
+                yield order[begin:begin + batch_size]
+            return
+        for block_start in self.rng.permutation(np.arange(0, n, block_size)):
+            block = block_start + self.rng.permutation(min(block_size, n - block_start))
+            for begin in range(0, len(block), batch_size):
+                yield block[begin:begin + batch_size]
+
+    def train_epoch(self, rows, cols, counts, batch_size=4096, block_size=None):
+        """
+        Visit every non-zero entry once, in shuffled mini-batches.
+        rows/cols/counts may be np.memmap arrays (see cooccurrence.py); pass a
+        block_size to stream them from disk instead of shuffling globally.
+        Returns (total_cost, pairs_per_sec).
+        """
+        n = len(counts)
+        total_cost = 0.0
+        start = time.perf_counter()
+        for batch in self._batches(n, batch_size, block_size):
+            if block_size is not None:
+                batch.sort()  # sequential reads inside the block
+            total_cost += self.train_batch(
+                np.asarray(rows[batch], dtype=np.intp),
+                np.asarray(cols[batch], dtype=np.intp),
+                np.asarray(counts[batch], dtype=np.float64),
+            )
+        elapsed = time.perf_counter() - start
+        return total_cost, n / max(elapsed, 1e-12)
+
+    def fit(self, rows, cols, counts, epochs=100, batch_size=4096, block_size=None, log_every=10):
+        """
+        Train for the given number of epochs.
+        Returns a list with one {"epoch", "cost", "pairs_per_sec"} dict per epoch.
+        """
+        history = []
+        for epoch in range(epochs):
+            total_cost, pairs_per_sec = self.train_epoch(rows, cols, counts, batch_size, block_size)
+            history.append({"epoch": epoch + 1, "cost": total_cost, "pairs_per_sec": pairs_per_sec})
+            if log_every and (epoch + 1) % log_every == 0:
+                print(f"Epoch {epoch + 1}/{epochs}, Total Cost: {total_cost:.4f}, "
+                      f"Pairs/sec: {pairs_per_sec:,.0f}")
+        return history
+
+    def embeddings(self):
+        """
+        Combine word and context embeddings as the final representation.
+        """
+        return self.W + self.W_context
+
+
+if __name__ == "__main__":
+    # Quick throughput check on a synthetic sparse co-occurrence matrix
+    rng = np.random.default_rng(0)
+    vocab_size, nnz = 100_000, 1_000_000
+    rows = rng.integers(0, vocab_size, nnz).astype(np.int32)
+    cols = rng.integers(0, vocab_size, nnz).astype(np.int32)
+    counts = rng.zipf(1.5, nnz).clip(max=10_000).astype(np.float32)
+
+    trainer = GloVeTrainer(vocab_size, embedding_dim=50, seed=0)
+    trainer.fit(rows, cols, counts, epochs=3, batch_size=8192, log_every=1)
@@ -0,0 +1,121 @@
+"""Out-of-core bag-of-words with the hashing trick.
+
+Bag_of_words.py uses CountVectorizer.fit_transform, which keeps a
+vocabulary dict of every distinct token and has to see the whole corpus before
+producing its matrix. hashing_bow() instead maps every token to one of a fixed
+number of columns with sklearn's HashingVectorizer (same token_pattern and
+lowercasing, raw counts: no alternating signs, no normalization), so:
+
+- no vocabulary is kept, and memory does not grow with the number of
+  distinct tokens;
+- documents are consumed from any iterable (e.g. a generator reading files)
+  in chunks, and each chunk becomes a small CSR matrix;
+- chunks can be vectorized in parallel worker processes; the partial
+  matrices are stacked in order at the end.
+
+Distinct tokens that hash to the same column are counted together; with
+2**20 features this is rare for typical vocabularies. Running this file
+compares peak memory (tracemalloc) and throughput with CountVectorizer.
+"""
+import itertools
+import multiprocessing as mp
+import random
+import time
+import tracemalloc
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer
+
+TOKEN_PATTERN = r'(?u)\b\w+\b'  # As in Bag_of_words.py: words of any length, including single characters
+
+_worker_vectorizer = None
+
+
+def make_vectorizer(n_features=2 ** 20, token_pattern=TOKEN_PATTERN):
+    """
+    A stateless HashingVectorizer that returns raw token counts.
+    """
+    return HashingVectorizer(n_features=n_features, token_pattern=token_pattern, alternate_sign=False,
+                             norm=None, dtype=np.int64)
+
+
+def iter_chunks(documents, chunk_size):
+    """
+    Group an iterable of documents into lists of at most chunk_size.
+    """
+    chunk = []
+    for document in documents:
+        chunk.append(document)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _init_worker(n_features, token_pattern):
+    global _worker_vectorizer
+    _worker_vectorizer = make_vectorizer(n_features, token_pattern)
+
+
+def _transform_chunk(chunk):
+    return _worker_vectorizer.transform(chunk)
+
+
+def hashing_bow(documents, n_features=2 ** 20, chunk_size=10_000, processes=None,
+                token_pattern=TOKEN_PATTERN):
+    """
+    Count tokens of an iterable of documents into a (num_documents x n_features) CSR matrix.
+
+    With processes set (> 1), chunks are vectorized by a process pool.
+    """
+    chunks = iter_chunks(documents, chunk_size)
+    if not processes or processes <= 1:
+        vectorizer = make_vectorizer(n_features, token_pattern)
+        parts = [vectorizer.transform(chunk) for chunk in chunks]
+    else:
+        with mp.Pool(processes, initializer=_init_worker, initargs=(n_features, token_pattern)) as pool:
+            parts = list(pool.imap(_transform_chunk, chunks))
+    if not parts:
+        return sparse.csr_matrix((0, n_features), dtype=np.int64)
+    return sparse.vstack(parts, format="csr")
+
+
+def synthetic_documents(num_documents, vocab_size=200_000, words_per_document=100, seed=0):
+    """
+    Generate documents with Zipf-distributed words, one at a time.
+    """
+    rng = random.Random(seed)
+    words = [f"w{i}" for i in range(vocab_size)]
+    cum_weights = list(itertools.accumulate(1.0 / rank for rank in range(1, vocab_size + 1)))
+    for _ in range(num_documents):
+        yield " ".join(rng.choices(words, cum_weights=cum_weights, k=words_per_document))
+
+
+def benchmark(num_documents=20_000, processes=(2, 4)):
+    """
+    Print throughput and peak traced memory of CountVectorizer and of the
+    hashing pipeline, both fed from a generator. tracemalloc slows allocation
+    down, so each run is timed first and traced in a second pass; memory of
+    worker processes is not traced, only that of the parent.
+    """
+    documents = list(synthetic_documents(num_documents))
+    runs = [("CountVectorizer", lambda: CountVectorizer(token_pattern=TOKEN_PATTERN).fit_transform(iter(documents))),
+            ("hashing", lambda: hashing_bow(iter(documents)))]
+    runs += [(f"hashing, {n} processes", lambda n=n: hashing_bow(iter(documents), processes=n)) for n in processes]
+    for name, run in runs:
+        start = time.perf_counter()
+        matrix = run()
+        elapsed = time.perf_counter() - start
+        del matrix
+        tracemalloc.start()
+        matrix = run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{name:>22}: {num_documents / elapsed:10,.0f} docs/s, peak {peak / 1e6:7.1f} MB, "
+              f"{matrix.nnz:,} non-zeros")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,269 @@
+"""Multi-core Hogwild training for skip-gram and CBOW.
+
+skip_gram.py and continuous_BOW.py train on a single core. Here W1 and the
+output weights live in multiprocessing.shared_memory blocks, and each worker
+process trains on its own shard of the training pairs: every num_workers-th
+sentence of a SkipGramPairs / CbowPairs stream (pair_stream.py), generated
+batch by batch inside the worker, or a slice of a list of pairs. Workers
+update the shared matrices without locks (Hogwild). The learning rate decays
+linearly with the number of pairs processed by all workers together, which is
+tracked in a shared counter.
+
+- "skip_gram" workers use the negative-sampling update from skip_gram_objectives.py.
+  Each step touches only a few rows of W1 and W_out, so collisions between
+  workers are rare and harmless: this is the sparse case Hogwild relies on.
+- "cbow" workers use the mini-batch update from cbow_batched.py. Its full
+  softmax writes the whole (d, V) W_out on every batch, so all workers write
+  every output column at the same time. Updates can be lost to these races and
+  the memory traffic limits the speedup; the CBOW path is not Hogwild-sparse.
+
+Running this file trains both models on the pair streams of the scripts'
+corpus, then prints the pairs/sec scaling at 1, 2, 4 and 8 workers.
+"""
+import multiprocessing as mp
+import time
+from multiprocessing import connection, shared_memory
+
+import numpy as np
+
+from cbow_batched import cbow_batch_step, pack_contexts
+from pair_stream import CbowPairs, SkipGramPairs, encode_sentences
+from skip_gram_objectives import negative_sampling_step, sample_negatives, unigram_table
+
+MODELS = ("skip_gram", "cbow")
+
+# Batch size of skip-gram workers on a list of pairs; the shared progress counter is updated once per batch
+PROGRESS_INTERVAL = 1_000
+
+
+def _create_shared_array(array):
+    """
+    Copy an array into a new shared memory block.
+    Returns (block, view, spec), where spec lets other processes attach to it.
+    """
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+    view[...] = array
+    return block, view, (block.name, array.shape, array.dtype.str)
+
+
+def _attach_shared_array(spec):
+    name, shape, dtype = spec
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+
+def _current_learning_rate(settings, progress):
+    """
+    Linear decay from learning_rate to learning_rate * min_learning_rate_ratio,
+    driven by the number of pairs processed by all workers.
+    """
+    done = progress.value / settings["total_pairs"]
+    return settings["learning_rate"] * max(settings["min_learning_rate_ratio"], 1.0 - done)
+
+
+def _epoch_batches(shard, rng, batch_size, shuffle):
+    """
+    One epoch of a worker's shard: the batches() of a pair stream, or slices of
+    batch_size rows of pre-built arrays (in random order when shuffle is set).
+    """
+    if isinstance(shard, (SkipGramPairs, CbowPairs)):
+        return shard.batches()
+    num_pairs = len(shard[-1])
+    order = rng.permutation(num_pairs) if shuffle else np.arange(num_pairs)
+    return (tuple(array[order[begin:begin + batch_size]] for array in shard)
+            for begin in range(0, num_pairs, batch_size))
+
+
+def _skip_gram_worker(specs, shard, settings, progress, seed):
+    W1_block, W1 = _attach_shared_array(specs["W1"])
+    W_out_block, W_out = _attach_shared_array(specs["W_out"])
+    table_block, table = _attach_shared_array(specs["table"])
+    rng = np.random.default_rng(seed)
+    negative_samples = settings["negative_samples"]
+
+    for _ in range(settings["epochs"]):
+        for centers, contexts in _epoch_batches(shard, rng, PROGRESS_INTERVAL, shuffle=False):
+            learning_rate = _current_learning_rate(settings, progress)
+            for center_idx, context_idx in zip(centers.tolist(), contexts.tolist()):
+                negatives = sample_negatives(table, negative_samples, rng)
+                negative_sampling_step(W1, W_out, center_idx, context_idx, negatives, learning_rate)
+            with progress.get_lock():
+                progress.value += len(centers)
+
+    del W1, W_out, table
+    for block in (W1_block, W_out_block, table_block):
+        block.close()
+
+
+def _cbow_worker(specs, shard, settings, progress, seed):
+    W1_block, W1 = _attach_shared_array(specs["W1"])
+    W_out_block, W_out = _attach_shared_array(specs["W_out"])
+    rng = np.random.default_rng(seed)
+
+    for _ in range(settings["epochs"]):
+        for contexts, lengths, centers in _epoch_batches(shard, rng, settings["batch_size"], shuffle=True):
+            learning_rate = _current_learning_rate(settings, progress)
+            cbow_batch_step(W1, W_out, contexts, lengths, centers, learning_rate)
+            with progress.get_lock():
+                progress.value += len(centers)
+
+    del W1, W_out
+    W1_block.close()
+    W_out_block.close()
+
+
+def _join_workers(workers):
+    """
+    Wait until every worker has exited. As soon as one fails, stop waiting
+    for the others and raise a RuntimeError listing every failed exit code;
+    the caller stops the workers that are still running.
+    """
+    pending = list(workers)
+    failed = []
+    while pending and not failed:
+        connection.wait([process.sentinel for process in pending])
+        pending = [process for process in pending if process.exitcode is None]
+        failed = [(worker_id, process.exitcode) for worker_id, process in enumerate(workers) if process.exitcode]
+    if failed:
+        raise RuntimeError("Hogwild workers failed: " + ", ".join(
+            f"worker {worker_id} exited with code {exitcode}" for worker_id, exitcode in failed))
+
+
+def train_hogwild(model, training_pairs, vocab_size, word_counts=None, embedding_dim=100, num_workers=4,
+                  epochs=1, learning_rate=0.025, min_learning_rate_ratio=1e-4, negative_samples=5,
+                  batch_size=64, pairs_per_epoch=None, seed=0):
+    """
+    Train skip-gram or CBOW embeddings with num_workers Hogwild processes.
+
+    Parameters:
+        model: "skip_gram" or "cbow".
+        training_pairs: The SkipGramPairs / CbowPairs stream built by skip_gram.py
+            and continuous_BOW.py. Each worker trains on its own shard() of it,
+            in the stream's batches, so no worker holds more than one batch of
+            pairs. A list of (center_idx, context_idx) tuples for skip-gram, or
+            of (context_indices, center_idx) tuples for CBOW, is also accepted;
+            it is packed into arrays and split into contiguous slices.
+        word_counts: Corpus frequency of each word index (needed for skip-gram negatives).
+        batch_size: CBOW batch size for a list of pairs (a stream uses its own).
+        pairs_per_epoch: Number of pairs in one epoch of a stream, for the
+            learning-rate schedule; counted with one extra pass when None.
+
+    Returns:
+        W1: The learned word embeddings, shape (vocab_size, embedding_dim).
+        W_out: Output weights ((vocab_size, d) for skip-gram, (d, vocab_size) for CBOW).
+    """
+    if model not in MODELS:
+        raise ValueError(f"Unknown model {model!r}; expected one of {MODELS}")
+    if model == "skip_gram" and word_counts is None:
+        raise ValueError("word_counts is required to build the negative-sampling table")
+    stream_type = SkipGramPairs if model == "skip_gram" else CbowPairs
+    if isinstance(training_pairs, (SkipGramPairs, CbowPairs)) and not isinstance(training_pairs, stream_type):
+        raise ValueError(f"{model} training needs a {stream_type.__name__} stream, "
+                         f"got {type(training_pairs).__name__}")
+
+    rng = np.random.default_rng(seed)
+    arrays = {"W1": (rng.random((vocab_size, embedding_dim)) - 0.5) / embedding_dim}
+    if model == "skip_gram":
+        arrays["W_out"] = np.zeros((vocab_size, embedding_dim))
+        arrays["table"] = unigram_table(word_counts)
+        target = _skip_gram_worker
+    else:
+        arrays["W_out"] = rng.random((embedding_dim, vocab_size))
+        target = _cbow_worker
+
+    if isinstance(training_pairs, stream_type):
+        num_pairs = pairs_per_epoch if pairs_per_epoch is not None else training_pairs.count_pairs()
+        shards = [training_pairs.shard(worker_id, num_workers, seed + worker_id + 1)
+                  for worker_id in range(num_workers)]
+    else:
+        if model == "skip_gram":
+            pairs = np.asarray(training_pairs, dtype=np.int32).reshape(-1, 2)
+            data = (pairs[:, 0], pairs[:, 1])
+        else:
+            data = pack_contexts(training_pairs)
+        num_pairs = len(data[-1])
+        shard_bounds = np.linspace(0, num_pairs, num_workers + 1).astype(int)
+        shards = [tuple(array[begin:end] for array in data)
+                  for begin, end in zip(shard_bounds[:-1], shard_bounds[1:])]
+
+    blocks, views, specs = {}, {}, {}
+    for name, array in arrays.items():
+        blocks[name], views[name], specs[name] = _create_shared_array(array)
+    workers = []
+    try:
+        settings = {
+            "epochs": epochs,
+            "learning_rate": learning_rate,
+            "min_learning_rate_ratio": min_learning_rate_ratio,
+            "negative_samples": negative_samples,
+            "batch_size": batch_size,
+            "total_pairs": max(num_pairs * epochs, 1),
+        }
+        progress = mp.Value("q", 0)
+        for worker_id, shard in enumerate(shards):
+            process = mp.Process(target=target, args=(specs, shard, settings, progress, seed + worker_id + 1))
+            process.start()
+            workers.append(process)
+        _join_workers(workers)
+
+        W1, W_out = views["W1"].copy(), views["W_out"].copy()
+    finally:
+        # Workers still writing to the shared blocks (after an error) are stopped before the blocks are unlinked
+        for process in workers:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        views.clear()
+        for block in blocks.values():
+            block.close()
+            block.unlink()
+    return W1, W_out
+
+
+def check_script_pairs(num_workers=2):
+    """
+    Train both models on pair streams built like the ones of skip_gram.py and
+    continuous_BOW.py, and check that the embeddings were updated.
+    """
+    sentences = [sentence.lower().split() for sentence in ("I like deep learning", "I like NLP", "I enjoy flying")]
+    vocab = sorted({word for sentence in sentences for word in sentence})
+    word2idx = {word: idx for idx, word in enumerate(vocab)}
+    encoded = encode_sentences(sentences, word2idx)
+    word_counts = np.bincount(np.concatenate(encoded), minlength=len(vocab))
+
+    for model, pairs in (("skip_gram", SkipGramPairs(encoded, 1, dynamic_window=False)),
+                         ("cbow", CbowPairs(encoded, 1, 4, dynamic_window=False))):
+        W1, _ = train_hogwild(model, pairs, len(vocab), word_counts, embedding_dim=10,
+                              num_workers=num_workers, epochs=20, seed=1)
+        initial = (np.random.default_rng(1).random((len(vocab), 10)) - 0.5) / 10
+        assert W1.shape == (len(vocab), 10) and not np.allclose(W1, initial), model
+        print(f"{model}: trained on {pairs.count_pairs()} pairs per epoch with {num_workers} workers")
+
+
+def benchmark(worker_counts=(1, 2, 4, 8), vocab_size=10_000, num_sentences=5_000, sentence_length=10,
+              window_size=2, embedding_dim=100, seed=0):
+    """
+    Report training pairs/sec of both models as the number of workers grows.
+    """
+    rng = np.random.default_rng(seed)
+    word_counts = rng.zipf(1.3, vocab_size).clip(max=10 ** 6)
+    sentences = list(rng.integers(0, vocab_size, (num_sentences, sentence_length), dtype=np.int32))
+    streams = (("skip_gram", SkipGramPairs(sentences, window_size, seed=seed)),
+               ("cbow", CbowPairs(sentences, window_size, batch_size=64, seed=seed)))
+    num_pairs = {model: pairs.count_pairs() for model, pairs in streams}
+
+    print(f"{'workers':>8} | {'skip_gram':>18} | {'cbow':>18}")
+    for num_workers in worker_counts:
+        rates = []
+        for model, pairs in streams:
+            start = time.perf_counter()
+            train_hogwild(model, pairs, vocab_size, word_counts, embedding_dim, num_workers,
+                          pairs_per_epoch=num_pairs[model], seed=seed)
+            rates.append(num_pairs[model] / (time.perf_counter() - start))
+        print(f"{num_workers:>8} | " + " | ".join(f"{rate:>11,.0f} pairs/s" for rate in rates))
+
+
+if __name__ == "__main__":
+    check_script_pairs()
+    benchmark()
@@ -0,0 +1,279 @@
+"""Inverted index with BM25 scoring and MaxScore top-k evaluation.
+
+TF-IDF.py can score documents but cannot answer queries without scanning every
+per-document dict. InvertedIndex reuses its `tokenize` and `compute_df` and
+stores, for every term, a postings list of (doc_id, tf) pairs in flat arrays
+plus the highest BM25 score any document can get from that term.
+
+search() uses MaxScore dynamic pruning. Query terms are sorted by their max
+score. Once the current k-th best score (the threshold) is larger than the
+summed max scores of the weakest terms, documents that contain only those
+"non-essential" terms cannot enter the top k. Such documents are never
+enumerated; the non-essential lists are only probed (binary search) for
+candidates that are still competitive. Candidates are processed in doc-id
+ranges with array operations, and the threshold is raised after every range.
+
+The index is saved as flat binary arrays plus a JSON header and reopened with
+np.memmap, so opening an index does not read the postings into memory.
+Running this file benchmarks query latency against exhaustive scoring.
+"""
+import importlib
+import json
+import os
+import time
+from collections import Counter
+
+import numpy as np
+
+# TF-IDF.py is not a valid module name, so import it by file name
+_tfidf = importlib.import_module("TF-IDF")
+tokenize = _tfidf.tokenize
+compute_df = _tfidf.compute_df
+
+_ARRAYS = {
+    "term_offsets": np.int64,
+    "postings_docs": np.int32,
+    "postings_tfs": np.int32,
+    "max_scores": np.float32,
+    "idf": np.float32,
+    "doc_lengths": np.int32,
+}
+
+
+class InvertedIndex:
+    def __init__(self, terms, arrays, num_docs, k1=1.2, b=0.75):
+        self.terms = terms
+        self.vocab = {term: term_id for term_id, term in enumerate(terms)}
+        self.num_docs = num_docs
+        self.k1 = k1
+        self.b = b
+        for name in _ARRAYS:
+            setattr(self, name, arrays[name])
+        self.avg_doc_length = float(np.mean(self.doc_lengths)) if num_docs else 0.0
+
+    # ------------------------------------------------------------------
+    # Building and persistence
+    # ------------------------------------------------------------------
+    @classmethod
+    def build(cls, documents, k1=1.2, b=0.75):
+        """
+        Index a list of documents with the tokenizer from TF-IDF.py.
+        """
+        documents_tokens = [tokenize(doc) for doc in documents]
+        df = compute_df(documents_tokens)
+        terms = sorted(df)
+        vocab = {term: term_id for term_id, term in enumerate(terms)}
+
+        term_ids, doc_ids, tfs = [], [], []
+        for doc_id, tokens in enumerate(documents_tokens):
+            for term, tf in Counter(tokens).items():
+                term_ids.append(vocab[term])
+                doc_ids.append(doc_id)
+                tfs.append(tf)
+        term_ids = np.array(term_ids, dtype=np.int64)
+        doc_ids = np.array(doc_ids, dtype=np.int32)
+        tfs = np.array(tfs, dtype=np.int32)
+
+        # Group the postings by term; documents were added in order, so a
+        # stable sort keeps every postings list sorted by doc id
+        order = np.argsort(term_ids, kind="stable")
+        df_counts = np.array([df[term] for term in terms], dtype=np.int64)
+        num_docs = len(documents)
+        arrays = {
+            "term_offsets": np.concatenate(([0], np.cumsum(df_counts))),
+            "postings_docs": doc_ids[order],
+            "postings_tfs": tfs[order],
+            "idf": np.log(1 + (num_docs - df_counts + 0.5) / (df_counts + 0.5)).astype(np.float32),
+            "doc_lengths": np.array([len(tokens) for tokens in documents_tokens], dtype=np.int32),
+            "max_scores": np.zeros(len(terms), dtype=np.float32),
+        }
+        index = cls(terms, arrays, num_docs, k1, b)
+        if len(index.postings_docs):
+            scores = index._bm25(np.repeat(np.arange(len(terms)), df_counts),
+                                 index.postings_docs, index.postings_tfs)
+            max_scores = np.maximum.reduceat(scores, index.term_offsets[:-1]).astype(np.float32)
+            # Round up so the float32 bounds never undercut a float64 score
+            index.max_scores = np.nextafter(max_scores, np.float32(np.inf))
+        return index
+
+    def save(self, path):
+        """
+        Write the index as flat binary arrays plus meta.json and terms.txt.
+        """
+        os.makedirs(path, exist_ok=True)
+        for name, dtype in _ARRAYS.items():
+            np.asarray(getattr(self, name), dtype=dtype).tofile(os.path.join(path, f"{name}.bin"))
+        with open(os.path.join(path, "terms.txt"), "w", encoding="utf-8") as f:
+            f.writelines(term + "\n" for term in self.terms)
+        meta = {"num_docs": self.num_docs, "num_terms": len(self.terms),
+                "num_postings": int(len(self.postings_docs)), "k1": self.k1, "b": self.b}
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+
+    @classmethod
+    def open(cls, path):
+        """
+        Open a saved index; the arrays are memory-mapped, not read.
+        """
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(path, "terms.txt"), "r", encoding="utf-8") as f:
+            terms = f.read().splitlines()
+        lengths = {
+            "term_offsets": meta["num_terms"] + 1,
+            "postings_docs": meta["num_postings"],
+            "postings_tfs": meta["num_postings"],
+            "max_scores": meta["num_terms"],
+            "idf": meta["num_terms"],
+            "doc_lengths": meta["num_docs"],
+        }
+        arrays = {}
+        for name, dtype in _ARRAYS.items():
+            if lengths[name] == 0:
+                arrays[name] = np.zeros(0, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(os.path.join(path, f"{name}.bin"), dtype=dtype, mode="r",
+                                         shape=(lengths[name],))
+        return cls(terms, arrays, meta["num_docs"], meta["k1"], meta["b"])
+
+    # ------------------------------------------------------------------
+    # Scoring
+    # ------------------------------------------------------------------
+    def _bm25(self, term_ids, doc_ids, tfs):
+        """
+        BM25 contribution of each (term, doc, tf) posting.
+        """
+        tfs = np.asarray(tfs, dtype=np.float64)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_ids] / self.avg_doc_length)
+        return self.idf[term_ids] * tfs * (self.k1 + 1) / (tfs + norm)
+
+    def _query_terms(self, query):
+        ids = {self.vocab[token] for token in tokenize(query) if token in self.vocab}
+        return sorted(ids)
+
+    def postings(self, term_id):
+        """
+        Return the (doc_ids, tfs) arrays of one term.
+        """
+        start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+        return self.postings_docs[start:end], self.postings_tfs[start:end]
+
+    def brute_force(self, query, k=10):
+        """
+        Exhaustive term-at-a-time BM25 scoring of every posting of the query terms.
+        Returns (doc_id, score) pairs, best first.
+        """
+        scores = np.zeros(self.num_docs)
+        for term_id in self._query_terms(query):
+            doc_ids, tfs = self.postings(term_id)
+            scores[doc_ids] += self._bm25(term_id, doc_ids, tfs)
+        return _top_k(np.arange(self.num_docs), scores, k)
+
+    def search(self, query, k=10, chunk_docs=65_536):
+        """
+        Top-k BM25 retrieval with MaxScore pruning. Returns (doc_id, score) pairs, best first.
+        """
+        term_ids = self._query_terms(query)
+        if not term_ids or k <= 0:
+            return []
+        # Weakest terms first, so that the non-essential terms form a prefix
+        term_ids = sorted(term_ids, key=lambda t: self.max_scores[t])
+        upper_bounds = np.array([self.max_scores[t] for t in term_ids], dtype=np.float64)
+        prefix_bounds = np.cumsum(upper_bounds)
+        lists = [self.postings(t) for t in term_ids]
+
+        best_docs = np.zeros(0, dtype=np.int64)
+        best_scores = np.zeros(0)
+        threshold = 0.0
+        # Start with a small doc-id range so a useful threshold is known early
+        lo, span = 0, min(4_096, chunk_docs)
+        while lo < self.num_docs:
+            hi = min(lo + span, self.num_docs)
+            span = min(span * 2, chunk_docs)
+            slices = []
+            for doc_ids, tfs in lists:
+                start, end = np.searchsorted(doc_ids, [lo, hi])
+                slices.append((doc_ids[start:end], tfs[start:end]))
+
+            # Terms whose max scores sum to at most the threshold are non-essential
+            num_non_essential = int(np.searchsorted(prefix_bounds, threshold, side="right"))
+            if num_non_essential == len(term_ids):
+                break
+
+            # Essential terms are scored term-at-a-time into a dense accumulator
+            accumulator = np.zeros(hi - lo)
+            for i in range(num_non_essential, len(term_ids)):
+                doc_ids, tfs = slices[i]
+                accumulator[doc_ids - lo] += self._bm25(term_ids[i], doc_ids, tfs)
+            candidates = np.flatnonzero(accumulator)
+            scores = accumulator[candidates]
+            candidates += lo
+
+            # Probe the non-essential lists (strongest first) only for the
+            # candidates that can still beat the threshold
+            for i in range(num_non_essential - 1, -1, -1):
+                alive = scores + prefix_bounds[i] > threshold
+                candidates, scores = candidates[alive], scores[alive]
+                if len(candidates) == 0:
+                    break
+                doc_ids, tfs = slices[i]
+                pos = np.searchsorted(doc_ids, candidates)
+                found = pos < len(doc_ids)
+                found[found] = doc_ids[pos[found]] == candidates[found]
+                scores[found] += self._bm25(term_ids[i], candidates[found], tfs[pos[found]])
+
+            best_docs, best_scores = _merge_top_k(best_docs, best_scores, candidates, scores, k)
+            if len(best_scores) == k:
+                threshold = best_scores.min()
+            lo = hi
+        return _top_k(best_docs, best_scores, k)
+
+
+def _merge_top_k(docs_a, scores_a, docs_b, scores_b, k):
+    docs = np.concatenate((docs_a, docs_b))
+    scores = np.concatenate((scores_a, scores_b))
+    if len(scores) > k:
+        keep = np.argpartition(-scores, k - 1)[:k]
+        docs, scores = docs[keep], scores[keep]
+    return docs, scores
+
+
+def _top_k(doc_ids, scores, k):
+    keep = scores > 0
+    doc_ids, scores = doc_ids[keep], scores[keep]
+    doc_ids, scores = _merge_top_k(doc_ids[:0], scores[:0], doc_ids, scores, k)
+    order = np.lexsort((doc_ids, -scores))
+    return [(int(doc_ids[i]), float(scores[i])) for i in order]
+
+
+def benchmark(num_docs=200_000, vocab_size=50_000, doc_length=40, num_queries=200, k=10, seed=0):
+    """
+    Compare MaxScore query latency with exhaustive scoring on a synthetic Zipf corpus.
+    """
+    rng = np.random.default_rng(seed)
+    words = np.array([f"w{i}" for i in range(vocab_size)])
+    ranks = np.arange(1, vocab_size + 1)
+    probs = 1.0 / ranks / np.sum(1.0 / ranks)
+    print(f"Building index over {num_docs:,} documents...")
+    documents = [" ".join(words[rng.choice(vocab_size, doc_length, p=probs)]) for _ in range(num_docs)]
+    start = time.perf_counter()
+    index = InvertedIndex.build(documents)
+    print(f"Built in {time.perf_counter() - start:.1f}s")
+
+    queries = [" ".join(words[rng.choice(vocab_size, rng.integers(2, 6), p=probs)]) for _ in range(num_queries)]
+    for name, method in (("brute force", index.brute_force), ("maxscore", index.search)):
+        start = time.perf_counter()
+        results = [method(query, k) for query in queries]
+        elapsed = time.perf_counter() - start
+        print(f"{name:>12}: {elapsed / num_queries * 1000:.2f} ms/query")
+        if name == "brute force":
+            expected = results
+    mismatches = sum(
+        not np.allclose([s for _, s in got], [s for _, s in want], rtol=1e-5)
+        for got, want in zip(results, expected)
+    )
+    print(f"Queries with different top-{k} scores: {mismatches}")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -1,41 +1,23 @@
+import os
+import tempfile
+
+from ngram_binary import MappedNGramModel, save_binary
+from ngram_model import NGramModel
+
 # Toy dataset
 sentences = [
     "I love natural language processing",
     "Language models are amazing"
 ]
 
-# Function to generate bigrams
-def generate_bigrams(sentence):
-    words = sentence.lower().split()  # Tokenization (lowercase + split)
-    bigrams = [(words[i], words[i + 1]) for i in range(len(words) - 1)]
-    return bigrams, words  # Return bigrams and word list
-
-# Collect all words and bigrams
-all_bigrams = []
-all_words = set()  # To store unique words
-
-for sentence in sentences:
-    bigrams, words = generate_bigrams(sentence)
-    all_bigrams.extend(bigrams)
-    all_words.update(words)
+# Fit a bigram model (tokenization: lowercase + split). Counts are stored sparsely,
+# only for the bigrams that actually occur, and probabilities are computed on demand
+# (see ngram_model.py); "mle" gives the plain relative frequencies count(w1, w2) / count(w1).
+model = NGramModel(order=2, smoothing="mle", pad=False)
+model.fit(sentences)
 
 # Sort words for consistent ordering
-unique_words = sorted(all_words)
-
-# Create bigram frequency matrix
-bigram_matrix = {word: {w: 0 for w in unique_words} for word in unique_words}
-
-# Count occurrences of bigrams
-for bigram in all_bigrams:
-    first, second = bigram
-    bigram_matrix[first][second] += 1
-
-# Convert frequency matrix to probability matrix
-for word in unique_words:
-    total_bigrams = sum(bigram_matrix[word].values())  # Total transitions from this word
-    if total_bigrams > 0:
-        for next_word in unique_words:
-            bigram_matrix[word][next_word] /= total_bigrams  # Normalize to get probabilities
+unique_words = sorted(model.words())
 
 # Display bigram probability matrix in a well-formatted table
 print("\nBigram Probability Matrix:\n")
@@ -49,8 +31,17 @@ print(f"{header[0]:<{col_width}}", end=" | ")
 print(" | ".join(f"{w:<{col_width}}" for w in header[1:]))
 print("-" * (col_width * (len(unique_words) + 1) + 3))
 
-# Print each row with bigram probabilities
+# Print each row with bigram probabilities, computed one row at a time
 for word in unique_words:
-    row_values = [f"{bigram_matrix[word][w]:.1f}" for w in unique_words]
+    row_probabilities = model.next_word_probabilities([word], unique_words)
+    row_values = [f"{p:.1f}" for p in row_probabilities]
     print(f"{word:<{col_width}}", end=" | ")
-    print(" | ".join(f"{val:<{col_width}}" for val in row_values))
\ No newline at end of file
+    print(" | ".join(f"{val:<{col_width}}" for val in row_values))
+
+# Save the model in the binary format and reload it memory-mapped (see ngram_binary.py):
+# loading does not re-count the corpus, and the reloaded model can score and generate text
+model_path = os.path.join(tempfile.mkdtemp(prefix="ngram_"), "bigram.bin")
+save_binary(model, model_path)
+loaded = MappedNGramModel(model_path)
+print(f"\nReloaded P(natural | love) = {loaded.prob('natural', ['love']):.1f}")
+print("Generated:", " ".join(["i"] + loaded.generate(["i"], max_words=10, seed=0)))
@@ -0,0 +1,355 @@
+"""Binary memory-mapped format for n-gram models.
+
+save_binary() writes a fitted NGramModel (see ngram_model.py) into a single
+file, and MappedNGramModel reads it back through np.memmap: opening a model
+only parses a small JSON header, and every process that opens the same file
+shares its pages through the OS page cache.
+
+The probabilities are stored in back-off form (as in the ARPA format), which
+reproduces all three smoothing methods of NGramModel exactly:
+
+    P(w | h) = prob(h, w)                     if w is a stored successor of h
+             = bow(h) * P(w | h[1:])          if h is stored
+             = unseen_weight * P(w | h[1:])   otherwise
+
+File layout:
+    b"NGRAMBIN", header length (uint64), JSON header, then the arrays, each
+    aligned to 64 bytes. The header holds the vocabulary, the settings and the
+    dtype/offset/length of every array. For every order n >= 2:
+        contexts_n   int64   sorted packed keys of the (n-1)-word contexts
+        bows_n       float32 back-off weight of each context
+        backoff_mass_n float32 probability mass of the non-successors (for sampling)
+        offsets_n    int64   start of each context's successors (+ end)
+        successors_n int32   successor word ids, sorted within each context
+        probs_n      float32 P(successor | context)
+    and unigrams float32, P(w) for every word id.
+
+Lookups are binary searches: np.searchsorted for the context among the sorted
+contexts, then a vectorized binary search for the word within the context's
+successor range, so a query costs O(log n) per order. Running this file benchmarks opening, lookup,
+perplexity and sampling against the in-memory model.
+"""
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from ngram_model import BOS, EOS, NGramModel
+
+MAGIC = b"NGRAMBIN"
+ALIGNMENT = 64
+
+
+def _backoff_arrays(model, n):
+    """
+    The stored successors, probabilities and back-off weights of one order.
+    """
+    V = model.vocab_size
+    table = model.kn_tables[n] if model.smoothing == "kneser_ney" and n < model.order else model.tables[n]
+    contexts = np.stack([(table.keys // V ** (n - 1 - j)) % V for j in range(n)], axis=1)
+    probs = model.probabilities(contexts[:, :-1], contexts[:, -1])
+
+    ctx_keys = table.ctx_keys
+    _, starts = np.unique(table.keys // V, return_index=True)
+    offsets = np.append(starts, len(table.keys)).astype(np.int64)
+    if model.smoothing == "kneser_ney":
+        bows = model.discount * table.ctx_types / table.ctx_totals
+    elif model.smoothing == "stupid_backoff":
+        bows = np.full(len(ctx_keys), model.backoff_alpha)
+    else:
+        bows = np.zeros(len(ctx_keys))
+    # Mass left for the words that are not stored successors, used for sampling:
+    # bow(h) * (1 - sum of P(s | h[1:]) over the successors s of h)
+    lower = model.probabilities(contexts[:, 1:-1], contexts[:, -1])
+    lower_sums = np.add.reduceat(lower, starts) if len(starts) else np.zeros(0)
+    return {
+        f"contexts_{n}": ctx_keys.astype(np.int64),
+        f"bows_{n}": bows.astype(np.float32),
+        f"backoff_mass_{n}": (bows * np.maximum(1 - lower_sums, 0)).astype(np.float32),
+        f"offsets_{n}": offsets,
+        f"successors_{n}": (table.keys % V).astype(np.int32),
+        f"probs_{n}": probs.astype(np.float32),
+    }
+
+
+def save_binary(model, path):
+    """
+    Write a fitted NGramModel to one binary file.
+    """
+    arrays = {"unigrams": model.probabilities(np.zeros((model.vocab_size, 0), dtype=np.int64),
+                                              np.arange(model.vocab_size)).astype(np.float32)}
+    for n in range(2, model.order + 1):
+        arrays.update(_backoff_arrays(model, n))
+    unseen_weight = {"kneser_ney": 1.0, "stupid_backoff": model.backoff_alpha, "mle": 0.0}[model.smoothing]
+
+    sections, position = {}, 0
+    for name, values in arrays.items():
+        sections[name] = {"dtype": values.dtype.str, "offset": position, "length": len(values)}
+        position += -(-values.nbytes // ALIGNMENT) * ALIGNMENT
+    header = {"order": model.order, "smoothing": model.smoothing, "pad": model.pad,
+              "unseen_weight": unseen_weight, "vocab": model.vocab, "sections": sections}
+    header = json.dumps(header).encode("utf-8")
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        for name, values in arrays.items():
+            f.seek(data_start + sections[name]["offset"])
+            f.write(values.tobytes())
+        f.truncate(data_start + position)
+
+
+def _segmented_search(values, lo, hi, targets):
+    """
+    For every query, the position of targets[i] in the sorted range
+    values[lo[i]:hi[i]], or -1 when it is not there. Vectorized binary search.
+    """
+    lo, hi = lo.copy(), hi.copy()
+    end = hi.copy()
+    active = lo < hi
+    while np.any(active):
+        mid = (lo + hi) // 2
+        right = active & (values[np.where(active, mid, 0)] < targets)
+        lo = np.where(right, mid + 1, lo)
+        hi = np.where(active & ~right, mid, hi)
+        active = lo < hi
+    found = lo < end
+    found[found] = values[lo[found]] == targets[found]
+    return np.where(found, lo, -1)
+
+
+class MappedNGramModel:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a binary n-gram model")
+            header_length = int.from_bytes(f.read(8), "little")
+            header = json.loads(f.read(header_length).decode("utf-8"))
+        data_start = -(-(len(MAGIC) + 8 + header_length) // ALIGNMENT) * ALIGNMENT
+
+        self.path = path
+        self.order = header["order"]
+        self.smoothing = header["smoothing"]
+        self.pad = header["pad"]
+        self.unseen_weight = header["unseen_weight"]
+        self.vocab = header["vocab"]
+        self.word2idx = {word: idx for idx, word in enumerate(self.vocab)}
+        self._unigram_cdf = None
+        self.arrays = {}
+        for name, section in header["sections"].items():
+            dtype = np.dtype(section["dtype"])
+            if section["length"] == 0:
+                self.arrays[name] = np.zeros(0, dtype=dtype)
+            else:
+                # Plain ndarray views of the mapping avoid np.memmap's per-slice overhead
+                self.arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=data_start + section["offset"],
+                                              shape=(section["length"],)).view(np.ndarray)
+
+    @property
+    def vocab_size(self):
+        return len(self.vocab)
+
+    def encode(self, tokens):
+        """
+        Map tokens to ids; unknown words map to the <unk> id 0.
+        """
+        return np.array([self.word2idx.get(token, 0) for token in tokens], dtype=np.int64)
+
+    def _find_contexts(self, n, contexts):
+        """
+        Index of each (n-1)-word context among the stored contexts of order n, or -1.
+        """
+        keys = np.zeros(len(contexts), dtype=np.int64)
+        for j in range(contexts.shape[1]):
+            keys = keys * self.vocab_size + contexts[:, j]
+        stored = self.arrays[f"contexts_{n}"]
+        if len(stored) == 0:
+            return np.full(len(keys), -1)
+        pos = np.minimum(np.searchsorted(stored, keys), len(stored) - 1)
+        return np.where(stored[pos] == keys, pos, -1)
+
+    def probabilities(self, contexts, words):
+        """
+        P(word | context) for arrays of queries, as NGramModel.probabilities().
+        """
+        contexts = np.asarray(contexts, dtype=np.int64)
+        words = np.asarray(words, dtype=np.int64)
+        if contexts.ndim == 1:
+            contexts = contexts.reshape(len(words), -1)
+        probs = np.zeros(len(words))
+        weights = np.ones(len(words))
+        pending = np.arange(len(words))
+        for n in range(contexts.shape[1] + 1, 1, -1):
+            ctx = contexts[pending, contexts.shape[1] - n + 1:]
+            ctx_index = self._find_contexts(n, ctx)
+            seen = ctx_index >= 0
+            offsets = self.arrays[f"offsets_{n}"]
+            lo = np.where(seen, offsets[np.where(seen, ctx_index, 0)], 0)
+            hi = np.where(seen, offsets[np.where(seen, ctx_index + 1, 0)], 0)
+            pos = _segmented_search(self.arrays[f"successors_{n}"], lo, hi, words[pending])
+            done = pos >= 0
+            probs[pending[done]] = weights[pending[done]] * self.arrays[f"probs_{n}"][pos[done]]
+            bows = np.where(seen, self.arrays[f"bows_{n}"][np.where(seen, ctx_index, 0)], self.unseen_weight)
+            weights[pending] *= bows
+            pending = pending[~done]
+        probs[pending] = weights[pending] * self.arrays["unigrams"][words[pending]]
+        return probs
+
+    def prob(self, word, context=()):
+        context = list(context)[len(context) - self.order + 1:] if self.order > 1 else []
+        return float(self.probabilities(self.encode(context).reshape(1, -1), self.encode([word]))[0])
+
+    def next_word_distribution(self, context):
+        """
+        P(w | context) for every word id, built from the unigrams upwards.
+        """
+        context = self.encode(list(context)[len(context) - self.order + 1:] if self.order > 1 else [])
+        probs = np.array(self.arrays["unigrams"], dtype=np.float64)
+        for n in range(2, len(context) + 2):
+            ctx_index = self._find_contexts(n, context[len(context) - n + 1:].reshape(1, -1))[0]
+            if ctx_index < 0:
+                probs *= self.unseen_weight
+                continue
+            probs *= self.arrays[f"bows_{n}"][ctx_index]
+            start, end = self.arrays[f"offsets_{n}"][ctx_index:ctx_index + 2]
+            probs[self.arrays[f"successors_{n}"][start:end]] = self.arrays[f"probs_{n}"][start:end]
+        return probs
+
+    def _windows(self, sentences):
+        windows = []
+        for sentence in sentences:
+            tokens = sentence.lower().split() if isinstance(sentence, str) else list(sentence)
+            if self.pad:
+                tokens = [BOS] * (self.order - 1) + tokens + [EOS]
+            ids = self.encode(tokens)
+            if len(ids) >= self.order:
+                windows.append(np.lib.stride_tricks.sliding_window_view(ids, self.order))
+        if not windows:
+            return np.zeros((0, self.order), dtype=np.int64)
+        return np.concatenate(windows)
+
+    def perplexity(self, sentences):
+        """
+        Perplexity over all full-order windows of the sentences, scored in one batch.
+        """
+        windows = self._windows(sentences)
+        if len(windows) == 0:
+            return float("inf")
+        with np.errstate(divide="ignore"):
+            log_probs = np.log(self.probabilities(windows[:, :-1], windows[:, -1]))
+        return float(np.exp(-log_probs.mean()))
+
+    def _sample_dense(self, context, rng):
+        cumulative = np.cumsum(self.next_word_distribution([self.vocab[i] for i in context]))
+        if cumulative[-1] <= 0:
+            return None
+        return min(int(np.searchsorted(cumulative, rng.random() * cumulative[-1], side="right")),
+                   self.vocab_size - 1)
+
+    def _sample_level(self, n, context, rng):
+        """
+        Draw a word id from P_n(. | last n - 1 ids of context), or None if it has no mass.
+
+        With probability (stored mass) the word is one of the stored successors;
+        otherwise it is drawn from the lower order and redrawn while it is a
+        stored successor. This needs normalized lower orders (Kneser-Ney, MLE).
+        """
+        if n == 1:
+            if self._unigram_cdf is None:
+                self._unigram_cdf = np.cumsum(self.arrays["unigrams"], dtype=np.float64)
+            cdf = self._unigram_cdf
+            if cdf[-1] <= 0:
+                return None
+            return min(int(np.searchsorted(cdf, rng.random() * cdf[-1], side="right")), self.vocab_size - 1)
+        ctx_index = self._find_contexts(n, context[len(context) - n + 1:].reshape(1, -1))[0]
+        if ctx_index < 0:
+            return None if self.unseen_weight == 0 else self._sample_level(n - 1, context, rng)
+
+        start, end = self.arrays[f"offsets_{n}"][ctx_index:ctx_index + 2]
+        successors = self.arrays[f"successors_{n}"][start:end]
+        cumulative = np.cumsum(self.arrays[f"probs_{n}"][start:end], dtype=np.float64)
+        stored_mass = cumulative[-1]
+        backoff_mass = float(self.arrays[f"backoff_mass_{n}"][ctx_index])
+        if stored_mass + backoff_mass <= 0:
+            return None
+        u = rng.random() * (stored_mass + backoff_mass)
+        if u < stored_mass:
+            return int(successors[min(int(np.searchsorted(cumulative, u, side="right")), len(successors) - 1)])
+        for _ in range(100):
+            word = self._sample_level(n - 1, context, rng)
+            if word is None:
+                return None
+            pos = min(int(np.searchsorted(successors, word)), len(successors) - 1)
+            if successors[pos] != word:
+                return word
+        # The lower order keeps proposing stored successors; use the exact dense distribution
+        return self._sample_dense(context, rng)
+
+    def sample_next(self, context, rng):
+        """
+        Draw the id of the next word after a sequence of context word ids, or None.
+        """
+        context = np.asarray(context, dtype=np.int64)[max(len(context) - self.order + 1, 0):]
+        if self.smoothing == "stupid_backoff":
+            # Stupid-backoff scores are not normalized, so normalize the dense distribution
+            return self._sample_dense(context, rng)
+        return self._sample_level(len(context) + 1, context, rng)
+
+    def generate(self, prefix=(), max_words=20, seed=None):
+        """
+        Sample a continuation of prefix word by word. Stops at </s>, after
+        max_words words, or when the context has no probability mass left.
+        """
+        rng = np.random.default_rng(seed)
+        words = list(prefix)
+        if self.pad:
+            words = [BOS] * (self.order - 1) + words
+        ids = list(self.encode(words))
+        generated = []
+        for _ in range(max_words):
+            idx = self.sample_next(ids, rng)
+            if idx is None or self.vocab[idx] == EOS:
+                break
+            ids.append(idx)
+            generated.append(self.vocab[idx])
+        return generated
+
+
+def benchmark(num_sentences=100_000, vocab_size=10_000, sentence_length=12, order=3, seed=0):
+    """
+    Compare the memory-mapped model with the in-memory NGramModel.
+    """
+    rng = np.random.default_rng(seed)
+    words = np.array([f"w{i}" for i in range(vocab_size)])
+    ranks = np.arange(1, vocab_size + 1)
+    probs = 1.0 / ranks / np.sum(1.0 / ranks)
+    corpus = [list(words[rng.choice(vocab_size, sentence_length, p=probs)]) for _ in range(num_sentences)]
+    train, held_out = corpus[:-1_000], corpus[-1_000:]
+
+    for smoothing in ("kneser_ney", "stupid_backoff", "mle"):
+        model = NGramModel(order=order, smoothing=smoothing).fit(train)
+        path = os.path.join(tempfile.mkdtemp(prefix="ngram_"), "model.bin")
+        save_binary(model, path)
+        start = time.perf_counter()
+        mapped = MappedNGramModel(path)
+        open_ms = (time.perf_counter() - start) * 1000
+
+        windows = mapped._windows(held_out)
+        expected = model.probabilities(windows[:, :-1], windows[:, -1])
+        start = time.perf_counter()
+        got = mapped.probabilities(windows[:, :-1], windows[:, -1])
+        rate = len(windows) / (time.perf_counter() - start)
+        start = time.perf_counter()
+        sampled = sum(len(mapped.generate(max_words=20, seed=i)) for i in range(200))
+        sample_rate = sampled / (time.perf_counter() - start)
+        print(f"{smoothing:>15}: {os.path.getsize(path) / 1e6:6.1f} MB, opened in {open_ms:.1f} ms, "
+              f"max |dP| {np.max(np.abs(got - expected)):.1e}, {rate:10,.0f} queries/s, "
+              f"perplexity {mapped.perplexity(held_out):,.1f}, {sample_rate:,.0f} sampled words/s")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,322 @@
+"""Sparse order-N language model.
+
+n-gram.py stores bigram counts in a dense dict of dicts with V^2 entries and
+normalizes every row over the whole vocabulary, which is quadratic in memory
+and time. NGramModel keeps only the n-grams that occur:
+
+- words are mapped to integer ids and every n-gram (w1, ..., wn) is packed into
+  one int64 key w1*V^(n-1) + ... + wn (radix V). A ValueError is raised when
+  V^order does not fit into 63 bits.
+- for every order the distinct keys are stored in a sorted array next to their
+  counts, and for every context the total count and the number of distinct
+  followers, so lookups are vectorized binary searches (np.searchsorted).
+- probabilities are computed on demand for arrays of queries, never
+  materialized as a normalized matrix.
+
+Smoothing:
+    "mle": relative frequency c(h, w) / c(h); 0 for unseen contexts.
+    "stupid_backoff": c(h, w) / c(h) if seen, else alpha * S(w | shorter h).
+        These are scores, not a normalized distribution.
+    "kneser_ney": interpolated Kneser-Ney with absolute discount D; lower
+        orders use continuation counts (number of distinct left extensions),
+        and the unigram level is interpolated with a uniform distribution.
+
+Id 0 is reserved for "<unk>", which unknown words map to. With pad=True every
+sentence is wrapped in order - 1 "<s>" tokens and one "</s>"; n-grams that
+end in "<s>" are not counted. Running this file fits a trigram model on a
+synthetic corpus and reports fit time, memory and query throughput.
+"""
+import time
+from array import array
+
+import numpy as np
+
+UNK, BOS, EOS = "<unk>", "<s>", "</s>"
+SMOOTHING = ("mle", "stupid_backoff", "kneser_ney")
+
+
+def _lookup(keys, values, query):
+    """
+    values[i] where keys[i] == query, 0 where the query key is absent.
+    """
+    if len(keys) == 0:
+        return np.zeros(len(query), dtype=values.dtype)
+    pos = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+    found = keys[pos] == query
+    return np.where(found, values[pos], 0)
+
+
+class _CountTable:
+    """
+    Sorted n-gram keys with their counts, plus per-context totals and numbers
+    of distinct followers.
+    """
+
+    def __init__(self, keys, counts, n, vocab_size):
+        self.keys = keys
+        self.counts = counts
+        if n == 1:
+            self.ctx_keys = np.zeros(1, dtype=np.int64)
+            self.ctx_totals = np.array([counts.sum()], dtype=np.int64)
+            self.ctx_types = np.array([len(keys)], dtype=np.int64)
+        else:
+            ctx_keys, starts = np.unique(keys // vocab_size, return_index=True)
+            self.ctx_keys = ctx_keys
+            self.ctx_totals = np.add.reduceat(counts, starts) if len(starts) else np.zeros(0, dtype=np.int64)
+            self.ctx_types = np.diff(np.append(starts, len(keys)))
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.keys, self.counts, self.ctx_keys, self.ctx_totals, self.ctx_types))
+
+    def counts_of(self, keys):
+        return _lookup(self.keys, self.counts, keys)
+
+    def context_stats(self, ctx_keys):
+        """
+        (total count, distinct followers) of each context key.
+        """
+        return (_lookup(self.ctx_keys, self.ctx_totals, ctx_keys),
+                _lookup(self.ctx_keys, self.ctx_types, ctx_keys))
+
+
+class NGramModel:
+    """
+    Parameters:
+        order: Length N of the longest n-grams.
+        smoothing: "kneser_ney", "stupid_backoff" or "mle".
+        pad: Wrap sentences in <s> ... </s> markers.
+        discount: Absolute discount D of Kneser-Ney.
+        backoff_alpha: Back-off factor of stupid backoff.
+        tokenizer: Applied to sentences given as strings (lowercase + split, as in n-gram.py).
+    """
+
+    def __init__(self, order=2, smoothing="kneser_ney", pad=True, discount=0.75, backoff_alpha=0.4,
+                 tokenizer=lambda sentence: sentence.lower().split()):
+        if order < 1:
+            raise ValueError(f"order must be at least 1, got {order}")
+        if smoothing not in SMOOTHING:
+            raise ValueError(f"Unknown smoothing {smoothing!r}, expected one of {SMOOTHING}")
+        self.order = order
+        self.smoothing = smoothing
+        self.pad = pad
+        self.discount = discount
+        self.backoff_alpha = backoff_alpha
+        self.tokenizer = tokenizer
+        self.vocab = [UNK] + ([BOS, EOS] if pad else [])
+        self.word2idx = {word: idx for idx, word in enumerate(self.vocab)}
+        self.tables = {}        # n -> raw counts
+        self.kn_tables = {}     # n < order -> continuation counts
+
+    @property
+    def vocab_size(self):
+        return len(self.vocab)
+
+    def words(self):
+        """
+        The vocabulary without the special tokens, in id order.
+        """
+        return [word for word in self.vocab if word not in (UNK, BOS, EOS)]
+
+    # ------------------------------------------------------------------
+    # Fitting
+    # ------------------------------------------------------------------
+    def _tokens(self, sentence):
+        tokens = self.tokenizer(sentence) if isinstance(sentence, str) else list(sentence)
+        if self.pad:
+            tokens = [BOS] * (self.order - 1) + tokens + [EOS]
+        return tokens
+
+    def fit(self, sentences):
+        """
+        Count all n-grams up to the model order. sentences is an iterable of
+        strings or token lists; it is consumed once.
+        """
+        ids, sentence_ids = array("q"), array("q")
+        for sentence_id, sentence in enumerate(sentences):
+            for token in self._tokens(sentence):
+                idx = self.word2idx.get(token)
+                if idx is None:
+                    idx = self.word2idx[token] = len(self.vocab)
+                    self.vocab.append(token)
+                ids.append(idx)
+                sentence_ids.append(sentence_id)
+        if self.vocab_size ** self.order >= 2 ** 63:
+            raise ValueError(f"vocab_size ** order = {self.vocab_size}^{self.order} does not fit into "
+                             "int64 keys; use a lower order or a smaller vocabulary")
+
+        ids = np.frombuffer(ids, dtype=np.int64)
+        sentence_ids = np.frombuffer(sentence_ids, dtype=np.int64)
+        V = self.vocab_size
+        for n in range(1, self.order + 1):
+            length = len(ids) - n + 1
+            if length <= 0:
+                keys = np.zeros(0, dtype=np.int64)
+            else:
+                # Windows must lie inside one sentence and must not predict <s>
+                valid = sentence_ids[:length] == sentence_ids[n - 1:]
+                if self.pad:
+                    valid &= ids[n - 1:] != self.word2idx[BOS]
+                keys = np.zeros(length, dtype=np.int64)
+                for j in range(n):
+                    keys = keys * V + ids[j:j + length]
+                keys = keys[valid]
+            keys, counts = np.unique(keys, return_counts=True)
+            self.tables[n] = _CountTable(keys, counts.astype(np.int64), n, V)
+
+        # Continuation counts N1+(. g): distinct left extensions of every n-gram g
+        for n in range(1, self.order):
+            suffixes = self.tables[n + 1].keys % V ** n
+            keys, counts = np.unique(suffixes, return_counts=True)
+            self.kn_tables[n] = _CountTable(keys, counts.astype(np.int64), n, V)
+        return self
+
+    # ------------------------------------------------------------------
+    # Probabilities
+    # ------------------------------------------------------------------
+    def encode(self, tokens):
+        """
+        Map tokens to ids; unknown words map to the <unk> id 0.
+        """
+        return np.array([self.word2idx.get(token, 0) for token in tokens], dtype=np.int64)
+
+    def _pack(self, ids):
+        keys = np.zeros(ids.shape[0], dtype=np.int64)
+        for j in range(ids.shape[1]):
+            keys = keys * self.vocab_size + ids[:, j]
+        return keys
+
+    def _mle(self, contexts, words):
+        n = contexts.shape[1] + 1
+        table = self.tables[n]
+        counts = table.counts_of(self._pack(np.column_stack((contexts, words))))
+        totals, _ = table.context_stats(self._pack(contexts))
+        return np.divide(counts, totals, out=np.zeros(len(words)), where=totals > 0)
+
+    def _stupid_backoff(self, contexts, words):
+        n = contexts.shape[1] + 1
+        scores = self._mle(contexts, words)
+        if n == 1:
+            return scores
+        unseen = scores == 0
+        if np.any(unseen):
+            scores[unseen] = self.backoff_alpha * self._stupid_backoff(contexts[unseen, 1:], words[unseen])
+        return scores
+
+    def _kneser_ney(self, contexts, words):
+        n = contexts.shape[1] + 1
+        table = self.tables[n] if n == self.order else self.kn_tables[n]
+        if n == 1:
+            lower = np.full(len(words), 1.0 / self.vocab_size)
+        else:
+            lower = self._kneser_ney(contexts[:, 1:], words)
+        counts = table.counts_of(self._pack(np.column_stack((contexts, words))))
+        totals, types = table.context_stats(self._pack(contexts))
+        seen = totals > 0
+        probs = lower.copy()
+        probs[seen] = (np.maximum(counts[seen] - self.discount, 0)
+                       + self.discount * types[seen] * lower[seen]) / totals[seen]
+        return probs
+
+    def probabilities(self, contexts, words):
+        """
+        P(word | context) for arrays of queries.
+
+        contexts: int matrix of shape (M, k) with 0 <= k < order, the k words
+            preceding each query word (ids from encode()).
+        words: int vector of shape (M,).
+        """
+        contexts = np.asarray(contexts, dtype=np.int64)
+        words = np.asarray(words, dtype=np.int64)
+        if contexts.ndim == 1:
+            contexts = contexts.reshape(len(words), -1)
+        if contexts.shape[1] >= self.order:
+            raise ValueError(f"contexts have {contexts.shape[1]} words, an order-{self.order} "
+                             f"model uses at most {self.order - 1}")
+        if self.smoothing == "mle":
+            return self._mle(contexts, words)
+        if self.smoothing == "stupid_backoff":
+            return self._stupid_backoff(contexts, words)
+        return self._kneser_ney(contexts, words)
+
+    def prob(self, word, context=()):
+        """
+        P(word | context) for one word and a sequence of context words.
+        """
+        context = list(context)[len(context) - self.order + 1:] if self.order > 1 else []
+        return float(self.probabilities(self.encode(context).reshape(1, -1), self.encode([word]))[0])
+
+    def next_word_probabilities(self, context, candidates=None):
+        """
+        P(w | context) for every candidate word (default: the whole vocabulary), as an array.
+        """
+        candidate_ids = np.arange(self.vocab_size) if candidates is None else self.encode(candidates)
+        context = list(context)[len(context) - self.order + 1:] if self.order > 1 else []
+        contexts = np.repeat(self.encode(context).reshape(1, -1), len(candidate_ids), axis=0)
+        return self.probabilities(contexts, candidate_ids)
+
+    def _full_ngrams(self, sentences):
+        """
+        All (context, word) id windows of full order in the given sentences.
+        """
+        windows = []
+        for sentence in sentences:
+            ids = self.encode(self._tokens(sentence))
+            if len(ids) >= self.order:
+                windows.append(np.lib.stride_tricks.sliding_window_view(ids, self.order))
+        if not windows:
+            return np.zeros((0, self.order - 1), dtype=np.int64), np.zeros(0, dtype=np.int64)
+        windows = np.concatenate(windows)
+        return windows[:, :-1], windows[:, -1]
+
+    def log_prob(self, sentences):
+        """
+        Summed natural-log probability and number of scored tokens. Every
+        token that has order - 1 preceding tokens in its sentence is scored
+        (with pad=True that is every word plus </s>).
+        """
+        contexts, words = self._full_ngrams(sentences)
+        with np.errstate(divide="ignore"):
+            return float(np.sum(np.log(self.probabilities(contexts, words)))), len(words)
+
+    def perplexity(self, sentences):
+        total, count = self.log_prob(sentences)
+        return float(np.exp(-total / count)) if count else float("inf")
+
+    @property
+    def nbytes(self):
+        return sum(table.nbytes for table in list(self.tables.values()) + list(self.kn_tables.values()))
+
+
+def benchmark(num_sentences=200_000, vocab_size=20_000, sentence_length=12, order=3, seed=0):
+    """
+    Fit a model on a synthetic Zipf corpus and report fit time, memory,
+    held-out perplexity and query throughput.
+    """
+    rng = np.random.default_rng(seed)
+    words = np.array([f"w{i}" for i in range(vocab_size)])
+    ranks = np.arange(1, vocab_size + 1)
+    probs = 1.0 / ranks / np.sum(1.0 / ranks)
+    corpus = [list(words[rng.choice(vocab_size, sentence_length, p=probs)]) for _ in range(num_sentences)]
+    train, held_out = corpus[:-1_000], corpus[-1_000:]
+
+    start = time.perf_counter()
+    model = NGramModel(order=order, smoothing="kneser_ney").fit(train)
+    print(f"Fitted order-{order} model on {len(train):,} sentences in {time.perf_counter() - start:.1f}s")
+    for n, table in model.tables.items():
+        print(f"  {n}-grams: {len(table.keys):,}")
+    print(f"Count arrays: {model.nbytes / 1e6:.1f} MB "
+          f"(a dense bigram table would need {model.vocab_size ** 2 * 8 / 1e9:.1f} GB)")
+
+    contexts, targets = model._full_ngrams(held_out)
+    for smoothing in SMOOTHING:
+        model.smoothing = smoothing
+        start = time.perf_counter()
+        model.probabilities(contexts, targets)
+        rate = len(targets) / (time.perf_counter() - start)
+        # Stupid-backoff scores are not normalized, so its "perplexity" is only indicative
+        print(f"{smoothing:>15}: {rate:12,.0f} queries/s, held-out perplexity {model.perplexity(held_out):,.1f}")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,184 @@
+"""Cached stemming and lemmatization.
+
+simple_stem in Text_Preprocessing.py tries every suffix of its list with
+endswith() on each call, and simple_lemmatize rebuilds its dict of irregular
+forms on each call. Both run once per token, although most tokens of a corpus
+repeat. Normalizer fixes both:
+
+- the suffixes are stored in a trie keyed on their reversed characters, so one
+  walk from the end of the word finds every matching suffix in
+  O(length of the longest suffix). The suffix listed first wins, as in
+  simple_stem; for the default list that is always the longest match.
+- the lemma table is built (or loaded from a file) once per Normalizer.
+- stem() and lemmatize() sit behind bounded functools.lru_cache memos, so a
+  repeated word costs one dict hit. cache_info() reports their hit rates for
+  sizing the cache.
+
+Running this file checks the output against simple_stem/simple_lemmatize and
+compares their throughput on a Zipf-distributed token stream.
+"""
+import contextlib
+import functools
+import io
+import random
+import time
+
+SUFFIXES = ["ing", "ly", "ed", "ious", "ies", "ive", "es", "s", "ment"]
+
+IRREGULAR_LEMMAS = {
+    "running": "run",
+    "happily": "happy",
+    "ran": "run",
+    "better": "good",
+    "faster": "fast",
+    "cats": "cat",
+    "dogs": "dog",
+    "are": "be",
+    "is": "be",
+    "have": "have"
+}
+
+MODES = ("stem", "lemmatize", "both")
+
+_END = None     # trie key marking the end of a suffix; its value is the suffix's priority
+
+
+def build_suffix_trie(suffixes):
+    """
+    Build a trie of nested dicts over the reversed suffixes. The node at the
+    end of a suffix stores its index in the list, i.e. its priority.
+    Empty suffixes are ignored.
+    """
+    root = {}
+    for priority, suffix in enumerate(suffixes):
+        if not suffix:
+            continue
+        node = root
+        for char in reversed(suffix):
+            node = node.setdefault(char, {})
+        node.setdefault(_END, priority)
+    return root
+
+
+def load_lemmas(path, encoding="utf-8"):
+    """
+    Read a lemma table with one "form<TAB>lemma" pair per line.
+    """
+    lemmas = {}
+    with open(path, "r", encoding=encoding) as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line and not line.startswith("#"):
+                form, lemma = line.split("\t", 1)
+                lemmas[form] = lemma
+    return lemmas
+
+
+class Normalizer:
+    """
+    Parameters:
+        suffixes: Suffixes to strip, in priority order.
+        lemmas: Dict of form -> lemma, or a path to a file for load_lemmas().
+        cache_size: Maximum number of memoized words per operation (None = unbounded).
+    """
+
+    def __init__(self, suffixes=SUFFIXES, lemmas=IRREGULAR_LEMMAS, cache_size=100_000):
+        self.trie = build_suffix_trie(suffixes)
+        self.lemmas = load_lemmas(lemmas) if isinstance(lemmas, str) else dict(lemmas)
+        # Per-instance memos, so every Normalizer has its own counters
+        self.stem = functools.lru_cache(maxsize=cache_size)(self._stem)
+        self.lemmatize = functools.lru_cache(maxsize=cache_size)(self._lemmatize)
+        self._normalize_word = functools.lru_cache(maxsize=cache_size)(self._both)
+
+    def _stem(self, word):
+        """
+        Remove the highest-priority suffix the word ends with, like simple_stem.
+        """
+        node = self.trie
+        best = None
+        for end in range(len(word) - 1, -1, -1):
+            node = node.get(word[end])
+            if node is None:
+                break
+            priority = node.get(_END)
+            if priority is not None and (best is None or priority < best[0]):
+                best = (priority, end)
+        return word if best is None else word[:best[1]]
+
+    def _lemmatize(self, word):
+        return self.lemmas.get(word, word)
+
+    def _both(self, word):
+        return self.stem(self.lemmatize(word))
+
+    def normalize(self, tokens, mode="stem"):
+        """
+        Normalize a list of tokens. mode is "stem", "lemmatize" or "both"
+        (lemmatize, then stem the lemma).
+        """
+        if mode == "stem":
+            function = self.stem
+        elif mode == "lemmatize":
+            function = self.lemmatize
+        elif mode == "both":
+            function = self._normalize_word
+        else:
+            raise ValueError(f"Unknown mode {mode!r}, expected one of {MODES}")
+        return [function(token) for token in tokens]
+
+    def cache_info(self):
+        """
+        Hits, misses, size and hit rate of each memo.
+        """
+        info = {}
+        for name, function in (("stem", self.stem), ("lemmatize", self.lemmatize),
+                               ("both", self._normalize_word)):
+            stats = function.cache_info()
+            lookups = stats.hits + stats.misses
+            info[name] = {"hits": stats.hits, "misses": stats.misses, "size": stats.currsize,
+                          "maxsize": stats.maxsize, "hit_rate": stats.hits / lookups if lookups else 0.0}
+        return info
+
+    def cache_clear(self):
+        self.stem.cache_clear()
+        self.lemmatize.cache_clear()
+        self._normalize_word.cache_clear()
+
+
+def benchmark(num_tokens=1_000_000, vocab_size=20_000, seed=0):
+    """
+    Check the normalizer against simple_stem/simple_lemmatize and print tokens/sec of both.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        from Text_Preprocessing import simple_lemmatize, simple_stem
+
+    rng = random.Random(seed)
+    stems = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(1, 8)))
+             for _ in range(vocab_size)]
+    vocab = [stem + rng.choice(SUFFIXES + ["", "", "er", "ness"]) for stem in stems]
+    vocab += list(IRREGULAR_LEMMAS) + SUFFIXES + [""]
+    weights = [1.0 / rank for rank in range(1, len(vocab) + 1)]
+    tokens = rng.choices(vocab, weights=weights, k=num_tokens)
+
+    normalizer = Normalizer()
+    mismatches = sum(normalizer.stem(word) != simple_stem(word) for word in vocab)
+    mismatches += sum(normalizer.lemmatize(word) != simple_lemmatize(word) for word in vocab)
+    print(f"Words with different output: {mismatches}")
+    normalizer.cache_clear()
+
+    runs = [("simple_stem", lambda: [simple_stem(t) for t in tokens]),
+            ("Normalizer stem", lambda: normalizer.normalize(tokens, "stem")),
+            ("simple_lemmatize", lambda: [simple_lemmatize(t) for t in tokens]),
+            ("Normalizer lemmatize", lambda: normalizer.normalize(tokens, "lemmatize"))]
+    for name, run in runs:
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        print(f"{name:>20}: {num_tokens / elapsed:12,.0f} tokens/s")
+    for name, stats in normalizer.cache_info().items():
+        print(f"{name:>9} cache: {stats['hits']:,} hits, {stats['misses']:,} misses, "
+              f"hit rate {stats['hit_rate']:.1%}")
+
+
+if __name__ == "__main__":
+    benchmark()
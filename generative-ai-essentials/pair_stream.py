@@ -0,0 +1,210 @@
+"""Streaming training-pair generation for skip-gram and CBOW.
+
+skip_gram.py and continuous_BOW.py build the full `training_pairs` list of
+Python tuples before training, so memory grows with corpus size times window.
+SkipGramPairs and CbowPairs generate the pairs on the fly from int-encoded
+sentences instead, one sentence at a time with array operations, and re-batch
+them into NumPy arrays of a fixed batch size. Each pass over them (one epoch)
+draws fresh random choices for the two word2vec tricks:
+
+- subsampling: a token with corpus frequency f is kept with probability
+  (sqrt(f / sample) + 1) * sample / f, so very frequent words ("i", "the")
+  produce far fewer (mostly useless) updates;
+- dynamic windows: each center word uses a window size drawn uniformly from
+  1..window_size, which weights nearby context words more.
+
+Iterating the objects directly yields the same tuples as the old lists, so the
+training loops in the scripts keep working unchanged. batches() yields the
+NumPy batches for the vectorized trainers, and shard() splits a stream by
+sentence for parallel workers (see hogwild.py).
+"""
+import copy
+import itertools
+
+import numpy as np
+
+
+def encode_sentences(sentences, word2idx):
+    """
+    Map tokenized sentences to int32 arrays of word indices, dropping unknown words.
+    """
+    return [np.array([word2idx[w] for w in sentence if w in word2idx], dtype=np.int32)
+            for sentence in sentences]
+
+
+class LineSentences:
+    """
+    Re-iterable stream of int-encoded sentences read line by line from a text file.
+    Only the current line is held in memory, so a corpus can be larger than RAM.
+    """
+
+    def __init__(self, path, word2idx):
+        self.path = path
+        self.word2idx = word2idx
+
+    def __iter__(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                ids = [self.word2idx[w] for w in line.lower().split() if w in self.word2idx]
+                yield np.array(ids, dtype=np.int32)
+
+
+def keep_probabilities(word_counts, sample=1e-3):
+    """
+    word2vec subsampling: probability of keeping each occurrence of a word.
+    """
+    word_counts = np.asarray(word_counts, dtype=np.float64)
+    frequency = word_counts / word_counts.sum()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        keep = (np.sqrt(frequency / sample) + 1) * sample / frequency
+    return np.nan_to_num(np.minimum(keep, 1.0), nan=1.0)
+
+
+def _window_offsets(window_size):
+    # Context offsets in the same order as the scripts: words before, then words after
+    return np.concatenate((np.arange(-window_size, 0), np.arange(1, window_size + 1)))
+
+
+def _rebatch(chunks, batch_size):
+    """
+    Concatenate variable-size chunks (tuples of parallel arrays) and re-split
+    them into batches of exactly batch_size rows (the last one may be shorter).
+    """
+    pending, pending_rows = [], 0
+    for chunk in chunks:
+        if len(chunk[-1]) == 0:
+            continue
+        pending.append(chunk)
+        pending_rows += len(chunk[-1])
+        if pending_rows < batch_size:
+            continue
+        merged = tuple(np.concatenate(parts) for parts in zip(*pending))
+        full = (pending_rows // batch_size) * batch_size
+        for begin in range(0, full, batch_size):
+            yield tuple(array[begin:begin + batch_size] for array in merged)
+        pending = [tuple(array[full:] for array in merged)]
+        pending_rows -= full
+    if pending_rows:
+        yield tuple(np.concatenate(parts) for parts in zip(*pending))
+
+
+class _SentenceShard:
+    """
+    Re-iterable view of every count-th sentence of a sentence stream, starting at index.
+    """
+
+    def __init__(self, sentences, index, count):
+        self.sentences = sentences
+        self.index = index
+        self.count = count
+
+    def __iter__(self):
+        return itertools.islice(self.sentences, self.index, None, self.count)
+
+
+class _PairStream:
+    def __init__(self, sentences, window_size=1, batch_size=1024, keep_prob=None,
+                 dynamic_window=True, seed=None):
+        """
+        Parameters:
+            sentences: Re-iterable of int-encoded sentences (a list of arrays, or
+                a LineSentences stream); it is read once per epoch.
+            window_size: Maximum number of context words on each side.
+            batch_size: Number of pairs per NumPy batch.
+            keep_prob: Per-word keep probabilities from keep_probabilities(),
+                or None to disable subsampling.
+            dynamic_window: Shrink each center word's window to a random size in 1..window_size.
+        """
+        self.sentences = sentences
+        self.window_size = window_size
+        self.batch_size = batch_size
+        self.keep_prob = keep_prob
+        self.dynamic_window = dynamic_window
+        self.rng = np.random.default_rng(seed)
+
+    def _context_matrix(self, ids):
+        """
+        For a sentence of n tokens, return an (n, 2 * window_size) matrix of
+        context word indices and a boolean mask of the valid ones.
+        """
+        if self.keep_prob is not None:
+            ids = ids[self.rng.random(len(ids)) < self.keep_prob[ids]]
+        n = len(ids)
+        offsets = _window_offsets(self.window_size)
+        positions = np.arange(n)[:, np.newaxis] + offsets
+        valid = (positions >= 0) & (positions < n)
+        if self.dynamic_window:
+            reduced = self.rng.integers(1, self.window_size + 1, size=n)
+            valid &= np.abs(offsets) <= reduced[:, np.newaxis]
+        contexts = ids[np.clip(positions, 0, max(n - 1, 0))] if n else np.zeros((0, len(offsets)), np.int32)
+        return ids, contexts, valid
+
+    def _chunks(self):
+        raise NotImplementedError
+
+    def batches(self):
+        """
+        Yield one epoch of training data as fixed-size NumPy batches.
+        """
+        return _rebatch(self._chunks(), self.batch_size)
+
+    def shard(self, index, count, seed=None):
+        """
+        A stream with the same settings over every count-th sentence, starting
+        at index, with its own random generator (e.g. one per worker process).
+        """
+        shard = copy.copy(self)
+        shard.sentences = _SentenceShard(self.sentences, index, count)
+        shard.rng = np.random.default_rng(seed)
+        return shard
+
+    def count_pairs(self):
+        """
+        Number of pairs in one epoch, counted with one pass over a copy of the
+        stream (with subsampling or dynamic windows, every epoch differs a little).
+        """
+        counter = copy.copy(self)
+        counter.rng = copy.deepcopy(self.rng)
+        return sum(len(batch[-1]) for batch in counter.batches())
+
+
+class SkipGramPairs(_PairStream):
+    """
+    Stream of skip-gram (center_word_idx, context_word_idx) pairs.
+    batches() yields (centers, contexts) int32 arrays.
+    """
+
+    def _chunks(self):
+        for ids in self.sentences:
+            ids, contexts, valid = self._context_matrix(np.asarray(ids, dtype=np.int32))
+            centers = np.broadcast_to(ids[:, np.newaxis], contexts.shape)
+            yield centers[valid], contexts[valid]
+
+    def __iter__(self):
+        for centers, contexts in self.batches():
+            yield from zip(centers.tolist(), contexts.tolist())
+
+
+class CbowPairs(_PairStream):
+    """
+    Stream of CBOW (context_indices, center_idx) pairs.
+    batches() yields (contexts, lengths, centers), with the contexts left-aligned
+    in an int32 matrix padded with 0 (the layout used by cbow_batched.py).
+    """
+
+    def _chunks(self):
+        for ids in self.sentences:
+            ids, contexts, valid = self._context_matrix(np.asarray(ids, dtype=np.int32))
+            # Move the valid context words of each row to the front, keeping their order
+            order = np.argsort(~valid, axis=1, kind="stable")
+            contexts = np.where(np.take_along_axis(valid, order, axis=1),
+                                np.take_along_axis(contexts, order, axis=1), 0).astype(np.int32)
+            lengths = valid.sum(axis=1).astype(np.int32)
+            # Only keep pairs where there is at least one context word
+            keep = lengths > 0
+            yield contexts[keep], lengths[keep], ids[keep]
+
+    def __iter__(self):
+        for contexts, lengths, centers in self.batches():
+            for row, length, center in zip(contexts.tolist(), lengths.tolist(), centers.tolist()):
+                yield row[:length], center
@@ -0,0 +1,156 @@
+"""Single-pass text preprocessing pipeline.
+
+The preprocessing walk-through in Text_Preprocessing.py makes eight passes
+over the token list (lowercase, split, strip punctuation, stop words,
+contractions, numbers, corrections, abbreviations), building a new list each
+time and checking stop words against a Python list. PreprocessingPipeline
+compiles the enabled steps once into lookup tables:
+
+- stop words become a frozenset,
+- contractions map to tuples of already split words,
+- corrections and abbreviations are composed into one dict,
+
+and then runs every token through all steps in a single pass. The output of
+each distinct raw token is memoized, so repeated words cost one dict lookup.
+process_file() streams a file line by line with bounded memory.
+Running this file compares it with the eight-pass version of the script.
+"""
+import contextlib
+import io
+import random
+import time
+
+
+class PreprocessingPipeline:
+    """
+    Parameters mirror the steps of Text_Preprocessing.py; a step is skipped
+    when its option is False/None/empty.
+
+        lowercase: Lowercase the text before splitting on whitespace.
+        punctuation: Characters stripped from both ends of every token.
+        stop_words: Tokens to drop (checked after stripping punctuation).
+        contractions: Token -> expanded text, split into separate tokens.
+        remove_numbers: Drop tokens that are purely numeric.
+        corrections: Token -> corrected spelling.
+        abbreviations: Token -> expansion (kept as a single token).
+        cache_size: Maximum number of memoized raw tokens.
+    """
+
+    def __init__(self, lowercase=True, punctuation='.,!?\'":;()', stop_words=None, contractions=None,
+                 remove_numbers=True, corrections=None, abbreviations=None, cache_size=100_000):
+        self.lowercase = lowercase
+        self.punctuation = punctuation or None
+        self.stop_words = frozenset(stop_words or ())
+        self.contractions = {token: tuple(expanded.split()) for token, expanded in (contractions or {}).items()}
+        self.remove_numbers = remove_numbers
+
+        # Corrections run before abbreviations, so compose them into one table
+        corrections = corrections or {}
+        abbreviations = abbreviations or {}
+        self.replacements = {}
+        for token in set(corrections) | set(abbreviations):
+            corrected = corrections.get(token, token)
+            replaced = abbreviations.get(corrected, corrected)
+            if replaced != token:
+                self.replacements[token] = replaced
+
+        self.cache_size = cache_size
+        self._cache = {}
+
+    def _process_token(self, token):
+        """
+        Run one raw (whitespace-delimited) token through all enabled steps.
+        Returns a tuple of zero or more output tokens.
+        """
+        if self.punctuation:
+            token = token.strip(self.punctuation)
+        if token in self.stop_words:
+            return ()
+        parts = self.contractions.get(token, (token,))
+        output = []
+        for part in parts:
+            if self.remove_numbers and part.isdigit():
+                continue
+            output.append(self.replacements.get(part, part))
+        return tuple(output)
+
+    def process(self, text):
+        """
+        Preprocess one text and return its list of tokens.
+        """
+        if self.lowercase:
+            text = text.lower()
+        cache = self._cache
+        tokens = []
+        for raw in text.split():
+            result = cache.get(raw)
+            if result is None:
+                result = self._process_token(raw)
+                if len(cache) >= self.cache_size:
+                    cache.clear()
+                cache[raw] = result
+            tokens.extend(result)
+        return tokens
+
+    def process_lines(self, lines):
+        """
+        Yield the token list of every line of an iterable of strings.
+        """
+        for line in lines:
+            yield self.process(line)
+
+    def process_file(self, path, encoding="utf-8"):
+        """
+        Stream a text file line by line, yielding one token list per line.
+        """
+        with open(path, "r", encoding=encoding) as f:
+            yield from self.process_lines(f)
+
+
+def eight_pass(text, punctuation, stop_words, contractions, corrections, abbreviations):
+    """
+    The step-by-step preprocessing from Text_Preprocessing.py, kept as the baseline.
+    """
+    tokens = text.lower().split()
+    tokens = [token.strip(punctuation) for token in tokens]
+    tokens = [token for token in tokens if token not in stop_words]
+    expanded = []
+    for token in tokens:
+        if token in contractions:
+            expanded.extend(contractions[token].split())
+        else:
+            expanded.append(token)
+    tokens = [token for token in expanded if not token.isdigit()]
+    tokens = [corrections.get(token, token) for token in tokens]
+    return [abbreviations.get(token, token) for token in tokens]
+
+
+def benchmark(num_documents=2_000, document_words=500, seed=0):
+    """
+    Check that both versions agree and print their throughput in tokens/sec,
+    using the tables defined in Text_Preprocessing.py.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        import Text_Preprocessing as script
+    tables = dict(punctuation=script.punctuations, stop_words=script.stop_words,
+                  contractions=script.contractions, corrections=script.corrections,
+                  abbreviations=script.abbreviations)
+    pipeline = PreprocessingPipeline(**tables)
+
+    rng = random.Random(seed)
+    words = script.text.split() + ["I'm", "2024", "(see", "below).", "AI,", "iphon!"]
+    documents = [" ".join(rng.choice(words) for _ in range(document_words)) for _ in range(num_documents)]
+    num_tokens = num_documents * document_words
+
+    mismatches = sum(pipeline.process(doc) != eight_pass(doc, **tables) for doc in documents)
+    print(f"Documents with different output: {mismatches}")
+    for name, run in (("eight passes", lambda doc: eight_pass(doc, **tables)), ("pipeline", pipeline.process)):
+        start = time.perf_counter()
+        for document in documents:
+            run(document)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>12}: {num_tokens / elapsed:12,.0f} tokens/s")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -1,5 +1,12 @@
+import os
+from collections import Counter
+
 import numpy as np
 
+from embedding_store import EmbeddingStore
+from pair_stream import SkipGramPairs, encode_sentences, keep_probabilities
+from skip_gram_objectives import OBJECTIVES, train_skip_gram
+
 def softmax(x):
     """
     Compute the softmax of vector x.
@@ -51,18 +58,21 @@ for word, idx in word2idx.items():
 # Step 4: Generate Training Data (Skip-gram Pairs)
 # -------------------------------------------------------
 # For each word in a sentence, use a window of size 1 to collect context words.
+# The pairs are generated lazily, one sentence at a time (see pair_stream.py),
+# instead of being stored in a list; every pass over training_pairs is one epoch.
+# On real corpora, subsampling of frequent words (e.g. subsample_threshold = 1e-3)
+# and dynamic windows cut down the number of useless updates. Both are off here
+# because in a three-sentence corpus every word counts as "frequent".
 window_size = 1
-training_pairs = []  # will store tuples of (center_word_idx, context_word_idx)
+subsample_threshold = None
+dynamic_window = False
 
-for sentence in sentences:
-    for idx, word in enumerate(sentence):
-        center_word_idx = word2idx[word]
-        # Determine the indices for the context window
-        context_indices = list(range(max(0, idx - window_size), idx)) + \
-                          list(range(idx + 1, min(len(sentence), idx + window_size + 1)))
-        for context_idx in context_indices:
-            context_word_idx = word2idx[sentence[context_idx]]
-            training_pairs.append((center_word_idx, context_word_idx))
+word_counts = Counter(word for sentence in sentences for word in sentence)
+keep_prob = None
+if subsample_threshold:
+    keep_prob = keep_probabilities([word_counts[word] for word in vocab], subsample_threshold)
+training_pairs = SkipGramPairs(encode_sentences(sentences, word2idx), window_size,
+                               keep_prob=keep_prob, dynamic_window=dynamic_window)
 
 print("\nTraining Pairs (center word index, context word index):")
 for center, context in training_pairs:
@@ -75,62 +85,77 @@ embedding_dim = 10       # size of the embedding vector
 learning_rate = 0.01     # learning rate for SGD updates
 epochs = 100             # number of epochs for training
 vocab_size = len(vocab)  # number of unique words
-
-# Weight matrices:
+# Training objective, one of OBJECTIVES:
+# "softmax" scores every word in the vocabulary for each pair (O(V * d) per step);
+# "negative_sampling" and "hierarchical_softmax" only touch a handful of output rows
+# (see skip_gram_objectives.py).
+objective = "softmax"
+negative_samples = 5     # negatives drawn per pair for "negative_sampling"
+if objective not in OBJECTIVES:
+    raise ValueError(f"Unknown objective {objective!r}; expected one of {OBJECTIVES}")
+
+# Weight matrices for "softmax" (train_skip_gram creates its own for the other objectives):
 # W1: shape (vocab_size, embedding_dim) - maps one-hot input to embeddings
 # W2: shape (embedding_dim, vocab_size) - maps embeddings to scores over vocabulary
-W1 = np.random.rand(vocab_size, embedding_dim)
-W2 = np.random.rand(embedding_dim, vocab_size)
+if objective == "softmax":
+    W1 = np.random.rand(vocab_size, embedding_dim)
+    W2 = np.random.rand(embedding_dim, vocab_size)
 
 # --------------------------------
 # Step 6: Training the Model
 # --------------------------------
 print("\nStarting training...\n")
-for epoch in range(epochs):
-    loss_epoch = 0  # accumulate loss over the epoch
+if objective != "softmax":
+    W1, _ = train_skip_gram(training_pairs, [word_counts[word] for word in vocab], objective,
+                            embedding_dim, learning_rate, epochs, negative_samples)
+else:
+    for epoch in range(epochs):
+        loss_epoch = 0  # accumulate loss over the epoch
+        num_pairs = 0   # the pair stream has no length, so count while iterating
     
-    # Iterate through each training pair
-    for center_idx, context_idx in training_pairs:
-        # ---------- Forward Pass ----------
-        # 1. Look up the embedding for the center word (from W1)
-        center_embedding = W1[center_idx]  # shape: (embedding_dim,)
+        # Iterate through each training pair
+        for center_idx, context_idx in training_pairs:
+            # ---------- Forward Pass ----------
+            # 1. Look up the embedding for the center word (from W1)
+            center_embedding = W1[center_idx]  # shape: (embedding_dim,)
         
-        # 2. Compute scores for all words by multiplying the embedding with W2
-        scores = np.dot(center_embedding, W2)  # shape: (vocab_size,)
+            # 2. Compute scores for all words by multiplying the embedding with W2
+            scores = np.dot(center_embedding, W2)  # shape: (vocab_size,)
         
-        # 3. Apply softmax to get probabilities over the vocabulary
-        y_pred = softmax(scores)  # shape: (vocab_size,)
+            # 3. Apply softmax to get probabilities over the vocabulary
+            y_pred = softmax(scores)  # shape: (vocab_size,)
         
-        # 4. Compute the loss (negative log likelihood for the true context word)
-        loss = -np.log(y_pred[context_idx] + 1e-7)  # add a small number to prevent log(0)
-        loss_epoch += loss
-
-        # ---------- Backward Pass ----------
-        # Create a one-hot encoded vector for the true context word
-        y_true = np.zeros(vocab_size)
-        y_true[context_idx] = 1
+            # 4. Compute the loss (negative log likelihood for the true context word)
+            loss = -np.log(y_pred[context_idx] + 1e-7)  # add a small number to prevent log(0)
+            loss_epoch += loss
+            num_pairs += 1
+
+            # ---------- Backward Pass ----------
+            # Create a one-hot encoded vector for the true context word
+            y_true = np.zeros(vocab_size)
+            y_true[context_idx] = 1
         
-        # Compute the error: derivative of loss with respect to the scores
-        error = y_pred - y_true  # shape: (vocab_size,)
+            # Compute the error: derivative of loss with respect to the scores
+            error = y_pred - y_true  # shape: (vocab_size,)
         
-        # Compute gradients for W2 and the center embedding:
-        # Gradient for W2 is the outer product of the center embedding and the error
-        grad_W2 = np.outer(center_embedding, error)  # shape: (embedding_dim, vocab_size)
+            # Compute gradients for W2 and the center embedding:
+            # Gradient for W2 is the outer product of the center embedding and the error
+            grad_W2 = np.outer(center_embedding, error)  # shape: (embedding_dim, vocab_size)
         
-        # Gradient for the center embedding (W1 row) is the dot product of W2 and the error
-        grad_center = np.dot(W2, error)  # shape: (embedding_dim,)
+            # Gradient for the center embedding (W1 row) is the dot product of W2 and the error
+            grad_center = np.dot(W2, error)  # shape: (embedding_dim,)
         
-        # ---------- Update Weights ----------
-        # Update the embedding for the center word in W1
-        W1[center_idx] -= learning_rate * grad_center
+            # ---------- Update Weights ----------
+            # Update the embedding for the center word in W1
+            W1[center_idx] -= learning_rate * grad_center
         
-        # Update W2 with the computed gradient
-        W2 -= learning_rate * grad_W2
+            # Update W2 with the computed gradient
+            W2 -= learning_rate * grad_W2
 
-    # Print the average loss every 10 epochs for monitoring
-    if (epoch + 1) % 10 == 0:
-        avg_loss = loss_epoch / len(training_pairs)
-        print(f"Epoch {epoch + 1}/{epochs} - Average Loss: {avg_loss:.4f}")
+        # Print the average loss every 10 epochs for monitoring
+        if (epoch + 1) % 10 == 0:
+            avg_loss = loss_epoch / num_pairs
+            print(f"Epoch {epoch + 1}/{epochs} - Average Loss: {avg_loss:.4f}")
 
 print("\nTraining complete!")
 
@@ -139,4 +164,15 @@ print("\nTraining complete!")
 # --------------------------------------
 print("\nLearned Word Embeddings (from W1):")
 for word, idx in word2idx.items():
-    print(f" {word}: {W1[idx]}")
\ No newline at end of file
+    print(f" {word}: {W1[idx]}")
+
+# --------------------------------------
+# Step 8: Save the Embeddings
+# --------------------------------------
+# Saved as float32 .npy plus a vocabulary file and reopened memory-mapped, so they
+# can be queried later without retraining (see embedding_store.py)
+embeddings_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "embeddings", "skip_gram")
+EmbeddingStore.save(embeddings_dir, vocab, W1)
+store = EmbeddingStore.open(embeddings_dir)
+print(f"\nEmbeddings saved to {embeddings_dir}")
+print(f"Most similar to '{vocab[0]}':", store.most_similar(vocab[0], k=3))
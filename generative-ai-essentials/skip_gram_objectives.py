@@ -0,0 +1,239 @@
+"""Training objectives for the skip-gram model.
+
+skip_gram.py computes a full softmax over the vocabulary for every
+(center, context) pair and updates all of W2, so each step costs O(V * d).
+This module adds two cheaper objectives that only touch a few output rows per pair:
+
+- "negative_sampling": the true context plus k words drawn from a precomputed
+  unigram^0.75 table are scored with a sigmoid (k + 1 output rows per pair).
+- "hierarchical_softmax": the context word is predicted by walking its path in a
+  Huffman tree over word frequencies (about log2(V) inner-node rows per pair).
+
+"softmax" keeps the original full-softmax update as a reference.
+Running this file benchmarks the three objectives against each other.
+"""
+import heapq
+import time
+
+import numpy as np
+
+OBJECTIVES = ("softmax", "negative_sampling", "hierarchical_softmax")
+
+
+def softmax(x):
+    """
+    Compute the softmax of vector x.
+    We subtract the maximum value for numerical stability.
+    """
+    exps = np.exp(x - np.max(x))
+    return exps / np.sum(exps)
+
+
+def sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def unigram_table(word_counts, power=0.75, table_size=1_000_000):
+    """
+    Build the negative-sampling table used by word2vec.
+    Each word index appears in proportion to count^power, so drawing a uniform
+    position from the table samples from the smoothed unigram distribution in O(1).
+    """
+    weights = np.asarray(word_counts, dtype=np.float64) ** power
+    repeats = np.round(weights / weights.sum() * table_size).astype(np.int64)
+    # Words too rare to get a slot still need to be sampleable
+    repeats = np.maximum(repeats, 1)
+    return np.repeat(np.arange(len(weights), dtype=np.int32), repeats)
+
+
+def sample_negatives(table, k, rng):
+    """
+    Draw k negative word indices from a unigram table.
+    """
+    return table[rng.integers(0, len(table), size=k)]
+
+
+def build_huffman_tree(word_counts):
+    """
+    Build a Huffman tree over the vocabulary for hierarchical softmax.
+
+    Returns (points, codes): for each word, the inner-node indices on the path
+    from the root and the binary branch taken at each of them. Frequent words
+    get short paths. There are vocab_size - 1 inner nodes.
+    """
+    vocab_size = len(word_counts)
+    if vocab_size < 2:
+        return [np.zeros(0, dtype=np.int32)] * vocab_size, [np.zeros(0, dtype=np.int8)] * vocab_size
+
+    # Leaves are 0..V-1, inner nodes are V..2V-2
+    heap = [(count, idx) for idx, count in enumerate(word_counts)]
+    heapq.heapify(heap)
+    parent = np.zeros(2 * vocab_size - 1, dtype=np.int64)
+    branch = np.zeros(2 * vocab_size - 1, dtype=np.int8)
+    next_node = vocab_size
+    while len(heap) > 1:
+        count_left, left = heapq.heappop(heap)
+        count_right, right = heapq.heappop(heap)
+        parent[left], branch[left] = next_node, 0
+        parent[right], branch[right] = next_node, 1
+        heapq.heappush(heap, (count_left + count_right, next_node))
+        next_node += 1
+    root = next_node - 1
+
+    points, codes = [], []
+    for word in range(vocab_size):
+        path, code = [], []
+        node = word
+        while node != root:
+            code.append(branch[node])
+            node = parent[node]
+            path.append(node - vocab_size)  # inner-node row in the output matrix
+        points.append(np.array(path[::-1], dtype=np.int32))
+        codes.append(np.array(code[::-1], dtype=np.int8))
+    return points, codes
+
+
+def softmax_step(W1, W2, center_idx, context_idx, learning_rate):
+    """
+    Full-softmax update from skip_gram.py: O(V * d) per pair.
+    W2 has shape (embedding_dim, vocab_size). Returns the loss.
+    """
+    center_embedding = W1[center_idx]
+    y_pred = softmax(np.dot(center_embedding, W2))
+    loss = -np.log(y_pred[context_idx] + 1e-7)
+
+    error = y_pred
+    error[context_idx] -= 1
+    grad_center = np.dot(W2, error)
+    W2 -= learning_rate * np.outer(center_embedding, error)
+    W1[center_idx] -= learning_rate * grad_center
+    return loss
+
+
+def negative_sampling_step(W1, W_out, center_idx, context_idx, negatives, learning_rate):
+    """
+    Negative-sampling update: only the k + 1 affected rows of W_out are touched.
+    W_out has shape (vocab_size, embedding_dim). Returns the loss.
+    """
+    targets = np.concatenate(([context_idx], negatives))
+    labels = np.zeros(len(targets))
+    labels[0] = 1.0
+
+    h = W1[center_idx]
+    out = W_out[targets]                  # shape: (k + 1, embedding_dim)
+    scores = sigmoid(out @ h)             # shape: (k + 1,)
+    loss = -np.log(scores[0] + 1e-7) - np.sum(np.log(1 - scores[1:] + 1e-7))
+
+    g = scores - labels                   # derivative of the loss w.r.t. the logits
+    grad_h = g @ out
+    # A negative can be drawn twice (or equal the context), so scatter-add
+    np.add.at(W_out, targets, -learning_rate * np.outer(g, h))
+    W1[center_idx] -= learning_rate * grad_h
+    return loss
+
+
+def hierarchical_softmax_step(W1, W_inner, center_idx, points, codes, learning_rate):
+    """
+    Hierarchical-softmax update along the Huffman path of the context word.
+    W_inner has shape (vocab_size - 1, embedding_dim). Returns the loss.
+    """
+    h = W1[center_idx]
+    out = W_inner[points]                 # shape: (path_length, embedding_dim)
+    scores = sigmoid(out @ h)
+    labels = 1.0 - codes                  # branch 0 is the "positive" direction
+    loss = -np.sum(labels * np.log(scores + 1e-7) + (1 - labels) * np.log(1 - scores + 1e-7))
+
+    g = scores - labels
+    grad_h = g @ out
+    W_inner[points] -= learning_rate * np.outer(g, h)  # nodes on a path are distinct
+    W1[center_idx] -= learning_rate * grad_h
+    return loss
+
+
+def train_skip_gram(training_pairs, word_counts, objective="negative_sampling", embedding_dim=10,
+                    learning_rate=0.01, epochs=100, negative_samples=5, seed=None, log_every=10):
+    """
+    Train skip-gram embeddings with the selected objective.
+
+    Parameters:
+        training_pairs: Re-iterable of (center_word_idx, context_word_idx) tuples,
+            such as a list or a pair_stream.SkipGramPairs stream.
+        word_counts: Corpus frequency of each word index (for the sampling table
+            and the Huffman tree).
+        objective: One of OBJECTIVES.
+
+    Returns:
+        W1: The learned word embeddings, shape (vocab_size, embedding_dim).
+        W_out: The output weights of the chosen objective.
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective {objective!r}; expected one of {OBJECTIVES}")
+    rng = np.random.default_rng(seed)
+    vocab_size = len(word_counts)
+    W1 = (rng.random((vocab_size, embedding_dim)) - 0.5) / embedding_dim
+
+    if objective == "softmax":
+        W_out = rng.random((embedding_dim, vocab_size))
+    elif objective == "negative_sampling":
+        W_out = np.zeros((vocab_size, embedding_dim))
+        table = unigram_table(word_counts)
+    else:
+        W_out = np.zeros((max(vocab_size - 1, 1), embedding_dim))
+        points, codes = build_huffman_tree(word_counts)
+
+    for epoch in range(epochs):
+        loss_epoch = 0
+        num_pairs = 0
+        for center_idx, context_idx in training_pairs:
+            num_pairs += 1
+            if objective == "softmax":
+                loss_epoch += softmax_step(W1, W_out, center_idx, context_idx, learning_rate)
+            elif objective == "negative_sampling":
+                negatives = sample_negatives(table, negative_samples, rng)
+                loss_epoch += negative_sampling_step(W1, W_out, center_idx, context_idx, negatives, learning_rate)
+            else:
+                loss_epoch += hierarchical_softmax_step(W1, W_out, center_idx, points[context_idx],
+                                                        codes[context_idx], learning_rate)
+        if log_every and (epoch + 1) % log_every == 0:
+            avg_loss = loss_epoch / max(num_pairs, 1)
+            print(f"Epoch {epoch + 1}/{epochs} - Average Loss: {avg_loss:.4f}")
+    return W1, W_out
+
+
+def benchmark(vocab_sizes=(1_000, 10_000, 50_000), num_pairs=2_000, embedding_dim=100,
+              negative_samples=5, learning_rate=0.025, seed=0):
+    """
+    Measure update steps per second of each objective on a synthetic Zipf vocabulary.
+    Building the sampling table and the Huffman tree is done once and not timed.
+    """
+    rng = np.random.default_rng(seed)
+    print(f"{'vocab':>8} | " + " | ".join(f"{name:>22}" for name in OBJECTIVES))
+    for vocab_size in vocab_sizes:
+        word_counts = rng.zipf(1.3, vocab_size).clip(max=10 ** 6)
+        centers = rng.integers(0, vocab_size, num_pairs).tolist()
+        contexts = rng.integers(0, vocab_size, num_pairs).tolist()
+        W1 = (rng.random((vocab_size, embedding_dim)) - 0.5) / embedding_dim
+        W2 = rng.random((embedding_dim, vocab_size))
+        W_out = np.zeros((vocab_size, embedding_dim))
+        W_inner = np.zeros((vocab_size - 1, embedding_dim))
+        table = unigram_table(word_counts)
+        points, codes = build_huffman_tree(word_counts)
+
+        rates = []
+        for objective in OBJECTIVES:
+            start = time.perf_counter()
+            for center_idx, context_idx in zip(centers, contexts):
+                if objective == "softmax":
+                    softmax_step(W1, W2, center_idx, context_idx, learning_rate)
+                elif objective == "negative_sampling":
+                    negatives = sample_negatives(table, negative_samples, rng)
+                    negative_sampling_step(W1, W_out, center_idx, context_idx, negatives, learning_rate)
+                else:
+                    hierarchical_softmax_step(W1, W_inner, center_idx, points[context_idx],
+                                              codes[context_idx], learning_rate)
+            rates.append(num_pairs / (time.perf_counter() - start))
+        print(f"{vocab_size:>8} | " + " | ".join(f"{rate:>14,.0f} pairs/s" for rate in rates))
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,172 @@
+"""Sparse TF-IDF engine with incremental document ingestion.
+
+TF-IDF.py keeps TF, DF and IDF as per-document Python dicts and recomputes
+everything from scratch. TfidfEngine keeps a vocabulary-to-id map and stores
+term frequencies as a SciPy CSR matrix:
+
+- add_documents() only tokenizes the new documents and bumps the DF counts of
+  their terms; existing rows are never rescanned.
+- IDF uses the same smoothed formula as compute_idf() in TF-IDF.py and is
+  recomputed lazily, the first time a query (or matrix()) needs it after new
+  documents arrived.
+- top_k() scores a query against every document with one sparse mat-vec
+  product over the row-normalized TF-IDF matrix, and selects the best k with
+  argpartition, so it scales to millions of documents.
+
+Running this file checks that a document with more new terms than the initial
+DF capacity can be ingested.
+"""
+import importlib
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+
+# TF-IDF.py is not a valid module name, so import it by file name for its tokenizer
+tokenize = importlib.import_module("TF-IDF").tokenize
+
+
+class TfidfEngine:
+    def __init__(self, tokenizer=tokenize):
+        self.tokenizer = tokenizer
+        self.vocab = {}             # term -> column id
+        self.terms = []             # column id -> term
+        self._df = np.zeros(1024, dtype=np.int64)
+        self._chunks = []           # CSR blocks of TF rows not yet merged into _tf
+        self._tf = sparse.csr_matrix((0, 0))
+        self._num_docs = 0
+        self._idf = None            # cached IDF vector, None when stale
+        self._weighted = None       # cached row-normalized TF-IDF matrix, None when stale
+
+    @property
+    def num_docs(self):
+        return self._num_docs
+
+    def _term_ids(self, terms):
+        ids = []
+        for term in terms:
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                term_id = self.vocab[term] = len(self.terms)
+                self.terms.append(term)
+            ids.append(term_id)
+        if len(self.terms) > len(self._df):
+            # Double the capacity, or more if one call added more terms than that
+            capacity = max(len(self.terms), 2 * len(self._df))
+            self._df = np.concatenate((self._df, np.zeros(capacity - len(self._df), dtype=np.int64)))
+        return ids
+
+    def add_documents(self, documents):
+        """
+        Tokenize and index new documents. Returns the ids of the added documents.
+        """
+        indptr, indices, data = [0], [], []
+        for document in documents:
+            tokens = self.tokenizer(document)
+            counts = Counter(tokens)
+            indices.extend(self._term_ids(counts))
+            # Same normalization as compute_tf: count / total terms in the document
+            data.extend(count / len(tokens) for count in counts.values())
+            indptr.append(len(indices))
+
+        indices = np.array(indices, dtype=np.int64)
+        num_new = len(indptr) - 1
+        # Each term appears once per row, so a bincount gives the DF increments
+        self._df[:len(self.terms)] += np.bincount(indices, minlength=len(self.terms))
+        self._chunks.append(sparse.csr_matrix((np.array(data), indices, np.array(indptr)),
+                                              shape=(num_new, len(self.terms))))
+        first_id = self._num_docs
+        self._num_docs += num_new
+        self._idf = self._weighted = None
+        return list(range(first_id, self._num_docs))
+
+    def _tf_matrix(self):
+        """
+        Merge pending TF blocks into one CSR matrix as wide as the current vocabulary.
+        """
+        if self._chunks:
+            blocks = [self._tf] + self._chunks
+            for block in blocks:
+                block.resize((block.shape[0], len(self.terms)))
+            self._tf = sparse.vstack(blocks, format="csr")
+            self._chunks = []
+        return self._tf
+
+    def idf(self):
+        """
+        IDF vector indexed by term id: log(N / (1 + df)) + 1, as in compute_idf.
+        """
+        if self._idf is None:
+            df = self._df[:len(self.terms)]
+            self._idf = np.log(self._num_docs / (1 + df)) + 1
+        return self._idf
+
+    def matrix(self):
+        """
+        The weighted document-term matrix (num_docs x vocab_size, CSR).
+        """
+        return self._tf_matrix() @ sparse.diags(self.idf())
+
+    def document_scores(self, doc_id):
+        """
+        TF-IDF scores of one document as a {term: score} dict, like compute_tf_idf.
+        """
+        row = self.matrix().getrow(doc_id)
+        return {self.terms[i]: score for i, score in zip(row.indices, row.data)}
+
+    def _normalized(self):
+        if self._weighted is None:
+            weighted = self.matrix()
+            norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+            norms[norms == 0] = 1.0
+            self._weighted = sparse.diags(1.0 / norms) @ weighted
+        return self._weighted
+
+    def query_vectors(self, queries):
+        """
+        TF-IDF vectors of query strings (CSR, one row each, L2-normalized).
+        Terms that never occur in the corpus are ignored.
+        """
+        indptr, indices, data = [0], [], []
+        idf = self.idf()
+        for query in queries:
+            tokens = self.tokenizer(query)
+            counts = Counter(token for token in tokens if token in self.vocab)
+            ids = [self.vocab[term] for term in counts]
+            weights = np.array([count / len(tokens) for count in counts.values()]) * idf[ids]
+            norm = np.linalg.norm(weights)
+            indices.extend(ids)
+            data.extend(weights / norm if norm else weights)
+            indptr.append(len(indices))
+        return sparse.csr_matrix((data, indices, indptr), shape=(len(queries), len(self.terms)))
+
+    def top_k_many(self, queries, k=10):
+        """
+        Cosine top-k retrieval for several queries at once.
+        Returns one list of (doc_id, score) pairs per query, best first.
+        """
+        scores = (self._normalized() @ self.query_vectors(queries).T).T.toarray()
+        results = []
+        for row in scores:
+            k_row = min(k, len(row))
+            best = np.argpartition(-row, k_row - 1)[:k_row] if k_row else np.array([], dtype=np.int64)
+            best = best[np.argsort(-row[best])]
+            results.append([(int(doc_id), float(row[doc_id])) for doc_id in best if row[doc_id] > 0])
+        return results
+
+    def top_k(self, query, k=10):
+        """
+        Cosine top-k retrieval for one query. Returns (doc_id, score) pairs, best first.
+        """
+        return self.top_k_many([query], k)[0]
+
+
+if __name__ == "__main__":
+    # One document whose vocabulary is larger than the initial DF capacity (1024)
+    engine = TfidfEngine()
+    engine.add_documents([" ".join(f"w{i}" for i in range(3000))])
+    engine.add_documents(["w0 w1 extra"])
+    assert len(engine.terms) == 3001
+    assert engine._df[:3].tolist() == [2, 2, 1]
+    print(f"Indexed {engine.num_docs} documents, {len(engine.terms)} terms")
+    print("Top documents for 'w2999':", engine.top_k("w2999", k=2))
@@ -1,5 +1,7 @@
 import numpy as np
 
+from attention import attention
+
 # Sample input: a sentence represented as word embeddings
 sentence = np.array([
     [0.1, 0.2, 0.3, 0.4],   # "it"
@@ -9,7 +11,7 @@ sentence = np.array([
     [1.7, 1.8, 1.9, 2.0]    # "."
 ])
 
-def self_attention(query, keys, values):
+def self_attention(query, keys, values, verbose=True):
     """
     Demonstrates self-attention for one query with detailed outputs at each step.
     
@@ -17,40 +19,42 @@ def self_attention(query, keys, values):
         query: A single query vector.
         keys: Multiple key vectors.
         values: Multiple value vectors.
+        verbose: Print every intermediate step (set False to compute silently).
     
     Returns:
         output: The weighted sum of the values (the attention output).
         attention_weights: The computed attention weights.
     """
-    print("=== Self-Attention Computation ===")
+    log = print if verbose else (lambda *args, **kwargs: None)
+    log("=== Self-Attention Computation ===")
     
     # Step 1: Dot Product between Query and Keys
-    print("\nStep 1: Dot Product (Similarity Calculation)")
-    print("Original query:", query)
+    log("\nStep 1: Dot Product (Similarity Calculation)")
+    log("Original query:", query)
     query = query[np.newaxis, :]  # Reshape query for matrix multiplication
-    print("Reshaped query (for multiplication):", query)
+    log("Reshaped query (for multiplication):", query)
     
     keys_transposed = keys.T      # Transpose keys for proper alignment
-    print("Transposed keys:\n", keys_transposed)
+    log("Transposed keys:\n", keys_transposed)
     
     dot_product = np.dot(query, keys_transposed)
-    print("Resulting dot product:", dot_product)
+    log("Resulting dot product:", dot_product)
     
     # Step 2: Apply Softmax to Convert Dot Products to Probabilities
-    print("\nStep 2: Softmax Normalization")
+    log("\nStep 2: Softmax Normalization")
     exp_dot_product = np.exp(dot_product)
-    print("Exponentiated dot product:", exp_dot_product)
+    log("Exponentiated dot product:", exp_dot_product)
     
     sum_exp = exp_dot_product.sum(axis=1, keepdims=True)
-    print("Sum of exponentiated scores:", sum_exp)
+    log("Sum of exponentiated scores:", sum_exp)
     
     attention_weights = exp_dot_product / sum_exp
-    print("Attention weights after softmax normalization:", attention_weights)
+    log("Attention weights after softmax normalization:", attention_weights)
     
     # Step 3: Weighted Sum of Values to Get the Output
-    print("\nStep 3: Weighted Sum of Values (Creating the Output)")
+    log("\nStep 3: Weighted Sum of Values (Creating the Output)")
     output = np.dot(attention_weights, values)
-    print("Output vector (weighted sum of values):", output)
+    log("Output vector (weighted sum of values):", output)
     
     return output, attention_weights
 
@@ -64,4 +68,14 @@ output, attn_weights = self_attention(query, keys, values)
 
 print("\n=== Final Results ===")
 print("Final Output of Self-Attention:", output)
-print("Final Attention Weights:", attn_weights)
\ No newline at end of file
+print("Final Attention Weights:", attn_weights)
+
+# The same computation for whole batches of sequences and all heads at once, with
+# 1/sqrt(d) scaling and a numerically stable softmax (see attention.py).
+# Shapes are (batch, heads, tokens, dim); the scaling changes the weights slightly.
+batched_output, batched_weights = attention(query[np.newaxis, np.newaxis, np.newaxis, :],
+                                            keys[np.newaxis, np.newaxis], values[np.newaxis, np.newaxis],
+                                            return_weights=True)
+print("\n=== Batched, Scaled Attention ===")
+print("Output:", batched_output[0, 0, 0])
+print("Attention Weights:", batched_weights[0, 0, 0])
@@ -1,10 +1,16 @@
+import logging
 import os
+import threading
 from typing import List, Tuple
 
 import gradio as gr
 from dotenv import load_dotenv
 
-from utils.model import load_model_and_tokenizer, generate_reply
+from utils.batching import BatchScheduler, stream_batched_reply
+from utils.context import PromptContext
+from utils.loader import ModelLoader
+from utils.model import ReplyExtractor, generate_reply, stream_reply
+from utils.session_cache import SessionCache
 
 
 # Load environment variables if .env exists
@@ -14,25 +20,94 @@ MODEL_NAME = os.getenv("MODEL_NAME", "distilgpt2")
 MAX_NEW_TOKENS = int(os.getenv("MAX_NEW_TOKENS", "128"))
 TEMPERATURE = float(os.getenv("TEMPERATURE", "0.7"))
 TOP_P = float(os.getenv("TOP_P", "0.9"))
-
-# Lazy globals to hold model/tokenizer after first load
+STREAM = os.getenv("STREAM", "1").lower() not in ("0", "false", "no")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Batch concurrent requests into one generate call when > 1
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "1"))
+BATCH_WAIT_MS = float(os.getenv("BATCH_WAIT_MS", "10"))
+# Prompt token budget (default: the model's context window minus MAX_NEW_TOKENS)
+MAX_PROMPT_TOKENS = int(os.getenv("MAX_PROMPT_TOKENS", "0"))
+# Tokens for a one-line summary replacing the turns that no longer fit (0 drops them silently)
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", "0"))
+# Memory budget for reusing each session's prompt KV cache across turns (0 disables it)
+SESSION_CACHE_MB = float(os.getenv("SESSION_CACHE_MB", "256"))
+# Load the model in the background at launch instead of in the first request
+PRELOAD = os.getenv("PRELOAD", "1").lower() not in ("0", "false", "no")
+# Length of the warmup generation run after loading (0 skips it)
+WARMUP_TOKENS = int(os.getenv("WARMUP_TOKENS", "8"))
+
+_loader = ModelLoader(MODEL_NAME, warmup_tokens=WARMUP_TOKENS)
+
+# Globals to hold model/tokenizer once the loader is done
 _model = None
 _tokenizer = None
+_scheduler = None
+_context = None
+_session_cache = SessionCache(int(SESSION_CACHE_MB * 2**20)) if SESSION_CACHE_MB > 0 else None
+# Concurrent requests must not create the helpers below twice
+_load_lock = threading.Lock()
 
 def _ensure_model():
-    global _model, _tokenizer
-    if _model is None or _tokenizer is None:
-        _model, _tokenizer = load_model_and_tokenizer(MODEL_NAME)
-
-
-def chat_fn(message: str, history: List[Tuple[str, str]]):
+    global _model, _tokenizer, _scheduler, _context
+    # Requests that arrive while the model is loading wait here (and start the load if PRELOAD is off)
+    model, tokenizer = _loader.wait()
+    with _load_lock:
+        _model, _tokenizer = model, tokenizer
+        if _context is None:
+            context_window = getattr(_model.config, "max_position_embeddings", None) or _tokenizer.model_max_length
+            _context = PromptContext(
+                _tokenizer,
+                max_prompt_tokens=MAX_PROMPT_TOKENS or context_window - MAX_NEW_TOKENS,
+                summary_tokens=HISTORY_SUMMARY_TOKENS,
+            )
+        if MAX_BATCH_SIZE > 1 and _scheduler is None:
+            _scheduler = BatchScheduler(
+                _model,
+                _tokenizer,
+                max_batch_size=MAX_BATCH_SIZE,
+                max_wait_ms=BATCH_WAIT_MS,
+                max_new_tokens=MAX_NEW_TOKENS,
+                temperature=TEMPERATURE,
+                top_p=TOP_P,
+            )
+
+
+def chat_fn(message: str, history: List[Tuple[str, str]], request: gr.Request = None):
     """
     message: latest user message
     history: list of (user, assistant) pairs
-    returns: assistant reply string
+    request: injected by Gradio; its session hash keys the session cache
+    yields: the assistant reply so far (the whole reply at once if STREAM is off)
     """
+    if not _loader.ready:
+        yield f"Loading {MODEL_NAME}, your message will be answered as soon as it is ready..."
     _ensure_model()
-    reply = generate_reply(
+    if _scheduler is not None:
+        if STREAM:
+            yield from stream_batched_reply(_scheduler, message, history, context=_context)
+        else:
+            extractor = ReplyExtractor()
+            extractor.feed(_scheduler.generate(_context.build(history, message)))
+            yield extractor.reply()
+        return
+    # Batched generation pads prompts together, so the per-session cache only applies here
+    session_id = request.session_hash if request is not None else None
+    if not STREAM:
+        yield generate_reply(
+            model=_model,
+            tokenizer=_tokenizer,
+            message=message,
+            history=history,
+            max_new_tokens=MAX_NEW_TOKENS,
+            temperature=TEMPERATURE,
+            top_p=TOP_P,
+            session_cache=_session_cache,
+            session_id=session_id,
+            context=_context,
+        )
+        return
+    # stream_reply logs the time to first token and throughput once the reply is done
+    yield from stream_reply(
         model=_model,
         tokenizer=_tokenizer,
         message=message,
@@ -40,13 +115,17 @@ def chat_fn(message: str, history: List[Tuple[str, str]]):
         max_new_tokens=MAX_NEW_TOKENS,
         temperature=TEMPERATURE,
         top_p=TOP_P,
+        session_cache=_session_cache,
+        session_id=session_id,
+        context=_context,
     )
-    return reply
 
 
 def build_demo():
     return gr.ChatInterface(
         fn=chat_fn,
+        # Let concurrent requests reach the batch scheduler
+        concurrency_limit=MAX_BATCH_SIZE,
         title="Basic Gradio Chatbot (Transformers)",
         description=(
             "A minimal chatbot using Hugging Face Transformers. Default model is "
@@ -61,6 +140,9 @@ def build_demo():
 
 
 def main():
+    logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if PRELOAD:
+        _loader.start()
     demo = build_demo()
     demo.launch()
 
@@ -0,0 +1,111 @@
+"""
+Throughput/latency benchmark of the BatchScheduler against unbatched calls.
+
+Each simulated user sends --requests-per-user prompts one after another
+(closed loop). "unbatched" runs one batch-size-1 model.generate per request
+on the user's own thread, like app.py without MAX_BATCH_SIZE; "batched" sends
+every request through a shared BatchScheduler.
+
+Usage:
+  python bench_batching.py --users 1 2 4 8 16 32 --max-new-tokens 32
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+from typing import Callable, List
+
+import torch
+
+from utils.batching import BatchScheduler
+from utils.model import format_history, load_model_and_tokenizer
+
+PROMPTS = [
+    "Hello!",
+    "Write a short haiku about summer.",
+    "Give me 3 creative uses for a paperclip.",
+    "What is the capital of France?",
+    "Tell me a joke about computers.",
+    "Summarize the plot of a heist movie in two sentences.",
+]
+
+
+def run_load(send: Callable[[str], str], users: int, requests_per_user: int) -> dict:
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def user(user_id: int):
+        for i in range(requests_per_user):
+            prompt = format_history([], PROMPTS[(user_id + i) % len(PROMPTS)])
+            start = time.perf_counter()
+            send(prompt)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=user, args=(u,)) for u in range(users)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests_per_sec": len(latencies) / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dynamic batching for the basic chatbot")
+    parser.add_argument("--model", default=os.getenv("MODEL_NAME", "distilgpt2"))
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--requests-per-user", type=int, default=4)
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=10.0)
+    args = parser.parse_args()
+
+    model, tokenizer = load_model_and_tokenizer(args.model)
+    device = next(model.parameters()).device
+
+    def unbatched(prompt: str) -> str:
+        inputs = tokenizer(prompt, return_tensors="pt").to(device)
+        with torch.no_grad():
+            output_ids = model.generate(
+                **inputs,
+                do_sample=True,
+                temperature=0.7,
+                top_p=0.9,
+                max_new_tokens=args.max_new_tokens,
+                pad_token_id=tokenizer.eos_token_id,
+                eos_token_id=tokenizer.eos_token_id,
+            )
+        return tokenizer.decode(output_ids[0, inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+
+    scheduler = BatchScheduler(
+        model,
+        tokenizer,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
+        max_new_tokens=args.max_new_tokens,
+    )
+    # Warm up both paths so the first measurement does not include one-off setup
+    unbatched(PROMPTS[0])
+    scheduler.generate(PROMPTS[0])
+
+    print(f"model={args.model} device={device} max_new_tokens={args.max_new_tokens} "
+          f"max_batch_size={args.max_batch_size} max_wait_ms={args.max_wait_ms}")
+    print(f"{'users':>5} {'mode':>10} {'req/s':>8} {'p50 s':>8} {'p95 s':>8}")
+    for users in args.users:
+        for mode, send in (("unbatched", unbatched), ("batched", scheduler.generate)):
+            result = run_load(send, users, args.requests_per_user)
+            print(f"{users:>5} {mode:>10} {result['requests_per_sec']:>8.2f} "
+                  f"{result['p50']:>8.3f} {result['p95']:>8.3f}")
+    scheduler.close()
+
+
+if __name__ == "__main__":
+    main()
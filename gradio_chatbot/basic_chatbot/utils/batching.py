@@ -0,0 +1,306 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Tuple, Union
+
+import torch
+from transformers import StoppingCriteria, StoppingCriteriaList
+from transformers.generation.streamers import BaseStreamer
+
+from utils.context import PromptContext
+from utils.model import GenerationStats, ReplyExtractor, format_history
+
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+@dataclass
+class _Request:
+    # Prompt text, or its token ids
+    prompt: Union[str, List[int]]
+    max_new_tokens: int
+    future: Future = field(default_factory=Future)
+    # Decoded text increments for stream(); None for submit()
+    deltas: Optional[queue.Queue] = None
+    stats: GenerationStats = field(default_factory=GenerationStats)
+    submitted_at: float = field(default_factory=time.perf_counter)
+    token_ids: List[int] = field(default_factory=list)
+    text: str = ""
+
+
+class _BatchStreamer(BaseStreamer):
+    """
+    Receives the tokens of every row of a batched generate() call and routes
+    them to their request: decoded text increments go to the request's deltas
+    queue, and the future is resolved as soon as the row hits EOS or its own
+    max_new_tokens, without waiting for the rest of the batch.
+    """
+
+    def __init__(self, tokenizer, requests: List[_Request]):
+        self.tokenizer = tokenizer
+        self.requests = requests
+        self.finished = [False] * len(requests)
+        self._prompt_seen = False
+
+    def put(self, value):
+        # The first call carries the (padded) prompt ids, then one token per row per step
+        if not self._prompt_seen:
+            self._prompt_seen = True
+            return
+        now = time.perf_counter()
+        for row, token_id in enumerate(value.reshape(-1).tolist()):
+            if self.finished[row]:
+                continue
+            request = self.requests[row]
+            if token_id == self.tokenizer.eos_token_id:
+                self._finish(row)
+                continue
+            if request.stats.time_to_first_token is None:
+                request.stats.time_to_first_token = now - request.submitted_at
+            request.token_ids.append(token_id)
+            text = self.tokenizer.decode(request.token_ids, skip_special_tokens=True)
+            # Hold back a trailing replacement character: the rest of a multi-byte character is still to come
+            if not text.endswith("�") and len(text) > len(request.text):
+                if request.deltas is not None:
+                    request.deltas.put(text[len(request.text):])
+                request.text = text
+            if len(request.token_ids) >= request.max_new_tokens:
+                self._finish(row)
+
+    def end(self):
+        for row in range(len(self.requests)):
+            self._finish(row)
+
+    def all_finished(self) -> bool:
+        return all(self.finished)
+
+    def _finish(self, row: int):
+        if self.finished[row]:
+            return
+        self.finished[row] = True
+        request = self.requests[row]
+        text = self.tokenizer.decode(request.token_ids, skip_special_tokens=True)
+        if request.deltas is not None and len(text) > len(request.text):
+            request.deltas.put(text[len(request.text):])
+        request.text = text
+        request.stats.new_tokens = len(request.token_ids)
+        request.stats.total_time = time.perf_counter() - request.submitted_at
+        if request.deltas is not None:
+            request.deltas.put(_DONE)
+        request.future.set_result(text)
+
+
+class _AllFinished(StoppingCriteria):
+    # Stops generate() once every row has been resolved (EOS or its own token limit)
+    def __init__(self, streamer: _BatchStreamer):
+        self.streamer = streamer
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        return self.streamer.all_finished()
+
+
+class BatchScheduler:
+    """
+    Dynamic batching in front of a causal LM.
+
+    Prompts from any number of threads are queued; a worker thread takes the
+    first waiting prompt, collects more for up to max_wait_ms (or until
+    max_batch_size prompts are waiting), left-pads them into one batch with an
+    attention mask, and runs a single model.generate call. Each caller gets its
+    own completion (the generated text, without the prompt) through a Future,
+    or as a stream of text increments.
+
+    A batch runs until all of its rows are done; requests that arrive in the
+    meantime wait for the next batch.
+    """
+
+    def __init__(
+        self,
+        model,
+        tokenizer,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+        max_new_tokens: int = 128,
+        temperature: float = 0.7,
+        top_p: float = 0.9,
+    ):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.top_p = top_p
+        # The tokenizer is shared with the unbatched path, so its pad settings are left alone
+        self.pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+
+        self._queue: queue.Queue = queue.Queue()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="batch-scheduler", daemon=True)
+        self._worker.start()
+
+    def submit(self, prompt: Union[str, List[int]], max_new_tokens: Optional[int] = None) -> Future:
+        """
+        Queue a prompt. The returned Future resolves to the generated text.
+        """
+        return self._enqueue(prompt, max_new_tokens, stream=False).future
+
+    def generate(self, prompt: Union[str, List[int]], max_new_tokens: Optional[int] = None) -> str:
+        return self.submit(prompt, max_new_tokens).result()
+
+    def stream(
+        self,
+        prompt: Union[str, List[int]],
+        max_new_tokens: Optional[int] = None,
+        stats: Optional[GenerationStats] = None,
+    ) -> Iterator[str]:
+        """
+        Queue a prompt and yield increments of the generated text as the
+        batch produces them. stats, if given, is filled in at the end; its
+        time to first token includes the time spent waiting for a batch.
+        """
+        request = self._enqueue(prompt, max_new_tokens, stream=True, stats=stats)
+        while True:
+            delta = request.deltas.get()
+            if delta is _DONE:
+                break
+            yield delta
+        # Re-raises the error of a failed batch
+        request.future.result()
+
+    def close(self):
+        """
+        Stop the worker after the batches already queued have run.
+        """
+        self._closed = True
+        self._queue.put(None)
+        self._worker.join()
+
+    def _enqueue(
+        self,
+        prompt: Union[str, List[int]],
+        max_new_tokens: Optional[int],
+        stream: bool,
+        stats: Optional[GenerationStats] = None,
+    ) -> _Request:
+        if self._closed:
+            raise RuntimeError("BatchScheduler is closed")
+        request = _Request(
+            prompt=prompt,
+            max_new_tokens=max_new_tokens or self.max_new_tokens,
+            deltas=queue.Queue() if stream else None,
+            stats=stats if stats is not None else GenerationStats(),
+        )
+        self._queue.put(request)
+        return request
+
+    def _next_batch(self) -> Optional[List[_Request]]:
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = first.submitted_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                # close() was called: run this batch, then stop
+                self._queue.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._generate(batch)
+            except Exception as exc:
+                logger.exception("Batched generation failed for %d prompts", len(batch))
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(exc)
+                        if request.deltas is not None:
+                            request.deltas.put(_DONE)
+
+    def _generate(self, batch: List[_Request]):
+        device = next(self.model.parameters()).device
+        input_ids = [
+            self.tokenizer(request.prompt)["input_ids"] if isinstance(request.prompt, str) else list(request.prompt)
+            for request in batch
+        ]
+        # Decoder-only models continue from the last position, so pad on the left
+        width = max(len(ids) for ids in input_ids)
+        inputs = {
+            "input_ids": torch.tensor(
+                [[self.pad_token_id] * (width - len(ids)) + ids for ids in input_ids], device=device
+            ),
+            "attention_mask": torch.tensor(
+                [[0] * (width - len(ids)) + [1] * len(ids) for ids in input_ids], device=device
+            ),
+        }
+        for request, ids in zip(batch, input_ids):
+            request.stats.prompt_tokens = len(ids)
+        streamer = _BatchStreamer(self.tokenizer, batch)
+        start = time.perf_counter()
+        with torch.no_grad():
+            self.model.generate(
+                **inputs,
+                do_sample=True,
+                temperature=self.temperature,
+                top_p=self.top_p,
+                max_new_tokens=max(request.max_new_tokens for request in batch),
+                pad_token_id=self.pad_token_id,
+                eos_token_id=self.tokenizer.eos_token_id,
+                streamer=streamer,
+                stopping_criteria=StoppingCriteriaList([_AllFinished(streamer)]),
+            )
+        logger.debug(
+            "Batch of %d prompts (%d padded tokens) generated in %.2fs",
+            len(batch),
+            inputs["input_ids"].shape[1],
+            time.perf_counter() - start,
+        )
+
+
+def stream_batched_reply(
+    scheduler: BatchScheduler,
+    message: str,
+    history: List[Tuple[str, str]],
+    stats: Optional[GenerationStats] = None,
+    context: Optional[PromptContext] = None,
+) -> Iterator[str]:
+    """
+    stream_reply() through a BatchScheduler: yields the reply so far, with
+    the "Assistant:" prefix handling of ReplyExtractor. With a context, the
+    prompt is limited to its token budget.
+    """
+    stats = stats if stats is not None else GenerationStats()
+    prompt = context.build(history, message) if context is not None else format_history(history, message)
+    extractor = ReplyExtractor()
+    reply = ""
+    for delta in scheduler.stream(prompt, stats=stats):
+        new_reply = extractor.feed(delta)
+        if new_reply != reply:
+            reply = new_reply
+            yield reply
+    final_reply = extractor.reply()
+    if final_reply != reply:
+        yield final_reply
+    logger.info(
+        "Generated %d tokens in %.2fs (%.1f tokens/s, time to first token %s, batched)",
+        stats.new_tokens,
+        stats.total_time,
+        stats.tokens_per_second,
+        "n/a" if stats.time_to_first_token is None else f"{stats.time_to_first_token:.3f}s",
+    )
@@ -0,0 +1,120 @@
+import functools
+from typing import Callable, List, Optional, Tuple
+
+
+def summarize_turns(turns: List[Tuple[str, str]]) -> str:
+    # Cheap extractive summary: the user messages of the dropped turns, most recent first,
+    # so that truncating the summary to its token budget drops the oldest ones
+    asked = "; ".join(u.strip() for u, _ in reversed(turns) if u and u.strip())
+    return f"Earlier topics: {asked}" if asked else ""
+
+
+class PromptContext:
+    """
+    Builds the token ids of the format_history() prompt under a token budget.
+
+    Every (user, assistant) turn is tokenized once, as the "User: ...\\n
+    Assistant: ...\\n" lines format_history writes for it, and the ids are
+    cached; a prompt is then assembled by concatenating cached id tuples, so
+    a long chat costs one tokenizer call per new message rather than one over
+    the whole transcript. When the turns and the new message no longer fit in
+    max_prompt_tokens, the oldest turns are dropped until they fit in
+    trim_to * max_prompt_tokens. Dropping in chunks keeps the start of the
+    prompt unchanged for the next several turns, so a SessionCache can keep
+    reusing its KV cache; dropping one turn per message would change the
+    prompt's first tokens on every turn. The window start is found by
+    replaying this rule over the earlier turns of the chat, so it is the same
+    on every call and needs no per-session state. With summary_tokens > 0,
+    dropped turns are replaced by one line produced by summarizer (truncated
+    to that many tokens, which are reserved from the budget once turns are
+    dropped).
+
+    The prompt (and so the prefill) never exceeds max_prompt_tokens. The new
+    message is always kept; if it alone does not fit, its start is cut off.
+    """
+
+    def __init__(
+        self,
+        tokenizer,
+        max_prompt_tokens: int,
+        summary_tokens: int = 0,
+        summarizer: Callable[[List[Tuple[str, str]]], str] = summarize_turns,
+        cache_size: int = 4096,
+        trim_to: float = 0.75,
+    ):
+        self.tokenizer = tokenizer
+        self.max_prompt_tokens = max_prompt_tokens
+        self.trim_to = trim_to
+        self.summary_tokens = summary_tokens
+        self.summarizer = summarizer
+        # Special tokens the tokenizer puts in front of a text (e.g. BOS), added once per prompt
+        self.prefix_ids = tuple(tokenizer("")["input_ids"])
+        self._encode = functools.lru_cache(maxsize=cache_size)(self._encode_uncached)
+
+    def _encode_uncached(self, text: str) -> Tuple[int, ...]:
+        return tuple(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    def turn_ids(self, user: str, assistant: str) -> Tuple[int, ...]:
+        # The same lines as format_history, each terminated by the newline that joins it to the next
+        lines = []
+        if user:
+            lines.append(f"User: {user}\n")
+        if assistant:
+            lines.append(f"Assistant: {assistant}\n")
+        return self._encode("".join(lines))
+
+    def message_ids(self, message: str) -> Tuple[int, ...]:
+        return self._encode(f"User: {message}\nAssistant:")
+
+    def build(self, history: List[Tuple[str, str]], message: str) -> List[int]:
+        """
+        Token ids of the prompt for message after history, within the budget.
+        """
+        budget = self.max_prompt_tokens - len(self.prefix_ids)
+        message_ids = self.message_ids(message)
+        if len(message_ids) >= budget:
+            return list(self.prefix_ids) + list(message_ids[len(message_ids) - budget:])
+
+        first_kept = self._window_start(history, message_ids, budget)
+        kept = [self.turn_ids(*turn) for turn in history[first_kept:]]
+        used = len(message_ids) + sum(len(ids) for ids in kept)
+
+        summary_ids: Tuple[int, ...] = ()
+        if first_kept > 0 and self.summary_tokens > 0:
+            summary = self.summarizer(history[:first_kept])
+            newline = self._encode("\n")
+            limit = min(self.summary_tokens, budget - used) - len(newline)
+            if summary and limit > 0:
+                # The summary only changes when the window is trimmed, so it is cached like the turns
+                summary_ids = self._encode(summary)[:limit] + newline
+
+        ids = list(self.prefix_ids) + list(summary_ids)
+        for turn in kept:
+            ids.extend(turn)
+        ids.extend(message_ids)
+        return ids
+
+    def _window_start(self, history: List[Tuple[str, str]], message_ids: Tuple[int, ...], budget: int) -> int:
+        """
+        Index of the first turn of history to keep. Replays the trimming rule
+        for each earlier turn (whose message is the user part of the next
+        turn), so the result only changes on the turns where the window overflows.
+        """
+        trim_budget = int(self.trim_to * budget)
+        start = used = 0
+        for index in range(len(history) + 1):
+            if index < len(history):
+                message_length = len(self.message_ids(history[index][0] or ""))
+            else:
+                message_length = len(message_ids)
+            summary_reserve = self.summary_tokens if start > 0 else 0
+            if used + message_length + summary_reserve > budget:
+                while start < index and used + message_length + self.summary_tokens > trim_budget:
+                    used -= len(self.turn_ids(*history[start]))
+                    start += 1
+            if index < len(history):
+                used += len(self.turn_ids(*history[index]))
+        return start
+
+    def cache_info(self):
+        return self._encode.cache_info()
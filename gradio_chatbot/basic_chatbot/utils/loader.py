@@ -0,0 +1,109 @@
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from utils.model import generate_reply, load_model_and_tokenizer
+
+
+logger = logging.getLogger(__name__)
+
+IDLE = "idle"
+LOADING = "loading"
+WARMING_UP = "warming_up"
+READY = "ready"
+FAILED = "failed"
+
+
+class ModelLoader:
+    """
+    Loads the model and tokenizer on a background thread.
+
+    start() returns immediately (call it at launch to preload); wait() blocks
+    until the model is ready, starting the load first if nobody did, so
+    requests that arrive early queue behind the load instead of each loading
+    the model themselves. After loading, a short warmup generation through
+    generate_reply pays for the one-off costs of the first generate() call
+    (kernel selection, allocator growth) before any user does.
+
+    state moves from "idle" to "loading", "warming_up" and "ready" (or
+    "failed", with the exception in error). The seconds spent in each phase
+    are kept in timings and logged. A failed load is not final: the requests
+    waiting on it get the error, and the next start() (or wait()) retries,
+    so a transient download error does not need an app restart.
+    """
+
+    def __init__(self, model_name: str, warmup_prompt: str = "Hello!", warmup_tokens: int = 8):
+        self.model_name = model_name
+        self.warmup_prompt = warmup_prompt
+        self.warmup_tokens = warmup_tokens
+        self.state = IDLE
+        self.error: Optional[BaseException] = None
+        self.timings: Dict[str, float] = {}
+        self.model = None
+        self.tokenizer = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == READY
+
+    def start(self) -> threading.Event:
+        """
+        Start loading unless a load is running or has succeeded; after a
+        failure this starts a new attempt. Returns the event that is set when
+        the current attempt finishes.
+        """
+        with self._lock:
+            if self._thread is None or self.state == FAILED:
+                if self._thread is not None:
+                    logger.info("Retrying to load model %s", self.model_name)
+                # Each attempt gets its own event, so waiters of a failed attempt still see its error
+                self._ready = threading.Event()
+                self.state = LOADING
+                self.timings = {}
+                self._thread = threading.Thread(
+                    target=self._load, args=(self._ready,), name="model-loader", daemon=True
+                )
+                self._thread.start()
+            return self._ready
+
+    def wait(self, timeout: Optional[float] = None):
+        """
+        Block until the model is loaded and warmed up; returns (model, tokenizer).
+        Raises RuntimeError if this load attempt failed.
+        """
+        ready = self.start()
+        if not ready.wait(timeout):
+            raise TimeoutError(f"Model {self.model_name!r} is still {self.state} after {timeout}s")
+        if self.model is None:
+            raise RuntimeError(f"Loading model {self.model_name!r} failed") from self.error
+        return self.model, self.tokenizer
+
+    def _load(self, ready: threading.Event) -> None:
+        start = time.perf_counter()
+        try:
+            logger.info("Loading model %s", self.model_name)
+            model, tokenizer = load_model_and_tokenizer(self.model_name, timings=self.timings)
+            if self.warmup_tokens > 0:
+                self.state = WARMING_UP
+                warmup_start = time.perf_counter()
+                generate_reply(model, tokenizer, self.warmup_prompt, [], max_new_tokens=self.warmup_tokens)
+                self.timings["warmup"] = time.perf_counter() - warmup_start
+            self.model, self.tokenizer = model, tokenizer
+            self.error = None
+            self.timings["total"] = time.perf_counter() - start
+            self.state = READY
+            logger.info(
+                "Model %s ready: %s",
+                self.model_name,
+                ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.timings.items()),
+            )
+        except Exception as exc:
+            self.error = exc
+            self.state = FAILED
+            logger.exception("Loading model %s failed", self.model_name)
+        finally:
+            ready.set()
@@ -1,12 +1,28 @@
+import logging
 import os
-from typing import List, Tuple
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Hashable, Iterator, List, Optional, Tuple
 
 import torch
 from transformers import (
     AutoModelForCausalLM,
     AutoTokenizer,
+    StoppingCriteria,
+    StoppingCriteriaList,
+    TextIteratorStreamer,
 )
 
+from utils.context import PromptContext
+from utils.session_cache import SessionCache
+
+
+logger = logging.getLogger(__name__)
+
+ASSISTANT_PREFIX = "Assistant:"
+MAX_REPLY_CHARS = 2000
+
 
 def get_device() -> torch.device:
     # Prefer MPS on Apple Silicon if available, then CUDA, else CPU
@@ -17,13 +33,27 @@ def get_device() -> torch.device:
     return torch.device("cpu")
 
 
-def load_model_and_tokenizer(model_name: str):
+def load_model_and_tokenizer(model_name: str, timings: Optional[Dict[str, float]] = None):
+    """
+    Load the tokenizer and model onto the preferred device. timings, if
+    given, receives the seconds spent in each phase.
+    """
+    timings = timings if timings is not None else {}
+    start = time.perf_counter()
     tokenizer = AutoTokenizer.from_pretrained(model_name)
-    model = AutoModelForCausalLM.from_pretrained(model_name)
+    timings["tokenizer"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    # Skip the random initialization of a full copy of the model before the checkpoint
+    # is loaded into it (transformers 4.x; later versions always do this and ignore the flag)
+    model = AutoModelForCausalLM.from_pretrained(model_name, low_cpu_mem_usage=True)
+    timings["weights"] = time.perf_counter() - start
 
+    start = time.perf_counter()
     device = get_device()
     model = model.to(device)
     model.eval()
+    timings["to_device"] = time.perf_counter() - start
     return model, tokenizer
 
 
@@ -41,6 +71,36 @@ def format_history(history: List[Tuple[str, str]], user: str) -> str:
     return "\n".join(lines)
 
 
+def _prompt_inputs(tokenizer, history: List[Tuple[str, str]], message: str, context: Optional[PromptContext], device):
+    # Tokenize the whole transcript, or assemble the budgeted prompt from cached per-turn ids
+    if context is None:
+        return tokenizer(format_history(history, message), return_tensors="pt").to(device)
+    input_ids = torch.tensor([context.build(history, message)], device=device)
+    return {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)}
+
+
+def _take_session_cache(session_cache: Optional[SessionCache], session_id: Optional[Hashable], inputs):
+    """
+    Extra generate() arguments that reuse the session's cached prefix, and the
+    number of prompt tokens it covers.
+    """
+    if session_cache is None or session_id is None:
+        return {}, 0
+    past_key_values, cached_tokens = session_cache.take(session_id, inputs["input_ids"][0].tolist())
+    cache_kwargs = {"return_dict_in_generate": True}
+    if past_key_values is not None:
+        cache_kwargs["past_key_values"] = past_key_values
+    return cache_kwargs, cached_tokens
+
+
+def _put_session_cache(session_cache: Optional[SessionCache], session_id: Optional[Hashable], output):
+    # Store the KV cache of a generate() call made with _take_session_cache; returns the output ids
+    if session_cache is None or session_id is None:
+        return output
+    session_cache.put(session_id, output.sequences[0].tolist(), output.past_key_values)
+    return output.sequences
+
+
 def generate_reply(
     model,
     tokenizer,
@@ -49,11 +109,15 @@ def generate_reply(
     max_new_tokens: int = 128,
     temperature: float = 0.7,
     top_p: float = 0.9,
+    session_cache: Optional[SessionCache] = None,
+    session_id: Optional[Hashable] = None,
+    context: Optional[PromptContext] = None,
 ) -> str:
     device = next(model.parameters()).device
 
     prompt = format_history(history, message)
-    inputs = tokenizer(prompt, return_tensors="pt").to(device)
+    inputs = _prompt_inputs(tokenizer, history, message, context, device)
+    cache_kwargs, _ = _take_session_cache(session_cache, session_id, inputs)
 
     with torch.no_grad():
         output_ids = model.generate(
@@ -64,12 +128,14 @@ def generate_reply(
             max_new_tokens=max_new_tokens,
             pad_token_id=tokenizer.eos_token_id,
             eos_token_id=tokenizer.eos_token_id,
+            **cache_kwargs,
         )
+    output_ids = _put_session_cache(session_cache, session_id, output_ids)
 
     full_text = tokenizer.decode(output_ids[0], skip_special_tokens=True)
     # Extract only the assistant's latest turn: split on 'Assistant:' and take last piece
-    if "Assistant:" in full_text:
-        reply = full_text.split("Assistant:")[-1].strip()
+    if ASSISTANT_PREFIX in full_text:
+        reply = full_text.split(ASSISTANT_PREFIX)[-1].strip()
     else:
         # Fallback: remove the prompt from the front if possible
         if full_text.startswith(prompt):
@@ -77,6 +143,153 @@ def generate_reply(
         else:
             reply = full_text.strip()
     # Be nice and limit runaway outputs
-    reply = reply[:2000]
+    reply = reply[:MAX_REPLY_CHARS]
     return reply
 
+
+@dataclass
+class GenerationStats:
+    prompt_tokens: int = 0
+    new_tokens: int = 0
+    # Prompt tokens whose prefill was reused from the session cache
+    cached_tokens: int = 0
+    # Seconds until the streamer produced the first piece of text
+    time_to_first_token: Optional[float] = None
+    total_time: float = 0.0
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.new_tokens / self.total_time if self.total_time > 0 else 0.0
+
+
+class ReplyExtractor:
+    """
+    Incremental version of the reply extraction in generate_reply: the reply is
+    the generated text after the last "Assistant:", stripped and truncated.
+
+    While streaming, a tail that could still grow into "Assistant:" (e.g.
+    "Assis") is held back, so a prefix emitted by the model never flashes up
+    in the chat window.
+    """
+
+    def __init__(self, max_chars: int = MAX_REPLY_CHARS):
+        self.max_chars = max_chars
+        self.text = ""
+
+    def feed(self, delta: str) -> str:
+        self.text += delta
+        return self.reply(final=False)
+
+    def reply(self, final: bool = True) -> str:
+        text = self.text
+        if not final:
+            for size in range(min(len(ASSISTANT_PREFIX) - 1, len(text)), 0, -1):
+                if ASSISTANT_PREFIX.startswith(text[-size:]):
+                    text = text[:-size]
+                    break
+        start = text.rfind(ASSISTANT_PREFIX)
+        if start >= 0:
+            text = text[start + len(ASSISTANT_PREFIX):]
+        return text.strip()[:self.max_chars]
+
+
+class _CancelCriteria(StoppingCriteria):
+    # Stops generate() once the consumer of stream_reply has gone away
+    def __init__(self, cancelled: threading.Event):
+        self.cancelled = cancelled
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        return self.cancelled.is_set()
+
+
+def stream_reply(
+    model,
+    tokenizer,
+    message: str,
+    history: List[Tuple[str, str]],
+    max_new_tokens: int = 128,
+    temperature: float = 0.7,
+    top_p: float = 0.9,
+    stats: Optional[GenerationStats] = None,
+    session_cache: Optional[SessionCache] = None,
+    session_id: Optional[Hashable] = None,
+    context: Optional[PromptContext] = None,
+) -> Iterator[str]:
+    """
+    Like generate_reply, but yields the reply so far each time new text is
+    decoded (the format gr.ChatInterface expects from a generator).
+
+    model.generate runs on a background thread and pushes decoded text into a
+    TextIteratorStreamer. If the caller stops iterating, generation is
+    cancelled at the next token. stats, if given, is filled in at the end, and
+    the time to first token is logged. With a session_cache and session_id,
+    the prefill of the conversation so far is reused from the previous turn.
+    With a context, the prompt is limited to its token budget.
+    """
+    device = next(model.parameters()).device
+
+    inputs = _prompt_inputs(tokenizer, history, message, context, device)
+    cache_kwargs, cached_tokens = _take_session_cache(session_cache, session_id, inputs)
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+    cancelled = threading.Event()
+    result = {}
+
+    def _generate():
+        try:
+            with torch.no_grad():
+                result["output_ids"] = model.generate(
+                    **inputs,
+                    do_sample=True,
+                    temperature=temperature,
+                    top_p=top_p,
+                    max_new_tokens=max_new_tokens,
+                    pad_token_id=tokenizer.eos_token_id,
+                    eos_token_id=tokenizer.eos_token_id,
+                    streamer=streamer,
+                    stopping_criteria=StoppingCriteriaList([_CancelCriteria(cancelled)]),
+                    **cache_kwargs,
+                )
+            result["output_ids"] = _put_session_cache(session_cache, session_id, result["output_ids"])
+        except Exception as exc:
+            result["error"] = exc
+            # Unblock the consumer loop below
+            streamer.end()
+
+    stats = stats if stats is not None else GenerationStats()
+    stats.prompt_tokens = inputs["input_ids"].shape[1]
+    stats.cached_tokens = cached_tokens
+    start = time.perf_counter()
+    thread = threading.Thread(target=_generate, daemon=True)
+    thread.start()
+    extractor = ReplyExtractor()
+    reply = ""
+    try:
+        for text in streamer:
+            if text and stats.time_to_first_token is None:
+                stats.time_to_first_token = time.perf_counter() - start
+                logger.info("Time to first token: %.3fs", stats.time_to_first_token)
+            new_reply = extractor.feed(text)
+            if new_reply != reply:
+                reply = new_reply
+                yield reply
+        thread.join()
+        if "error" in result:
+            raise result["error"]
+        final_reply = extractor.reply()
+        if final_reply != reply:
+            yield final_reply
+    finally:
+        cancelled.set()
+        stats.total_time = time.perf_counter() - start
+        if "output_ids" in result:
+            stats.new_tokens = result["output_ids"].shape[1] - stats.prompt_tokens
+            logger.info(
+                "Generated %d tokens in %.2fs (%.1f tokens/s, time to first token %s, %d/%d prompt tokens cached)",
+                stats.new_tokens,
+                stats.total_time,
+                stats.tokens_per_second,
+                "n/a" if stats.time_to_first_token is None else f"{stats.time_to_first_token:.3f}s",
+                stats.cached_tokens,
+                stats.prompt_tokens,
+            )
+
@@ -0,0 +1,139 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import torch
+
+
+def _cache_tensors(past_key_values):
+    # transformers >= 4.56 keeps one object per layer; older versions keep two lists of tensors
+    if hasattr(past_key_values, "layers"):
+        for layer in past_key_values.layers:
+            yield getattr(layer, "keys", None)
+            yield getattr(layer, "values", None)
+    else:
+        yield from past_key_values.key_cache
+        yield from past_key_values.value_cache
+
+
+def cache_nbytes(past_key_values) -> int:
+    return sum(t.numel() * t.element_size() for t in _cache_tensors(past_key_values) if t is not None)
+
+
+def common_prefix_length(a: List[int], b: List[int]) -> int:
+    n = min(len(a), len(b))
+    if n == 0:
+        return 0
+    mismatches = (torch.tensor(a[:n]) != torch.tensor(b[:n])).nonzero()
+    return int(mismatches[0, 0]) if len(mismatches) else n
+
+
+@dataclass
+class _Entry:
+    token_ids: List[int]
+    past_key_values: object
+    nbytes: int
+
+
+class SessionCache:
+    """
+    Per-session prefix cache of the model's past_key_values.
+
+    After a turn, put() stores the tokens of the conversation so far together
+    with the KV cache generate() returned. On the next turn, take() compares
+    the newly tokenized prompt with the stored tokens, crops the KV cache to
+    their longest common prefix and hands it over, so generate() only runs
+    the prefill for the appended tokens. Comparing token ids (not history
+    entries) makes invalidation automatic: an edited or retried message, or a
+    reply that was stripped before it came back in the history, simply
+    shortens the reusable prefix.
+
+    Entries are evicted least recently used first once their total size
+    exceeds max_bytes. take() removes the entry, so two concurrent requests of
+    one session never share (and mutate) the same cache object.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 2**20):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reused_tokens = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def take(self, session_id: Hashable, input_ids: List[int]) -> Tuple[Optional[object], int]:
+        """
+        Remove and return (past_key_values, prefix_length) for a prompt, with
+        the cache cropped to the part of the prompt it is valid for; (None, 0)
+        on a miss. At least one prompt token is always left to prefill.
+        """
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is not None:
+                self._nbytes -= entry.nbytes
+        prefix_length = 0
+        if entry is not None:
+            prefix_length = min(common_prefix_length(entry.token_ids, input_ids), len(input_ids) - 1)
+        with self._lock:
+            if prefix_length <= 0:
+                self.misses += 1
+                return None, 0
+            self.hits += 1
+            self.reused_tokens += prefix_length
+        past_key_values = entry.past_key_values
+        excess = past_key_values.get_seq_length() - prefix_length
+        if excess > 0:
+            # A negative length removes that many tokens from the end
+            past_key_values.crop(-excess)
+        return past_key_values, prefix_length
+
+    def put(self, session_id: Hashable, token_ids: List[int], past_key_values) -> None:
+        """
+        Store the KV cache of a finished generate() call. token_ids is the
+        full output sequence; the cache covers all but its last token.
+        """
+        length = past_key_values.get_seq_length()
+        entry = _Entry(list(token_ids[:length]), past_key_values, cache_nbytes(past_key_values))
+        if entry.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(session_id, None)
+            if old is not None:
+                self._nbytes -= old.nbytes
+            self._entries[session_id] = entry
+            self._nbytes += entry.nbytes
+            while self._nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._nbytes -= evicted.nbytes
+
+    def invalidate(self, session_id: Hashable) -> None:
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is not None:
+                self._nbytes -= entry.nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "sessions": len(self._entries),
+                "nbytes": self._nbytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "reused_tokens": self.reused_tokens,
+            }